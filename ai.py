@@ -1,9 +1,128 @@
 import json
+import os
 import uuid
 
 # AIコンポーネントはモブ定義の components 内にリストとして追加される
 print("AI_MODULE_START")
 
+# --- AI行動レジストリ ---
+# バニラの minecraft:behavior.* コンポーネントの定義 (エイリアス・パラメータのスキーマ・デフォルト値) を
+# データファイルから一度だけ読み込み、エイリアスとコンポーネントキーの両方から O(1) で引けるようにする。
+AI_BEHAVIORS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_behaviors.json")
+
+# スキーマの型名 -> 値の検証関数 (bool は int のサブクラスなので数値からは除外する)
+PARAM_TYPE_CHECKS = {
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "string": lambda v: isinstance(v, str),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+}
+
+# クライアントの行動定義のうち、コンポーネントのパラメータではないキー
+RESERVED_BEHAVIOR_KEYS = ("type", "priority")
+
+
+def load_behavior_registry(path: str = AI_BEHAVIORS_FILE):
+    """
+    AI行動の定義ファイルを読み込み、ディスパッチ用のレジストリを構築する。
+
+    Returns:
+        dict: {エイリアス または コンポーネントキー: 行動定義}
+              行動定義は {'component': キー, 'params': スキーマ, 'param_aliases': {別名: パラメータ名}}
+    """
+    with open(path, encoding='utf-8') as f:
+        definitions = json.load(f)
+
+    registry = {}
+    for component_key, definition in definitions.items():
+        params = definition.get("params", {})
+        spec = {
+            "component": component_key,
+            "params": params,
+            "param_aliases": {p["alias"]: name for name, p in params.items() if "alias" in p},
+            "defaults": {name: p["default"] for name, p in params.items() if "default" in p},
+        }
+        registry[component_key] = spec
+        for alias in definition.get("aliases", []):
+            registry[alias] = spec
+    return registry
+
+
+BEHAVIOR_REGISTRY = load_behavior_registry()
+print(f"AI_Behavior_Registry_Loaded:{len(BEHAVIOR_REGISTRY)}_keys")
+
+
+def compile_ai_behaviors(client_behaviors: list):
+    """
+    1体分のAIリストを検証・整形する。最初のエラーで止まらず、全てのエラーを集める。
+
+    Args:
+        client_behaviors (list): 優先度、タイプ、設定を含む辞書のリスト
+
+    Returns:
+        tuple: (整形された components 辞書, エラーのリスト, 優先度衝突のリスト)
+    """
+
+    formatted_components = {}
+    errors = []
+    collisions = []
+    priority_owner = {}  # priority -> 最初にその優先度を使ったコンポーネントキー
+
+    for index, behavior in enumerate(client_behaviors):
+        behavior_type = behavior.get('type')
+        priority = behavior.get('priority')
+
+        spec = BEHAVIOR_REGISTRY.get(behavior_type)
+        if spec is None:
+            errors.append(f"[{index}] Unknown AI behavior type: {behavior_type}")
+            continue
+
+        component_key = spec["component"]
+
+        if priority is None or not isinstance(priority, int) or isinstance(priority, bool):
+            # 優先度はAIの基本なので必須
+            errors.append(f"[{index}] AI behavior '{behavior_type}' missing required priority.")
+            continue
+
+        # --- 共通設定 + スキーマのデフォルト値 ---
+        base_component = {"priority": priority}
+        base_component.update(spec["defaults"])
+
+        # --- パラメータの検証 (別名は正式なパラメータ名に変換) ---
+        for key, value in behavior.items():
+            if key in RESERVED_BEHAVIOR_KEYS:
+                continue
+            param_name = spec["param_aliases"].get(key, key)
+            schema = spec["params"].get(param_name)
+            if schema is None:
+                errors.append(f"[{index}] Unknown parameter '{key}' for {component_key}")
+                continue
+            if not PARAM_TYPE_CHECKS[schema["type"]](value):
+                errors.append(f"[{index}] Parameter '{key}' for {component_key} must be {schema['type']}")
+                continue
+            if ("min" in schema and value < schema["min"]) or ("max" in schema and value > schema["max"]):
+                errors.append(f"[{index}] Parameter '{key}' for {component_key} out of range: {value}")
+                continue
+            base_component[param_name] = value
+
+        # --- 同じコンポーネントキーの重複 (後勝ちで上書きされてしまう) ---
+        if component_key in formatted_components:
+            errors.append(f"[{index}] Duplicate AI behavior {component_key} would overwrite an earlier entry.")
+            continue
+
+        # --- 優先度の衝突 (同じ優先度の行動が複数ある) ---
+        if priority in priority_owner:
+            collisions.append({"priority": priority, "components": [priority_owner[priority], component_key]})
+        else:
+            priority_owner[priority] = component_key
+
+        formatted_components[component_key] = base_component
+
+    return formatted_components, errors, collisions
+
+
 def format_ai_behaviors(client_behaviors: list):
     """
     クライアントが指定したAIのリストを、BPのJSON形式（priority付き）に整形する。
@@ -14,53 +133,49 @@ def format_ai_behaviors(client_behaviors: list):
                           
     Returns:
         dict: 整形された components 辞書の一部（mobs.pyにマージされる）
+              エラーがある場合は {'error': ..., 'errors': [...]}
     """
     
-    formatted_components = {}
-    
     # AIの優先度（priority）は数値が小さいほど優先される
-    
-    for behavior in client_behaviors:
-        behavior_type = behavior.get('type')
-        priority = behavior.get('priority')
-        
-        if priority is None or not isinstance(priority, int):
-            # 優先度はAIの基本なので必須
-            return {"error": f"AI behavior '{behavior_type}' missing required priority."}
+    formatted_components, errors, collisions = compile_ai_behaviors(client_behaviors)
 
-        # --- 共通設定 ---
-        base_component = {"priority": priority}
+    if errors:
+        return {"error": errors[0], "errors": errors}
+
+    for component_key, component in formatted_components.items():
+        print(f"AI_Component_Added:{component_key}_Priority:{component['priority']}")
+    for collision in collisions:
+        print(f"AI_Priority_Collision:{collision['priority']}_{collision['components']}")
 
-        # --- 行動タイプによるマッピング ---
-        component_key = None
-        
-        if behavior_type == 'follow_owner':
-            component_key = "minecraft:behavior.follow_owner"
-            base_component["speed_multiplier"] = behavior.get('speed', 1.0)
-            base_component["stop_distance"] = behavior.get('stop_distance', 2.0)
-            
-        elif behavior_type == 'stroll':
-            component_key = "minecraft:behavior.random_stroll"
-            base_component["speed_multiplier"] = behavior.get('speed', 0.8)
-
-        elif behavior_type == 'look_at_player':
-            component_key = "minecraft:behavior.look_at_player"
-            base_component["look_distance"] = behavior.get('distance', 6.0)
-            
-        elif behavior_type == 'melee_attack':
-            component_key = "minecraft:behavior.melee_attack"
-            base_component["speed_multiplier"] = behavior.get('speed', 1.0)
-
-        # ... (他のAI行動の追加)
-
-        if component_key:
-            formatted_components[component_key] = base_component
-            print(f"AI_Component_Added:{component_key}_Priority:{priority}")
-        else:
-            return {"error": f"Unknown AI behavior type: {behavior_type}"}
-    
     return formatted_components
 
+
+def compile_ai_behaviors_batch(mob_behaviors: dict):
+    """
+    多数のモブのAIリストをまとめて検証・整形する。
+
+    Args:
+        mob_behaviors (dict): {モブ名: AIリスト}
+
+    Returns:
+        dict: {'components': {モブ名: components}, 'errors': {モブ名: [...]},
+               'collisions': {モブ名: [...]}}  (エラーのあるモブは components に含めない)
+    """
+
+    results = {"components": {}, "errors": {}, "collisions": {}}
+
+    for mob_name, client_behaviors in mob_behaviors.items():
+        formatted_components, errors, collisions = compile_ai_behaviors(client_behaviors)
+        if errors:
+            results["errors"][mob_name] = errors
+        else:
+            results["components"][mob_name] = formatted_components
+        if collisions:
+            results["collisions"][mob_name] = collisions
+
+    print(f"AI_Batch_Compiled:{len(results['components'])}_ok_{len(results['errors'])}_failed_{len(results['collisions'])}_with_collisions")
+    return results
+
 # --- 実行例 ---
 
 # クライアントからカスタムペットのAIリストが送られてきたと仮定
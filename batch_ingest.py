@@ -0,0 +1,340 @@
+import _thread
+import argparse
+import base64
+import collections
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from pack_parser import open_pack_sources, parse_pack_sources_to_client_data
+from github_uploader import GITHUB_TOKEN, CommitSession, collect_binary_assets, prepare_files_for_commit
+
+print("Batch_Ingest_Module_Loaded")
+
+# --- パックの一括取り込み (コマンドライン) ---
+# Webフォームから1つずつアップロードする代わりに、ディレクトリ (または glob) 内のパックを
+# プロセスプールで並行して解析・整形し、ディスク上のツリーか GitHub に書き出す。
+# Flask には依存しない (サーバーと同じ parse_pack_sources_to_client_data / prepare_files_for_commit を使う)。
+#
+#   python batch_ingest.py packs/ --out build/            # build/<パックID>/BP/... に書き出す
+#   python batch_ingest.py 'packs/*.mcaddon' --github     # パックごとに1コミット
+#
+# 処理済みのパックはチェックポイントファイル (JSON Lines) に1行ずつ記録し、
+# 再実行時は内容 (サイズ・更新日時) が変わっていないパックを飛ばす。
+#
+# ワーカーのメモリ上限は常駐メモリ (RSS) で判定する。アドレス空間の上限 (RLIMIT_AS) は
+# スレッドごとの malloc アリーナの予約だけで超えてしまい、解析スレッドの起動に失敗するため使わない。
+#
+# ワーカープロセスが異常終了する (OOM killer など) とプール全体が使えなくなるため、
+# 終わっていないパックを新しいプールで処理し直す (巻き添えになったパックと区別するため、1つずつ別のプールで)。
+# 同じパックの処理中にプールが壊れたのが BATCH_POOL_RESTARTS 回を超えたら、そのパックは失敗として記録する。
+PACK_EXTENSIONS = ('.zip', '.mcpack', '.mcaddon')
+BATCH_CHECKPOINT_FILE = "batch_ingest.checkpoint.jsonl"
+BATCH_MEMORY_CHECK_INTERVAL = 0.2   # RSS を確認する間隔 (秒)
+BATCH_POOL_RESTARTS = int(os.environ.get("BATCH_POOL_RESTARTS", 2))
+
+# ワーカープロセスごとの設定 (_init_worker で設定する)
+_worker = {}
+
+
+def find_packs(inputs: list):
+    """ディレクトリ・ファイル・glob パターンからパックのパスを集める (重複は除く)。"""
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for directory, _, names in os.walk(pattern):
+                paths.extend(os.path.join(directory, name) for name in names if name.lower().endswith(PACK_EXTENSIONS))
+        else:
+            paths.extend(path for path in glob.glob(pattern) if path.lower().endswith(PACK_EXTENSIONS))
+    return sorted({os.path.abspath(path) for path in paths})
+
+
+def pack_id_for(path: str):
+    """パックID (ファイル名から拡張子を除いたもの)。サーバーの検索用インデックスと同じ規則。"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _pack_stamp(path: str):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint(path: str):
+    """
+    チェックポイントファイルを読み込む。
+
+    Returns:
+        dict: {パックのパス: 最後に記録された結果} (途中で切れた最後の行は無視する)
+    """
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[record["pack"]] = record
+    return done
+
+
+def append_checkpoint(f, record: dict):
+    # 1件ごとにディスクへ書き出す (途中で止められても、そこまでの結果は残る)
+    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _current_rss():
+    """現在の常駐メモリ (バイト)。/proc が無い環境では None。"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _memory_watchdog(limit: int):
+    # パックの処理中に RSS が上限を超えたら、メインスレッドに KeyboardInterrupt を送って処理を打ち切る
+    while True:
+        time.sleep(BATCH_MEMORY_CHECK_INTERVAL)
+        if _worker["busy"] and not _worker["over_limit"] and (_current_rss() or 0) > limit:
+            _worker["over_limit"] = True
+            _thread.interrupt_main()
+
+
+def _init_worker(max_memory_mb, commit_lock, verbose):
+    """ワーカープロセスの初期化。メモリの監視を始め、ログを抑える。"""
+    if not verbose:
+        # 各モジュールの print が大量に出るため、ワーカーの標準出力は捨てる (結果は親プロセスが表示する)
+        sys.stdout = open(os.devnull, 'w')
+    _worker.update({"commit_lock": commit_lock, "busy": False, "over_limit": False})
+    if max_memory_mb and _current_rss() is not None:
+        threading.Thread(target=_memory_watchdog, args=(max_memory_mb * 1024 * 1024,), daemon=True).start()
+
+
+def _write_tree(commit_files: list, destination: str):
+    """コミット用のファイルリストをディレクトリに書き出す。パックごとに一時ディレクトリから置き換える。"""
+    temp_dir = f"{destination}.{os.getpid()}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    for file_data in commit_files:
+        local_path = os.path.normpath(os.path.join(temp_dir, file_data["path"]))
+        if not local_path.startswith(temp_dir + os.sep):
+            raise ValueError(f"Invalid output path: {file_data['path']}")
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        with open(local_path, 'wb') as f:
+            if 'source' in file_data:
+                with file_data['source']() as source:
+                    shutil.copyfileobj(source, f, 1024 * 1024)
+            elif file_data.get('is_binary'):
+                f.write(base64.b64decode(file_data['content']))
+            else:
+                f.write(file_data['content'].encode('utf-8'))
+    shutil.rmtree(destination, ignore_errors=True)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(temp_dir, destination)
+
+
+def _commit_pack(commit_files: list, commit_message: str, branch: str):
+    """ブロブのアップロードは並行に行い、ツリー作成から ref の更新までは全ワーカーで1つずつ行う。"""
+    session = CommitSession()
+    session.prefetch_head(branch)
+    for file_data in commit_files:
+        if not session.upload(file_data):
+            return session.result
+    with _worker["commit_lock"]:
+        return session.commit(commit_message, branch)
+
+
+def ingest_pack(task: dict):
+    """
+    パックを1つ解析・整形し、出力先に書き出す (ワーカープロセスで実行する)。
+
+    Args:
+        task (dict): {'pack': パス, 'out': 出力ディレクトリ または None, 'github': bool,
+                      'message': コミットメッセージ, 'branch': ブランチ}
+
+    Returns:
+        dict: チェックポイントに記録する結果
+              ({'pack', 'pack_id', 'status': 'ok' / 'invalid' / 'failed', 'files', 'errors', 'timings', ...})
+    """
+    path = task["pack"]
+    record = {"pack": path, "pack_id": pack_id_for(path), **_pack_stamp(path),
+              "status": "failed", "files": 0, "errors": [], "timings": {}}
+    timings = record["timings"]
+    started = time.perf_counter()
+    _worker.update({"busy": True, "over_limit": False})
+    try:
+        # 入れ子のパックは1回だけ開き、解析とバイナリアセットの書き出しの両方に使う
+        with zipfile.ZipFile(path) as zf, open_pack_sources(zf) as sources:
+            # 1. 解析
+            client_input = parse_pack_sources_to_client_data(sources)
+            timings["parse"] = round(time.perf_counter() - started, 3)
+
+            # 2. 検証・整形 (ネットワークにはアクセスしない)
+            step = time.perf_counter()
+            commit_files, errors = prepare_files_for_commit(client_input)
+            timings["format"] = round(time.perf_counter() - step, 3)
+            if errors:
+                record.update({"status": "invalid", "errors": errors})
+                return record
+
+            # 3. 書き出し (バイナリアセットは ZIP から直接コピーする)
+            step = time.perf_counter()
+            for source in sources:
+                commit_files.extend(collect_binary_assets(source))
+            record["files"] = len(commit_files)
+            if task["out"]:
+                _write_tree(commit_files, os.path.join(task["out"], record["pack_id"]))
+            if task["github"]:
+                message = task["message"].format(pack=record["pack_id"])
+                result = _commit_pack(commit_files, message, task["branch"])
+                record["commit_sha"] = result["commit_sha"]
+                record["uploaded_bytes"] = result["uploaded_bytes"]
+                if not result["success"]:
+                    record["errors"] = [{"key": "commit", "name": record["pack_id"], "error": "GitHub commit failed"}]
+                    return record
+            timings["sink"] = round(time.perf_counter() - step, 3)
+        record["status"] = "ok"
+    except (MemoryError, KeyboardInterrupt) as e:
+        if isinstance(e, KeyboardInterrupt) and not _worker["over_limit"]:
+            raise
+        record["errors"] = [{"key": "pack", "name": record["pack_id"], "error": "Worker memory limit exceeded"}]
+    except Exception as e:
+        record["errors"] = [{"key": "pack", "name": record["pack_id"], "error": f"{type(e).__name__}: {e}"}]
+    finally:
+        _worker["busy"] = False
+        timings["total"] = round(time.perf_counter() - started, 3)
+        record["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return record
+
+
+def run_batch(packs: list, out: str = None, github: bool = False, workers: int = None,
+              checkpoint: str = BATCH_CHECKPOINT_FILE, max_memory_mb: int = None,
+              message: str = "feat: Batch ingest {pack}", branch: str = "main", verbose: bool = False):
+    """
+    パックのリストをプロセスプールで処理する。
+
+    Args:
+        packs (list): パックのパス
+        out (str): 出力ディレクトリ (<out>/<パックID>/BP/... に書き出す)
+        github (bool): True の場合はパックごとに GitHub へコミットする
+        workers (int): ワーカープロセス数 (省略時は CPU 数)
+        checkpoint (str): チェックポイントファイル (None で使わない)
+        max_memory_mb (int): ワーカー1つあたりの常駐メモリの上限 (MB)。超えたパックは失敗として記録する
+        message (str): コミットメッセージ ({pack} はパックIDに置き換える)
+
+    Returns:
+        dict: {'ok', 'invalid', 'failed', 'skipped'} の件数
+    """
+    done = load_checkpoint(checkpoint) if checkpoint else {}
+    summary = {"ok": 0, "invalid": 0, "failed": 0, "skipped": 0}
+    pending = []
+    for path in packs:
+        previous = done.get(path)
+        if previous and previous["status"] == "ok" and all(previous.get(k) == v for k, v in _pack_stamp(path).items()):
+            summary["skipped"] += 1
+        else:
+            pending.append({"pack": path, "out": out, "github": github, "message": message, "branch": branch})
+    print(f"Batch_Start:Packs:{len(packs)}_Pending:{len(pending)}_Skipped:{summary['skipped']}")
+    if not pending:
+        return summary
+
+    workers = workers or os.cpu_count() or 1
+    commit_lock = multiprocessing.Lock()
+    crashes = collections.Counter()   # パックごとの、処理中にプールが壊れた回数
+    started = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        checkpoint_file = stack.enter_context(open(checkpoint, 'a', encoding='utf-8')) if checkpoint else None
+
+        def run_pool(tasks):
+            # ワーカーが異常終了しても multiprocessing.Pool のように止まらず、BrokenProcessPool になる。
+            # 結果を受け取れなかったパックのリストを返す
+            broken = []
+            with ProcessPoolExecutor(min(workers, len(tasks)), initializer=_init_worker,
+                                     initargs=(max_memory_mb, commit_lock, verbose)) as pool:
+                futures = {pool.submit(ingest_pack, task): task for task in tasks}
+                for future in as_completed(futures):
+                    try:
+                        record = future.result()
+                    except BrokenProcessPool:
+                        broken.append(futures[future])
+                        continue
+                    summary[record["status"]] += 1
+                    timings = "_".join(f"{name.capitalize()}:{value:.2f}s" for name, value in record["timings"].items())
+                    print(f"Batch_Pack:{record['pack_id']}_Status:{record['status']}_Files:{record['files']}_{timings}"
+                          f"_MaxRSS:{record['max_rss_mb']}MB")
+                    for error in record["errors"]:
+                        print(f"  Batch_Error:{error['key']}/{error['name']}_{error['error']}")
+                    if checkpoint_file:
+                        append_checkpoint(checkpoint_file, record)
+            return broken
+
+        while pending:
+            # 一度プールが壊れたときに処理中だったパックは、原因を特定できるように1つずつ別のプールで処理する
+            normal = [task for task in pending if not crashes[task["pack"]]]
+            groups = ([normal] if normal else []) + [[task] for task in pending if crashes[task["pack"]]]
+            broken = [task for group in groups for task in run_pool(group)]
+
+            # 終わっていないパックは新しいプールで処理し直す。何度も壊れるパックは記録せずに失敗とする
+            # (次回の実行で処理し直す)
+            pending = []
+            for task in broken:
+                crashes[task["pack"]] += 1
+                if crashes[task["pack"]] > BATCH_POOL_RESTARTS:
+                    summary["failed"] += 1
+                    print(f"Batch_Pack:{pack_id_for(task['pack'])}_Status:failed_Worker_Process_Died")
+                else:
+                    pending.append(task)
+            if pending:
+                print(f"Batch_Pool_Restarted:Resubmitted:{len(pending)}")
+
+    print(f"Batch_Finished:{summary}_Elapsed:{time.perf_counter() - started:.2f}s")
+    return summary
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="アドオンパックをまとめて解析・整形し、ディスクか GitHub に書き出す。")
+    parser.add_argument("inputs", nargs="+", help="パックのディレクトリ・ファイル・glob パターン")
+    parser.add_argument("--out", help="出力ディレクトリ (<out>/<パックID>/BP/...)")
+    parser.add_argument("--github", action="store_true", help="パックごとに GitHub へコミットする (GITHUB_TOKEN が必要)")
+    parser.add_argument("--workers", type=int, help="ワーカープロセス数 (既定: CPU 数)")
+    parser.add_argument("--checkpoint", default=BATCH_CHECKPOINT_FILE, help="チェックポイントファイル")
+    parser.add_argument("--no-checkpoint", action="store_true", help="チェックポイントを使わない")
+    parser.add_argument("--max-memory-mb", type=int, help="ワーカー1つあたりのメモリ上限 (MB)")
+    parser.add_argument("--message", default="feat: Batch ingest {pack}", help="コミットメッセージ ({pack} はパックID)")
+    parser.add_argument("--branch", default="main")
+    parser.add_argument("--verbose", action="store_true", help="ワーカーのログも表示する")
+    args = parser.parse_args(argv)
+
+    if not args.out and not args.github:
+        parser.error("--out か --github のどちらかを指定してください。")
+    if args.github and not GITHUB_TOKEN:
+        parser.error("--github には GITHUB_TOKEN が必要です。")
+
+    packs = find_packs(args.inputs)
+    pack_ids = [pack_id_for(path) for path in packs]
+    duplicates = sorted({pack_id for pack_id in pack_ids if pack_ids.count(pack_id) > 1})
+    if args.out and duplicates:
+        parser.error(f"同じパックIDのパックがあります: {', '.join(duplicates)}")
+
+    summary = run_batch(packs, out=args.out, github=args.github, workers=args.workers,
+                        checkpoint=None if args.no_checkpoint else args.checkpoint,
+                        max_memory_mb=args.max_memory_mb, message=args.message, branch=args.branch,
+                        verbose=args.verbose)
+    return 1 if summary["failed"] or summary["invalid"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# --- マイクロベンチマーク ---
+# パックの処理の各段階 (ルールによる抽出・ストリーミング抽出・AI の整形・鉱石分布・構造物のタイル分割・
+# ブロブのボディ生成・Molang の解析・レコード) を、GitHub やアプリを起動せずに単体で計る。
+# アプリ全体のスループットは load_driver.py で計る。
+#
+#   python benchmarks.py                      # 全ケース
+#   python benchmarks.py rules molang --scale 4
+#
+# 各ケースは最適化した実装と、比較対象 (1ルールずつの走査・json.load・キャッシュしない解析・辞書など) の
+# 所要時間 (秒) とピークメモリ (tracemalloc、MB) を JSON で出力する。--scale でデータの量を変える
+# (テストでは小さい値で全ケースが動くことだけを確かめる)。
+
+
+def _measure(func, repeat: int = 1):
+    """
+    func() を repeat 回実行し、(最後の戻り値, {'seconds': 最短の所要時間, 'peak_mb': ピークメモリ}) を返す。
+    モジュールのログ出力は計測に含めない。
+    """
+    best, peak, result = None, 0, None
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func()
+        elapsed = time.perf_counter() - started
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best = elapsed if best is None else min(best, elapsed)
+    return result, {"seconds": round(best, 4), "peak_mb": round(peak / (1024 * 1024), 2)}
+
+
+def _entity(index: int, behaviors: int = 8):
+    components = {
+        "minecraft:health": {"value": 10 + index % 20},
+        "minecraft:movement": {"value": 0.25},
+        "minecraft:type_family": {"family": ["mob", "bench"]},
+        "minecraft:physics": {}, "minecraft:pushable": {"is_pushable": True},
+    }
+    for b in range(behaviors):
+        components[f"minecraft:behavior.bench_{b}"] = {"priority": b, "speed_multiplier": 1.0}
+    return {"format_version": "1.16.0", "minecraft:entity": {
+        "description": {"identifier": f"bench:mob{index}", "is_spawnable": True},
+        "component_groups": {f"group_{g}": {"minecraft:scale": {"value": 0.5 + g}} for g in range(4)},
+        "components": components,
+        "events": {f"event_{e}": {"add": {"component_groups": [f"group_{e}"]}} for e in range(4)},
+    }}
+
+
+# --- ケース ---
+
+def bench_rules(scale: float):
+    """[ルール] 全ルールを1回の走査で取り出す CompiledRuleSet と、ルールごとに走査する場合の比較。"""
+    from pack_parser import MAPPING_RULES, CompiledRuleSet
+
+    rules = MAPPING_RULES["BP/entities"]["rules"]
+    documents = [_entity(i) for i in range(int(2000 * scale) or 1)]
+    combined = CompiledRuleSet(rules)
+    per_rule = [CompiledRuleSet({target_key: rule}) for target_key, rule in rules.items()]
+
+    def compiled():
+        return [combined.extract(document) for document in documents]
+
+    def rule_by_rule():
+        results = []
+        for document in documents:
+            extracted = {}
+            for matcher in per_rule:
+                extracted.update(matcher.extract(document))
+            results.append(extracted)
+        return results
+
+    expected, compiled_stats = _measure(compiled, repeat=3)
+    baseline, baseline_stats = _measure(rule_by_rule, repeat=3)
+    assert baseline == expected
+    return {"documents": len(documents), "rules": len(rules), "compiled": compiled_stats, "per_rule": baseline_stats}
+
+
+def bench_streaming(scale: float):
+    """
+    [ストリーミング] 巨大なエンティティ (ルールの対象外のダメージセンサーが大部分) からの抽出。
+    stream_extract と json.load + extract の比較。
+    """
+    from pack_parser import COMPILED_RULES, stream_extract
+
+    matcher = COMPILED_RULES["BP/entities"]["matcher"]
+    document = _entity(0)
+    triggers = [{"on_damage": {"filters": {"all_of": [
+        {"test": "has_damage", "value": "fall"}, {"test": "is_family", "subject": "other", "value": f"family_{i}"}]},
+        "event": f"event_{i % 4}"}, "deals_damage": False} for i in range(int(30000 * scale) or 1)]
+    document["minecraft:entity"]["components"]["minecraft:damage_sensor"] = {"triggers": triggers}
+    data = json.dumps(document, indent=2).encode("utf-8")
+
+    def streaming():
+        return stream_extract(io.BytesIO(data), matcher)
+
+    def loaded():
+        return matcher.extract(json.load(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")))
+
+    expected, streaming_stats = _measure(streaming)
+    baseline, baseline_stats = _measure(loaded)
+    assert baseline == expected
+    return {"document_mb": round(len(data) / (1024 * 1024), 2), "stream_extract": streaming_stats,
+            "json_load": baseline_stats}
+
+
+def bench_ai(scale: float):
+    """[AI] ai_behaviors.json のレジストリによる多数のモブの AI の検証・整形。"""
+    from ai import BEHAVIOR_REGISTRY, compile_ai_behaviors_batch
+
+    component_keys = sorted({spec["component"] for spec in BEHAVIOR_REGISTRY.values()})
+    behaviors = [{"type": key, "priority": priority} for priority, key in enumerate(component_keys)]
+    mob_behaviors = {f"mob{i}": behaviors for i in range(int(5000 * scale) or 1)}
+
+    result, stats = _measure(lambda: compile_ai_behaviors_batch(mob_behaviors), repeat=3)
+    return {"mobs": len(mob_behaviors), "behaviors_per_mob": len(behaviors),
+            "errors": len(result["errors"]), "batch": stats}
+
+
+def bench_ore(scale: float):
+    """[鉱石] 鉱石分布のシミュレーション。初回 (キャッシュなし) とキャッシュ済みの比較。"""
+    from environment import _simulate_ore_distribution_cached, simulate_ore_distribution
+
+    ore_frequency = {"coal": 0.01, "iron": {"frequency": 0.006, "min_y": -16, "max_y": 112},
+                     "diamond": {"frequency": 0.0008, "min_y": -64, "max_y": 16}, "gold": 0.002}
+    chunk_count = int(10000 * scale) or 1
+    _simulate_ore_distribution_cached.cache_clear()
+    _, cold = _measure(lambda: simulate_ore_distribution(ore_frequency, chunk_count))
+    _, cached = _measure(lambda: simulate_ore_distribution(ore_frequency, chunk_count), repeat=3)
+    return {"chunks": chunk_count, "ores": len(ore_frequency), "cold": cold, "cached": cached}
+
+
+def bench_tiling(scale: float):
+    """[タイル分割] np.memmap の巨大な構造物をタイルに分割して書き出す。ピークメモリはタイル程度になる。"""
+    from structure import BEDROCK_BLOCK_VERSION, STRUCTURE_MAX_SIZE, write_structure_tiles
+
+    side = max(8, int(256 * scale ** 0.5))
+    size = (side, 64, side)
+    palette = [{"name": f"minecraft:block_{i}", "states": {}, "version": BEDROCK_BLOCK_VERSION} for i in range(16)]
+    with tempfile.TemporaryDirectory(prefix="bench_tiles_") as work_dir:
+        blocks = np.memmap(os.path.join(work_dir, "blocks.bin"), dtype=np.int32, mode="w+", shape=size)
+        blocks[:] = np.arange(size[0] * size[1] * size[2], dtype=np.int32).reshape(size) % len(palette)
+        blocks.flush()
+        structure = {"size": size, "palette": palette, "blocks": blocks, "origin": [0, 0, 0]}
+        tile_size = (min(STRUCTURE_MAX_SIZE[0], side // 2), 64, min(STRUCTURE_MAX_SIZE[2], side // 2))
+        manifest, stats = _measure(lambda: write_structure_tiles(structure, "bench", os.path.join(work_dir, "out"),
+                                                                 tile_size))
+    return {"size": list(size), "blocks_mb": round(blocks.nbytes / (1024 * 1024), 2),
+            "tiles": len(manifest["tiles"]), "write_structure_tiles": stats}
+
+
+def bench_payload(scale: float):
+    """[ブロブ] 大きなファイルのブロブ作成のボディ。チャンクずつの Base64 と全体の Base64 の比較。"""
+    import base64
+
+    from github_uploader import _blob_request_body
+
+    size = int(64 * 1024 * 1024 * scale) or 1
+    with tempfile.NamedTemporaryFile(prefix="bench_blob_", delete=False) as f:
+        for _ in range(0, size, 1024 * 1024):
+            f.write(os.urandom(min(1024 * 1024, size - f.tell())))
+        path = f.name
+    try:
+        def chunked():
+            return sum(len(part) for part in _blob_request_body(lambda: open(path, "rb")))
+
+        def whole():
+            with open(path, "rb") as source:
+                content = base64.b64encode(source.read()).decode("utf-8")
+            return len(json.dumps({"content": content, "encoding": "base64"}).encode("utf-8"))
+
+        _, chunked_stats = _measure(chunked)
+        _, whole_stats = _measure(whole)
+    finally:
+        os.remove(path)
+    return {"file_mb": round(size / (1024 * 1024), 2), "chunked": chunked_stats, "whole": whole_stats}
+
+
+def bench_molang(scale: float):
+    """[Molang] 同じ式が繰り返し出てくるアニメーションの検証。キャッシュする解析としない解析の比較。"""
+    from molang import _parse, parse_molang, validate_molang_document
+
+    expressions = ["math.cos(query.anim_time * 38.17) * 80.0", "query.is_baby ? 0.5 : 1.0",
+                   "variable.attack_time > 0 && !query.is_in_water", "-query.target_x_rotation"]
+    animations = {f"animation.bench.{a}": {"loop": True, "bones": {
+        f"bone{b}": {"rotation": [expressions[(a + b) % 4], 0, expressions[b % 4]]} for b in range(20)}}
+        for a in range(int(500 * scale) or 1)}
+    document = {"format_version": "1.8.0", "animations": animations}
+
+    def cached():
+        parse_molang.cache_clear()
+        return validate_molang_document("RP/animations", document)
+
+    def uncached():
+        return validate_molang_document("RP/animations", document, parse=_parse)
+
+    expected, cached_stats = _measure(cached, repeat=3)
+    baseline, baseline_stats = _measure(uncached, repeat=3)
+    assert baseline == expected
+    return {"expressions": expected["expressions"], "cached": cached_stats, "uncached": baseline_stats}
+
+
+def bench_records(scale: float):
+    """[レコード] 多数のモブの抽出結果のメモリ。MobSpec (__slots__) と辞書の比較。"""
+    from pack_parser import COMPILED_RULES
+    from records import MobSpec
+
+    matcher = COMPILED_RULES["BP/entities"]["matcher"]
+    template = matcher.extract(_entity(0, behaviors=0))
+    count = int(50000 * scale) or 1
+
+    def records():
+        return [MobSpec.from_dict({**template, "hp": i}) for i in range(count)]
+
+    def dicts():
+        return [{**template, "hp": i} for i in range(count)]
+
+    specs, records_stats = _measure(records)
+    plain, dicts_stats = _measure(dicts)
+    assert specs[-1].to_dict() == plain[-1]
+    return {"mobs": count, "records": records_stats, "dicts": dicts_stats}
+
+
+BENCHMARKS = {
+    "rules": bench_rules,
+    "streaming": bench_streaming,
+    "ai": bench_ai,
+    "ore": bench_ore,
+    "tiling": bench_tiling,
+    "payload": bench_payload,
+    "molang": bench_molang,
+    "records": bench_records,
+}
+
+
+def run_benchmarks(names: list = None, scale: float = 1.0):
+    """
+    ベンチマークを実行する。
+
+    Args:
+        names (list): BENCHMARKS のキー (省略時は全て)
+        scale (float): データの量の倍率
+
+    Returns:
+        dict: {ケース名: 計測結果}
+    """
+    return {name: BENCHMARKS[name](scale) for name in names or BENCHMARKS}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="パックの処理の各段階のマイクロベンチマーク")
+    parser.add_argument("names", nargs="*", metavar="name",
+                        help=f"実行するケース ({', '.join(BENCHMARKS)}。省略時は全て)")
+    parser.add_argument("--scale", type=float, default=1.0, help="データの量の倍率")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"不明なケース: {', '.join(unknown)}")
+
+    report = run_benchmarks(args.names, args.scale)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
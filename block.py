@@ -1,3 +1,4 @@
+import copy
 import json
 import uuid
 
@@ -43,7 +44,7 @@ def validate_and_format_block_data(block_name: str, client_data: dict):
         return {"error": "Missing required block properties: hardness or resistance."}
     
     # 2. テンプレートのコピーとidentifierの設定
-    final_json = BLOCK_TEMPLATE.copy()
+    final_json = copy.deepcopy(BLOCK_TEMPLATE)
     
     # 内部識別子 (例: custom:custom_ore) を設定
     identifier = f"custom:{block_name}"
@@ -1,4 +1,9 @@
+import copy
+import functools
 import json
+import numbers
+
+import numpy as np
 
 # JSONファイルのバージョンは、対象となるRP/BPファイルに合わせる
 FORMAT_VERSION_ENV = "1.13.0" 
@@ -83,10 +88,121 @@ def format_world_generation_parameters(client_generation_data: dict):
             {"type": ore, "frequency": freq} for ore, freq in ore_freq.items()
         ]
         print(f"Custom_Ore_Types_Found:{len(ore_freq)}")
+
+        # チューニング用: 'simulate' が指定された場合は分布のシミュレーション結果を添付する
+        simulate = client_generation_data.get('simulate')
+        if simulate:
+            options = simulate if isinstance(simulate, dict) else {}
+            formatted_generation_settings['ore_simulation'] = simulate_ore_distribution(
+                ore_freq,
+                chunk_count=options.get('chunk_count', 1000),
+                seed=options.get('seed', 0),
+            )
         
     return formatted_generation_settings
 
 
+
+# --- 3. 鉱石分布シミュレーター (ore_frequency のチューニング用) ---
+# ore_frequency の値を「高さ範囲内の1ブロックあたりの生成確率」とみなし、
+# 指定したチャンク数だけ鉱石の配置を NumPy でまとめてシミュレートする。
+CHUNK_FOOTPRINT = 16 * 16  # 1チャンク列あたりの水平ブロック数
+DEFAULT_ORE_HEIGHT_RANGE = (-64, 320)
+HEIGHT_HISTOGRAM_STEP = 16  # 高さヒストグラムのビン幅 (ブロック)
+
+
+def normalize_ore_specs(ore_frequency: dict, height_range: tuple = DEFAULT_ORE_HEIGHT_RANGE):
+    """
+    ore_frequency を (鉱石名, 確率, min_y, max_y) のタプルに正規化する。
+    値は数値 (確率のみ) か {'frequency': ..., 'min_y': ..., 'max_y': ...} のどちらでもよい。
+    """
+    specs = []
+    for ore, spec in sorted(ore_frequency.items()):
+        if isinstance(spec, dict):
+            frequency = float(spec.get('frequency', 0.0))
+            min_y = int(spec.get('min_y', height_range[0]))
+            max_y = int(spec.get('max_y', height_range[1]))
+        else:
+            frequency = float(spec)
+            min_y, max_y = int(height_range[0]), int(height_range[1])
+        specs.append((ore, min(max(frequency, 0.0), 1.0), min_y, max(max_y, min_y + 1)))
+    return tuple(specs)
+
+
+@functools.lru_cache(maxsize=128)
+def _simulate_ore_distribution_cached(ore_specs: tuple, chunk_count: int, seed: int):
+    rng = np.random.default_rng(seed)
+
+    names = [spec[0] for spec in ore_specs]
+    probability = np.array([spec[1] for spec in ore_specs])
+    min_y = np.array([spec[2] for spec in ore_specs])
+    max_y = np.array([spec[3] for spec in ore_specs])
+    blocks_per_chunk = CHUNK_FOOTPRINT * (max_y - min_y)
+
+    # チャンクごとの鉱石数: 各ブロックが独立に確率 p で鉱石になる → 二項分布 (鉱石 x チャンク を一度に生成)
+    counts = rng.binomial(blocks_per_chunk[:, None], probability[:, None], size=(len(names), chunk_count))
+
+    # 高さヒストグラム: 範囲内で一様に配置された鉱石のビンごとの数 → 多項分布 (全鉱石を一度に生成)
+    edges = np.arange(min_y.min(), max_y.max() + HEIGHT_HISTOGRAM_STEP, HEIGHT_HISTOGRAM_STEP)
+    overlap = np.clip(
+        np.minimum(edges[None, 1:], max_y[:, None]) - np.maximum(edges[None, :-1], min_y[:, None]), 0, None
+    )
+    bin_probability = overlap / overlap.sum(axis=1, keepdims=True)
+    height_counts = rng.multinomial(counts.sum(axis=1), bin_probability)
+
+    percentiles = np.percentile(counts, [5, 50, 95], axis=1)
+
+    result = {"chunk_count": chunk_count, "seed": seed, "ores": {}}
+    for i, ore in enumerate(names):
+        count_hist, count_edges = np.histogram(counts[i], bins=min(20, int(counts[i].max()) + 1))
+        result["ores"][ore] = {
+            "frequency": float(probability[i]),
+            "height_range": [int(min_y[i]), int(max_y[i])],
+            "total": int(counts[i].sum()),
+            "per_chunk": {
+                "mean": float(counts[i].mean()),
+                "std": float(counts[i].std()),
+                "min": int(counts[i].min()),
+                "max": int(counts[i].max()),
+                "p5": float(percentiles[0, i]),
+                "p50": float(percentiles[1, i]),
+                "p95": float(percentiles[2, i]),
+                "histogram": {"edges": count_edges.tolist(), "counts": count_hist.tolist()},
+            },
+            "height_histogram": {"edges": edges.tolist(), "counts": height_counts[i].tolist()},
+        }
+    return result
+
+
+def simulate_ore_distribution(ore_frequency: dict, chunk_count: int = 1000,
+                              height_range: tuple = DEFAULT_ORE_HEIGHT_RANGE, seed: int = 0):
+    """
+    ore_frequency から鉱石の分布をシミュレートし、チャンクごとの個数分布と高さヒストグラムを返す。
+    同じパラメータの結果はキャッシュされる (チューニングUIからの繰り返し呼び出し向け)。
+
+    Args:
+        ore_frequency (dict): {鉱石名: 確率 または {'frequency', 'min_y', 'max_y'}}
+        chunk_count (int): シミュレートするチャンク列の数
+        height_range (tuple): 高さ範囲を指定していない鉱石に使う (min_y, max_y)
+        seed (int): 乱数シード
+
+    Returns:
+        dict: {'chunk_count', 'seed', 'ores': {鉱石名: {'total', 'per_chunk', 'height_histogram', ...}}}
+
+    Raises:
+        ValueError: chunk_count が 1 以上の整数でない場合
+    """
+    if isinstance(chunk_count, bool) or not isinstance(chunk_count, numbers.Integral) or chunk_count < 1:
+        raise ValueError(f"chunk_count must be an integer >= 1: {chunk_count!r}")
+    ore_specs = normalize_ore_specs(ore_frequency, height_range)
+    if not ore_specs:
+        return {"chunk_count": chunk_count, "seed": seed, "ores": {}}
+
+    result = _simulate_ore_distribution_cached(ore_specs, int(chunk_count), int(seed))
+    print(f"Ore_Simulation_Done:{len(ore_specs)}_ores_{chunk_count}_chunks")
+    # キャッシュ内の結果を呼び出し側で書き換えられないようにコピーを返す
+    return copy.deepcopy(result)
+
 # --- 実行例 ---
 
 # 1. クライアントからカスタムバイオームの描画設定が送られてきたと仮定
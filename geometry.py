@@ -1,6 +1,11 @@
+import collections
 import json
+import math
+import os
 import uuid
 
+import numpy as np
+
 # モデル定義JSONのバージョン (BedrockのジオメトリJSONのバージョン)
 FORMAT_VERSION_MODEL = "1.12.0" 
 print(f"MODEL_FORMAT_VERSION:{FORMAT_VERSION_MODEL}")
@@ -74,6 +79,273 @@ def format_rp_custom_geometry(model_name: str, texture_width: int, texture_heigh
     print(f"Total_Bones_Formatted:{len(formatted_bones)}")
     return geometry_json
 
+
+# --- キューブの結合と間引き ---
+# 外部のエディタで作ったモデルやボクセルアートを変換したモデルは、同じ色の小さなキューブが大量に隣り合っている。
+# 描画の負荷はキューブ (面・頂点) の数に比例するため、見た目を変えずにキューブを減らす:
+#
+#   1. 大きさの無いキューブを消す (2辺以上が 0 の線・点は何も描画されない。1辺だけ 0 の板は残す)
+#   2. 完全に隠れているキューブを消す: 6面とも、同じボーン・同じ回転の別のキューブが面の外側まで覆っているもの
+#      (覆う側は面が全て揃った閉じた箱に限る)。覆う側も一緒に消える場合でも、消えるキューブ全体の外面は必ず
+#      残るキューブに覆われる (外面の点を覆うキューブが消えるなら、その点は外面ではない) ので、まとめて消してよい
+#   3. 隣り合うキューブを結合する: 同じボーンで、origin / size 以外 (UV・回転・ピボットなど) が全て同じで、
+#      接する (または重なる) 面の断面が一致するもの。面ごとの UV (per-face UV) で6面とも1テクセルの範囲を指している場合に限る
+#      (1色で塗られた面は引き伸ばしても見た目が変わらない。Box UV はサイズでテクスチャの配置が変わるため結合しない)。
+#      inflate が 0 でないキューブは結合しない (inflate はキューブごとに掛かるので、結合すると隙間や重なりが変わる)
+#
+# テクスチャは不透明 (またはアルファテスト) で、テクスチャの解像度が texture_width / texture_height と一致する前提。
+# 材質 (半透明かどうか) はジオメトリからは分からず、半透明の材質では重なりの見え方が変わるため、
+# GEOMETRY_OPTIMIZE=1 を指定した場合だけ行う (不透明な材質だけを使うサーバー向け)。
+# 座標は 1/GEOMETRY_COORD_SCALE 単位の整数にして numpy でまとめて比較する (浮動小数点の誤差で隣接を見逃さない)。
+GEOMETRY_OPTIMIZE = os.environ.get("GEOMETRY_OPTIMIZE", "0") == "1"
+GEOMETRY_COORD_SCALE = 10000
+CUBE_FACES = ("north", "east", "south", "west", "up", "down")
+INFLATE_SIGNS = np.array([-1, -1, -1, 1, 1, 1])
+# 隠れているかの判定で一度に比較するキューブの数 (近いキューブだけを比較するので、小さいほど比較が減る)
+CULL_CHUNK_ROWS = 128
+
+
+def _solid_face(face) -> bool:
+    """面の UV が1テクセルの範囲に収まっている (1色で塗られる) か。"""
+    if not isinstance(face, dict):
+        return False
+    uv, uv_size = face.get("uv"), face.get("uv_size")
+    if not (isinstance(uv, list) and isinstance(uv_size, list) and len(uv) == 2 and len(uv_size) == 2):
+        return False
+    try:
+        for start, size in zip(uv, uv_size):
+            low, high = min(start, start + size), max(start, start + size)
+            if math.floor(low) < math.ceil(high) - 1:
+                return False
+    except TypeError:
+        return False
+    return True
+
+
+def _cube_arrays(cubes: list, bone_inflate=0):
+    """
+    キューブのリストを numpy の配列にする。inflate を持たないキューブにはボーンの inflate を使う。
+
+    Returns:
+        dict: boxes (N, 6) の整数座標 [x0, y0, z0, x1, y1, z1] / inflate / valid (座標が数値のもの) /
+              closed (6面とも描画される) / faces (描画される面の数) / transform, merge (同じ値どうしが比較・結合の対象。-1 は対象外)
+    """
+    count = len(cubes)
+    boxes = np.zeros((count, 6), dtype=np.int64)
+    inflate = np.zeros(count, dtype=np.int64)
+    valid = np.zeros(count, dtype=bool)
+    closed = np.zeros(count, dtype=bool)
+    faces = np.zeros(count, dtype=np.int64)
+    transform = np.full(count, -1, dtype=np.int64)
+    merge = np.full(count, -1, dtype=np.int64)
+    transform_ids, merge_ids = {}, {}
+
+    for i, cube in enumerate(cubes):
+        if not isinstance(cube, dict):
+            continue
+        uv = cube.get("uv")
+        faces[i] = sum(1 for face in CUBE_FACES if isinstance(uv.get(face), dict)) if isinstance(uv, dict) else 6
+        try:
+            origin = [round(float(v) * GEOMETRY_COORD_SCALE) for v in cube["origin"]]
+            size = [round(float(v) * GEOMETRY_COORD_SCALE) for v in cube["size"]]
+            inflate[i] = round(float(cube.get("inflate", bone_inflate)) * GEOMETRY_COORD_SCALE)
+        except (KeyError, TypeError, ValueError):
+            continue
+        if len(origin) != 3 or len(size) != 3 or min(size) < 0:
+            continue
+        boxes[i] = origin + [o + s for o, s in zip(origin, size)]
+        valid[i] = True
+        closed[i] = faces[i] == 6
+
+        # 回転しないキューブはピボットに関係なく同じ座標系
+        rotation = cube.get("rotation")
+        transform_key = json.dumps([rotation, cube.get("pivot")]) if rotation and any(rotation) else ""
+        transform[i] = transform_ids.setdefault(transform_key, len(transform_ids))
+        if isinstance(uv, dict) and not inflate[i]:
+            # 同じ UV のキューブは多いので、面の判定はキーごとに1回だけ行う
+            merge_key = json.dumps({k: v for k, v in cube.items() if k not in ("origin", "size")}, sort_keys=True)
+            if merge_key not in merge_ids:
+                solid = all(_solid_face(uv.get(face)) for face in CUBE_FACES)
+                merge_ids[merge_key] = len(merge_ids) if solid else -1
+            merge[i] = merge_ids[merge_key]
+
+    return {"boxes": boxes, "inflate": inflate, "valid": valid, "closed": closed, "faces": faces,
+            "transform": transform, "merge": merge}
+
+
+def _covered_cubes(boxes, transform, candidates, coverers):
+    """candidates のうち、6面とも coverers のどれか1つに (面の外側まで) 覆われているキューブ (bool 配列)。"""
+    covered = np.zeros(len(boxes), dtype=bool)
+    rows = np.flatnonzero(candidates)
+    cols = np.flatnonzero(coverers)
+    if not len(rows) or not len(cols):
+        return covered
+    # 回転の異なるキューブが無ければ座標系の比較は省く
+    mixed = len(np.unique(transform[cols])) > 1 or len(np.unique(transform[rows])) > 1
+    # 覆う側は必ず覆われる側に接しているので、近いキューブどうしが同じチャンクに入るよう並べ、
+    # チャンクの範囲に接するものだけと比較する (N x N の比較を避ける)
+    rows = rows[np.lexsort((boxes[rows, 2], boxes[rows, 1], boxes[rows, 0]))]
+    col_boxes = boxes[cols]
+    for start in range(0, len(rows), CULL_CHUNK_ROWS):
+        chunk = rows[start:start + CULL_CHUNK_ROWS]
+        box = boxes[chunk][:, None, :]
+        near = (col_boxes[:, :3] <= boxes[chunk, 3:].max(axis=0)).all(axis=1) & \
+               (col_boxes[:, 3:] >= boxes[chunk, :3].min(axis=0)).all(axis=1)
+        other = col_boxes[near][None, :, :]
+        # contains[axis]: その軸の範囲が覆う側に含まれる
+        contains = [(other[:, :, axis] <= box[:, :, axis]) & (other[:, :, axis + 3] >= box[:, :, axis + 3])
+                    for axis in range(3)]
+        if mixed:
+            same = transform[chunk][:, None] == transform[cols[near]][None, :]
+            contains = [mask & same for mask in contains]
+        all_faces = np.ones(len(chunk), dtype=bool)
+        for axis in range(3):
+            first, second = [a for a in range(3) if a != axis]
+            section = contains[first] & contains[second]
+            low, high = box[:, :, axis], box[:, :, axis + 3]
+            # + 側の面: 面に接するか重なり、面の外側まで伸びている / - 側の面も同様
+            plus = section & (other[:, :, axis] <= high) & (other[:, :, axis + 3] > high)
+            minus = section & (other[:, :, axis + 3] >= low) & (other[:, :, axis] < low)
+            all_faces &= plus.any(axis=1) & minus.any(axis=1)
+        covered[chunk] = all_faces
+    return covered
+
+
+def _merge_axis(boxes, keys, members, axis: int):
+    """
+    axis 方向に接している (または重なっている) 同じキーで断面が一致するキューブを結合する。
+
+    Returns:
+        tuple: (boxes, keys, members) 結合後の配列。members は元のリストでの最小の位置 (出力の順番と雛形に使う)
+    """
+    first, second = [a for a in range(3) if a != axis]
+    order = np.lexsort((boxes[:, axis], boxes[:, second + 3], boxes[:, second],
+                        boxes[:, first + 3], boxes[:, first], keys))
+    boxes, keys, members = boxes[order], keys[order], members[order]
+    section = boxes[:, [first, first + 3, second, second + 3]]
+    new_group = np.ones(len(boxes), dtype=bool)
+    new_group[1:] = (keys[1:] != keys[:-1]) | (section[1:] != section[:-1]).any(axis=1)
+    # グループごとにずらしてから累積最大を取ると、グループ内でそれまでの最も遠い端 (区間の和) になる
+    span = int(boxes[:, [axis, axis + 3]].max() - boxes[:, [axis, axis + 3]].min()) + 1
+    offset = np.cumsum(new_group) * span
+    reach = np.maximum.accumulate(boxes[:, axis + 3] + offset)
+    starts = np.flatnonzero(new_group | np.concatenate([[True], boxes[1:, axis] + offset[1:] > reach[:-1]]))
+    ends = np.append(starts[1:], len(boxes)) - 1
+
+    merged = boxes[starts].copy()
+    merged[:, axis + 3] = reach[ends] - offset[ends]
+    return merged, keys[starts], np.minimum.reduceat(members, starts)
+
+
+def _merge_boxes(boxes, keys, members):
+    """x, y, z の順に結合を繰り返し、1周して減らなくなったら終える。"""
+    while len(boxes) > 1:
+        before = len(boxes)
+        for axis in range(3):
+            boxes, keys, members = _merge_axis(boxes, keys, members, axis)
+        if len(boxes) == before:
+            break
+    return boxes, keys, members
+
+
+def _coordinate(value):
+    value = int(value) / GEOMETRY_COORD_SCALE
+    return int(value) if value.is_integer() else value
+
+
+def optimize_cubes(cubes: list, bone_inflate=0):
+    """
+    1つのボーンのキューブを結合・間引きする (見た目は変えない。方針はこのセクションの先頭を参照)。
+
+    Args:
+        cubes (list): ボーンの 'cubes' (元のリストと辞書は変更しない)
+        bone_inflate: ボーンの inflate (inflate を持たないキューブに掛かる)
+
+    Returns:
+        tuple: (新しいキューブのリスト, 統計 {'cubes_before', 'cubes_after', 'vertices_before', 'vertices_after',
+                'degenerate', 'culled', 'merged'})
+    """
+    arrays = _cube_arrays(cubes, bone_inflate)
+    boxes, valid, closed, faces = arrays["boxes"], arrays["valid"], arrays["closed"], arrays["faces"]
+    inflate, transform, merge = arrays["inflate"], arrays["transform"], arrays["merge"]
+
+    # 1. 2辺以上が 0 (inflate 込み) のキューブは何も描画されない
+    sizes = boxes[:, 3:] - boxes[:, :3] + 2 * inflate[:, None]
+    degenerate = valid & ((sizes <= 0).sum(axis=1) >= 2)
+    keep = ~degenerate
+
+    # 2. 隠れているキューブを消す (inflate 込みの範囲で判定する)。結合の前に消すと、ボクセルの内部の
+    #    (外から見えない色の) キューブが結合の邪魔をしない
+    inflated = boxes + inflate[:, None] * INFLATE_SIGNS
+    culled = _covered_cubes(inflated, transform, valid & keep, valid & keep & closed)
+    keep &= ~culled
+
+    # 3. 結合できるキューブを結合する (出力の位置は、元のリストで最初に現れるキューブの位置)
+    mergeable = np.flatnonzero(keep & (merge >= 0))
+    merged_boxes, _, representatives = _merge_boxes(boxes[mergeable], merge[mergeable], mergeable)
+    others = np.flatnonzero(keep & (merge < 0))
+    final_index = np.concatenate([representatives, others])
+    final_boxes = np.concatenate([merged_boxes, boxes[others]])
+    merged_count = len(mergeable) - len(merged_boxes)
+
+    # 4. 結合して大きくなったキューブに覆われるようになったものを消す
+    inflated = final_boxes + inflate[final_index][:, None] * INFLATE_SIGNS
+    candidates = valid[final_index]
+    culled_after = _covered_cubes(inflated, transform[final_index], candidates, candidates & closed[final_index])
+    order = np.argsort(final_index, kind="stable")
+    order = order[~culled_after[order]]
+
+    result = []
+    for position in order:
+        index = int(final_index[position])
+        cube = cubes[index]
+        box = final_boxes[position]
+        if valid[index] and not np.array_equal(box, boxes[index]):
+            cube = dict(cube)
+            cube["origin"] = [_coordinate(v) for v in box[:3]]
+            cube["size"] = [_coordinate(v) for v in box[3:] - box[:3]]
+        result.append(cube)
+
+    kept_faces = faces[final_index[order]]
+    stats = {"cubes_before": len(cubes), "cubes_after": len(result),
+             "vertices_before": int(faces.sum()) * 4, "vertices_after": int(kept_faces.sum()) * 4,
+             "degenerate": int(degenerate.sum()), "culled": int(culled.sum() + culled_after.sum()),
+             "merged": merged_count}
+    return result, stats
+
+
+def optimize_geometry(geometry_json: dict):
+    """
+    ジオメトリJSON (minecraft:geometry) の全てのボーンのキューブを optimize_cubes で減らす。ボーンは新しい辞書に置き換える。
+
+    Returns:
+        dict: 統計の合計 (optimize_cubes と同じキー + 'bones')
+    """
+    totals = collections.Counter()
+    for geometry in geometry_json.get("minecraft:geometry") or []:
+        counts = collections.Counter()
+        bones = geometry.get("bones") or []
+        for i, bone in enumerate(bones):
+            cubes = bone.get("cubes") if isinstance(bone, dict) else None
+            if not isinstance(cubes, list) or not cubes:
+                continue
+            try:
+                bone_inflate = float(bone.get("inflate") or 0)
+            except (TypeError, ValueError):
+                continue
+            optimized, stats = optimize_cubes(cubes, bone_inflate)
+            counts["bones"] += 1
+            counts.update(stats)
+            if optimized != cubes:
+                bones[i] = {**bone, "cubes": optimized}
+        if counts["bones"]:
+            identifier = (geometry.get("description") or {}).get("identifier")
+            print(f"Geometry_Optimized:{identifier}_Cubes:{counts['cubes_before']}->{counts['cubes_after']}"
+                  f"_Vertices:{counts['vertices_before']}->{counts['vertices_after']}")
+        totals.update(counts)
+    return {key: totals[key] for key in ("bones", "cubes_before", "cubes_after", "vertices_before", "vertices_after",
+                                         "degenerate", "culled", "merged")}
+
 # --- 実行例 ---
 
 # クライアントからカスタム羊のボーン構造が送られてきたと仮定
@@ -0,0 +1,565 @@
+import argparse
+import base64
+import collections
+import hashlib
+import hmac
+import os
+import random
+import threading
+import time
+import zlib
+
+from flask import Flask, Blueprint, current_app, request, jsonify
+
+print("GitHub_Emulator_Module_Loaded")
+
+# --- GitHub API のローカルエミュレーター ---
+# unified_commit_to_github / get_sha_of_file / リポジトリのミラーが使う Contents API と Git Data API を、
+# git のオブジェクトストア (メモリ上、またはディスク上のベアリポジトリ) で再現する。
+# 性能の確認を本物の GitHub に対して行わずに済むよう、遅延・ゆらぎ・エラーの注入・レート制限を設定できる。
+#
+#   python github_emulator.py --port 5055 --latency-ms 40 --jitter-ms 20
+#   GITHUB_API_BASE=http://127.0.0.1:5055 GITHUB_TOKEN=dummy gunicorn main:app
+#
+# EMULATOR_STORE_DIR を指定した場合はベアリポジトリの形式 (objects/ refs/ HEAD) で書き出すため、
+# git --git-dir=<dir> log などでそのまま中身を確認できる。
+#
+# 制御用のエンドポイント (遅延・レート制限・エラー注入の対象外):
+#   GET  /_emulator/stats   エンドポイントごとの呼び出し回数と、注入したエラー・レート制限の回数
+#   POST /_emulator/reset   統計をリセットする
+#   POST /_emulator/config  設定を実行中に変更する (例: {"EMULATOR_LATENCY_MS": 100})
+DEFAULT_EMULATOR_CONFIG = {
+    "EMULATOR_LATENCY_MS": float(os.environ.get("EMULATOR_LATENCY_MS", 0)),
+    "EMULATOR_JITTER_MS": float(os.environ.get("EMULATOR_JITTER_MS", 0)),
+    "EMULATOR_ERROR_RATE": float(os.environ.get("EMULATOR_ERROR_RATE", 0)),
+    "EMULATOR_ERROR_STATUSES": [500, 502, 503],
+    # 時間枠あたりのリクエスト数の上限 (0 は無制限)。'primary' は 403 + X-RateLimit-*、'secondary' は 429 + Retry-After
+    "EMULATOR_RATE_LIMIT": int(os.environ.get("EMULATOR_RATE_LIMIT", 0)),
+    "EMULATOR_RATE_WINDOW": float(os.environ.get("EMULATOR_RATE_WINDOW", 60)),
+    "EMULATOR_RATE_LIMIT_MODE": os.environ.get("EMULATOR_RATE_LIMIT_MODE", "primary"),
+    "EMULATOR_STORE_DIR": os.environ.get("EMULATOR_STORE_DIR"),
+    "EMULATOR_TOKEN": os.environ.get("EMULATOR_TOKEN"),
+    "EMULATOR_DEFAULT_BRANCH": "main",
+}
+
+TREE_MODE = "40000"
+EMULATOR_AUTHOR = "Emulator <emulator@localhost>"
+
+emulator_routes = Blueprint('emulator_routes', __name__)
+
+
+class GitObjectStore:
+    """
+    git のオブジェクト (blob / tree / commit) と ref を保持する。SHA は git と同じ方法で計算する。
+    root を指定した場合はベアリポジトリと同じ形式 (zlib 圧縮したルーズオブジェクト) でディスクにも書く。
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root
+        self.objects = {}
+        self.refs = {}
+        self._flat_trees = {}
+        self._lock = threading.RLock()
+        if root:
+            os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+            os.makedirs(os.path.join(root, "refs", "heads"), exist_ok=True)
+            heads_dir = os.path.join(root, "refs", "heads")
+            for directory, _, names in os.walk(heads_dir):
+                for name in names:
+                    with open(os.path.join(directory, name)) as f:
+                        self.refs[os.path.relpath(os.path.join(directory, name), heads_dir)] = f.read().strip()
+
+    # --- オブジェクト ---
+
+    def put(self, obj_type: str, data: bytes) -> str:
+        raw = f"{obj_type} {len(data)}\0".encode() + data
+        sha = hashlib.sha1(raw).hexdigest()
+        with self._lock:
+            if sha in self.objects:
+                return sha
+            self.objects[sha] = (obj_type, data)
+        if self.root:
+            path = os.path.join(self.root, "objects", sha[:2], sha[2:])
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(zlib.compress(raw))
+                os.replace(temp_path, path)
+        return sha
+
+    def get(self, sha: str):
+        """(種類, 中身) を返す。存在しない場合は (None, None)。"""
+        if sha in self.objects:
+            return self.objects[sha]
+        if self.root and len(sha) == 40:
+            path = os.path.join(self.root, "objects", sha[:2], sha[2:])
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    raw = zlib.decompress(f.read())
+                header, data = raw.split(b"\0", 1)
+                obj_type = header.split(b" ", 1)[0].decode()
+                with self._lock:
+                    self.objects[sha] = (obj_type, data)
+                return obj_type, data
+        return None, None
+
+    def has(self, sha: str, obj_type: str) -> bool:
+        return isinstance(sha, str) and self.get(sha)[0] == obj_type
+
+    # --- ツリー ---
+
+    def write_tree(self, files: dict) -> str:
+        """{パス: (モード, ブロブSHA)} から入れ子のツリーを作り、最上位のツリーSHAを返す。"""
+        root = {}
+        for path, entry in files.items():
+            parts = path.split('/')
+            node = root
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+                if not isinstance(node, dict):
+                    raise ValueError(f"Path conflicts with a file: {path}")
+            if isinstance(node.get(parts[-1]), dict):
+                raise ValueError(f"Path conflicts with a directory: {path}")
+            node[parts[-1]] = entry
+        sha = self._write_tree_node(root)
+        with self._lock:
+            self._flat_trees[sha] = dict(files)
+        return sha
+
+    def _write_tree_node(self, node: dict) -> str:
+        entries = []
+        for name, value in node.items():
+            if isinstance(value, dict):
+                entries.append((TREE_MODE, name, self._write_tree_node(value)))
+            else:
+                entries.append((value[0], name, value[1]))
+        # git はディレクトリを "名前/" として並べる
+        entries.sort(key=lambda entry: entry[1] + "/" if entry[0] == TREE_MODE else entry[1])
+        data = b"".join(f"{mode} {name}".encode() + b"\0" + bytes.fromhex(sha) for mode, name, sha in entries)
+        return self.put("tree", data)
+
+    def _read_tree_entries(self, tree_sha: str):
+        _, data = self.get(tree_sha)
+        offset = 0
+        while offset < len(data):
+            space = data.index(b" ", offset)
+            null = data.index(b"\0", space)
+            yield data[offset:space].decode(), data[space + 1:null].decode(), data[null + 1:null + 21].hex()
+            offset = null + 21
+
+    def flatten_tree(self, tree_sha: str) -> dict:
+        """ツリーを {パス: (モード, ブロブSHA)} に展開する (ツリーは不変なので結果をキャッシュする)。"""
+        with self._lock:
+            if tree_sha in self._flat_trees:
+                return dict(self._flat_trees[tree_sha])
+        files = {}
+        stack = [(tree_sha, "")]
+        while stack:
+            sha, prefix = stack.pop()
+            for mode, name, entry_sha in self._read_tree_entries(sha):
+                if mode == TREE_MODE:
+                    stack.append((entry_sha, f"{prefix}{name}/"))
+                else:
+                    files[f"{prefix}{name}"] = (mode, entry_sha)
+        with self._lock:
+            self._flat_trees[tree_sha] = files
+        return dict(files)
+
+    # --- コミットと ref ---
+
+    def write_commit(self, tree_sha: str, parents: list, message: str) -> str:
+        timestamp = int(time.time())
+        lines = [f"tree {tree_sha}"] + [f"parent {parent}" for parent in parents]
+        lines += [f"author {EMULATOR_AUTHOR} {timestamp} +0000", f"committer {EMULATOR_AUTHOR} {timestamp} +0000"]
+        return self.put("commit", ("\n".join(lines) + "\n\n" + message).encode('utf-8'))
+
+    def read_commit(self, sha: str):
+        """{'tree', 'parents', 'message'} を返す。コミットでなければ None。"""
+        obj_type, data = self.get(sha)
+        if obj_type != "commit":
+            return None
+        header, _, message = data.decode('utf-8').partition("\n\n")
+        commit = {"tree": None, "parents": [], "message": message}
+        for line in header.splitlines():
+            key, _, value = line.partition(" ")
+            if key == "tree":
+                commit["tree"] = value
+            elif key == "parent":
+                commit["parents"].append(value)
+        return commit
+
+    def is_ancestor(self, ancestor: str, sha: str) -> bool:
+        seen, stack = set(), [sha]
+        while stack:
+            current = stack.pop()
+            if current == ancestor:
+                return True
+            if current in seen:
+                continue
+            seen.add(current)
+            commit = self.read_commit(current)
+            if commit:
+                stack.extend(commit["parents"])
+        return False
+
+    def set_ref(self, branch: str, sha: str):
+        with self._lock:
+            self.refs[branch] = sha
+        if self.root:
+            path = os.path.join(self.root, "refs", "heads", branch)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.tmp", 'w') as f:
+                f.write(sha + "\n")
+            os.replace(f"{path}.tmp", path)
+
+    def resolve_tree(self, ref_or_sha: str):
+        """ブランチ名・コミットSHA・ツリーSHAから、ツリーSHAを求める。"""
+        sha = self.refs.get(ref_or_sha, ref_or_sha)
+        obj_type, _ = self.get(sha)
+        if obj_type == "commit":
+            return self.read_commit(sha)["tree"]
+        return sha if obj_type == "tree" else None
+
+
+class GitHubEmulator:
+    """1つのリポジトリを表すエミュレーターの状態 (オブジェクトストア・統計・レート制限の時間枠)。"""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.store = GitObjectStore(config.get("EMULATOR_STORE_DIR"))
+        self.stats = collections.Counter()
+        self.lock = threading.Lock()
+        self.window_start = time.time()
+        self.window_used = 0
+
+        branch = config["EMULATOR_DEFAULT_BRANCH"]
+        if branch not in self.store.refs:
+            readme = self.store.put("blob", b"# Minecraft addon repository (emulator)\n")
+            tree = self.store.write_tree({"README.md": ("100644", readme)})
+            self.store.set_ref(branch, self.store.write_commit(tree, [], "Initial commit"))
+        if self.store.root:
+            with open(os.path.join(self.store.root, "HEAD"), 'w') as f:
+                f.write(f"ref: refs/heads/{branch}\n")
+
+    def take_rate_limit(self):
+        """
+        レート制限の時間枠を1つ消費する。
+
+        Returns:
+            tuple: (許可されたか, 残り回数, 時間枠のリセット時刻 (UNIX秒))
+        """
+        limit = self.config["EMULATOR_RATE_LIMIT"]
+        with self.lock:
+            now = time.time()
+            if now - self.window_start >= self.config["EMULATOR_RATE_WINDOW"]:
+                self.window_start, self.window_used = now, 0
+            reset = int(self.window_start + self.config["EMULATOR_RATE_WINDOW"])
+            if limit and self.window_used >= limit:
+                return False, 0, reset
+            self.window_used += 1
+            return True, (max(0, limit - self.window_used) if limit else 5000), reset
+
+
+def create_emulator_app(config: dict = None):
+    """
+    エミュレーターのアプリケーションを生成する。
+
+    Args:
+        config (dict): DEFAULT_EMULATOR_CONFIG を上書きする設定値
+
+    Returns:
+        Flask: 設定済みのアプリケーション
+    """
+    app = Flask(__name__)
+    app.config.update(DEFAULT_EMULATOR_CONFIG)
+    if config:
+        app.config.update(config)
+    app.extensions['github_emulator'] = GitHubEmulator(app.config)
+    app.register_blueprint(emulator_routes)
+    print(f"GitHub_Emulator_Initialized:Store:{app.config['EMULATOR_STORE_DIR'] or 'memory'}")
+    return app
+
+
+def _emulator():
+    return current_app.extensions['github_emulator']
+
+
+def _error(status: int, message: str):
+    return jsonify({"message": message, "documentation_url": "https://docs.github.com/rest"}), status
+
+
+@emulator_routes.before_request
+def simulate_network():
+    """遅延・認証・レート制限・エラー注入を行い、呼び出し回数を数える。"""
+    if request.path.startswith("/_emulator/"):
+        return None
+    emulator = _emulator()
+    config = emulator.config
+    rule = request.url_rule.rule.split("/<repo>/", 1)[-1] if request.url_rule else request.path
+    with emulator.lock:
+        emulator.stats[f"{request.method} {rule}"] += 1
+
+    delay = config["EMULATOR_LATENCY_MS"] + random.uniform(-1, 1) * config["EMULATOR_JITTER_MS"]
+    if delay > 0:
+        time.sleep(delay / 1000)
+
+    token = config["EMULATOR_TOKEN"]
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"token {token}"):
+        return _error(401, "Bad credentials")
+
+    allowed, remaining, reset = emulator.take_rate_limit()
+    request.environ["emulator.rate_limit"] = (remaining, reset)
+    if not allowed:
+        with emulator.lock:
+            emulator.stats["rate_limited"] += 1
+        if config["EMULATOR_RATE_LIMIT_MODE"] == "secondary":
+            response = jsonify({"message": "You have exceeded a secondary rate limit."})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(max(1, reset - int(time.time())))
+            return response
+        return _error(403, "API rate limit exceeded")
+
+    if config["EMULATOR_ERROR_RATE"] and random.random() < config["EMULATOR_ERROR_RATE"]:
+        with emulator.lock:
+            emulator.stats["injected_errors"] += 1
+        return _error(random.choice(config["EMULATOR_ERROR_STATUSES"]), "Injected error")
+    return None
+
+
+@emulator_routes.after_request
+def add_rate_limit_headers(response):
+    rate_limit = request.environ.get("emulator.rate_limit")
+    if rate_limit:
+        remaining, reset = rate_limit
+        response.headers["X-RateLimit-Limit"] = str(_emulator().config["EMULATOR_RATE_LIMIT"] or 5000)
+        response.headers["X-RateLimit-Remaining"] = str(remaining)
+        response.headers["X-RateLimit-Reset"] = str(reset)
+    return response
+
+
+# --- 制御用 ---
+
+@emulator_routes.route('/_emulator/stats', methods=['GET'])
+def emulator_stats():
+    emulator = _emulator()
+    with emulator.lock:
+        stats = dict(emulator.stats)
+    return jsonify({"calls": stats, "total": sum(count for key, count in stats.items() if " " in key),
+                    "objects": len(emulator.store.objects), "refs": dict(emulator.store.refs)}), 200
+
+
+@emulator_routes.route('/_emulator/reset', methods=['POST'])
+def emulator_reset():
+    emulator = _emulator()
+    with emulator.lock:
+        emulator.stats.clear()
+        emulator.window_start, emulator.window_used = time.time(), 0
+    return jsonify({"status": "reset"}), 200
+
+
+@emulator_routes.route('/_emulator/config', methods=['POST'])
+def emulator_config():
+    updates = request.get_json(force=True) or {}
+    unknown = [key for key in updates if key not in DEFAULT_EMULATOR_CONFIG or key == "EMULATOR_STORE_DIR"]
+    if unknown:
+        return jsonify({"error": f"Unknown or read-only settings: {unknown}"}), 400
+    _emulator().config.update(updates)
+    return jsonify({key: _emulator().config[key] for key in DEFAULT_EMULATOR_CONFIG}), 200
+
+
+# --- Git Data API ---
+
+def _ref_json(branch: str, sha: str):
+    return {"ref": f"refs/heads/{branch}", "object": {"sha": sha, "type": "commit"}}
+
+
+def _commit_json(sha: str, commit: dict):
+    return {"sha": sha, "tree": {"sha": commit["tree"]}, "parents": [{"sha": parent} for parent in commit["parents"]],
+            "message": commit["message"]}
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/git/ref/heads/<path:branch>', methods=['GET'])
+def get_ref(owner, repo, branch):
+    sha = _emulator().store.refs.get(branch)
+    if sha is None:
+        return _error(404, "Not Found")
+    return jsonify(_ref_json(branch, sha)), 200
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/git/refs', methods=['POST'])
+def create_ref(owner, repo):
+    payload = request.get_json(force=True)
+    store = _emulator().store
+    ref, sha = payload.get("ref", ""), payload.get("sha")
+    if not ref.startswith("refs/heads/") or not store.has(sha, "commit"):
+        return _error(422, "Invalid ref or object")
+    branch = ref[len("refs/heads/"):]
+    with store._lock:
+        if branch in store.refs:
+            return _error(422, "Reference already exists")
+        store.set_ref(branch, sha)
+    return jsonify(_ref_json(branch, sha)), 201
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/git/refs/heads/<path:branch>', methods=['PATCH'])
+def update_ref(owner, repo, branch):
+    payload = request.get_json(force=True)
+    store = _emulator().store
+    sha = payload.get("sha")
+    if not store.has(sha, "commit"):
+        return _error(422, "Object does not exist")
+    with store._lock:
+        current = store.refs.get(branch)
+        if current is None:
+            return _error(422, "Reference does not exist")
+        # GitHub と同じく、force でなければ早送りできる更新だけを受け付ける
+        if not payload.get("force") and not store.is_ancestor(current, sha):
+            return _error(422, "Update is not a fast forward")
+        store.set_ref(branch, sha)
+    return jsonify(_ref_json(branch, sha)), 200
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/git/commits/<sha>', methods=['GET'])
+def get_commit(owner, repo, sha):
+    commit = _emulator().store.read_commit(sha)
+    if commit is None:
+        return _error(404, "Not Found")
+    return jsonify(_commit_json(sha, commit)), 200
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/git/commits', methods=['POST'])
+def create_commit(owner, repo):
+    payload = request.get_json(force=True)
+    store = _emulator().store
+    tree, parents = payload.get("tree"), payload.get("parents", [])
+    if not store.has(tree, "tree") or not all(store.has(parent, "commit") for parent in parents):
+        return _error(422, "Tree or parent commit does not exist")
+    sha = store.write_commit(tree, parents, payload.get("message", ""))
+    return jsonify(_commit_json(sha, store.read_commit(sha))), 201
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/git/blobs', methods=['POST'])
+def create_blob(owner, repo):
+    payload = request.get_json(force=True)
+    content = payload.get("content", "")
+    if payload.get("encoding") == "base64":
+        data = base64.b64decode(content)
+    else:
+        data = content.encode('utf-8')
+    sha = _emulator().store.put("blob", data)
+    return jsonify({"sha": sha, "url": f"{request.url_root}repos/{owner}/{repo}/git/blobs/{sha}"}), 201
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/git/blobs/<sha>', methods=['GET'])
+def get_blob(owner, repo, sha):
+    obj_type, data = _emulator().store.get(sha)
+    if obj_type != "blob":
+        return _error(404, "Not Found")
+    return jsonify({"sha": sha, "size": len(data), "encoding": "base64",
+                    "content": base64.encodebytes(data).decode()}), 200
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/git/trees', methods=['POST'])
+def create_tree(owner, repo):
+    payload = request.get_json(force=True)
+    store = _emulator().store
+    files = {}
+    if payload.get("base_tree"):
+        if not store.has(payload["base_tree"], "tree"):
+            return _error(422, "base_tree does not exist")
+        files = store.flatten_tree(payload["base_tree"])
+    for entry in payload.get("tree", []):
+        path = entry.get("path", "").strip("/")
+        if "content" in entry:
+            files[path] = (entry.get("mode", "100644"), store.put("blob", entry["content"].encode('utf-8')))
+        elif entry.get("sha") is None:
+            files.pop(path, None)
+        elif store.has(entry["sha"], "blob"):
+            files[path] = (entry.get("mode", "100644"), entry["sha"])
+        else:
+            # 存在しないブロブを参照したツリーは GitHub と同じく 422 にする
+            return _error(422, f"tree.sha {entry['sha']} is not a valid blob")
+    try:
+        sha = store.write_tree(files)
+    except ValueError as e:
+        return _error(422, str(e))
+    return jsonify({"sha": sha, "truncated": False}), 201
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/git/trees/<path:ref>', methods=['GET'])
+def get_tree(owner, repo, ref):
+    store = _emulator().store
+    tree_sha = store.resolve_tree(ref)
+    if tree_sha is None:
+        return _error(404, "Not Found")
+    if request.args.get("recursive"):
+        entries = [{"path": path, "mode": mode, "type": "blob", "sha": sha, "size": len(store.get(sha)[1])}
+                   for path, (mode, sha) in sorted(store.flatten_tree(tree_sha).items())]
+    else:
+        entries = [{"path": name, "mode": mode, "type": "tree" if mode == TREE_MODE else "blob", "sha": sha}
+                   for mode, name, sha in store._read_tree_entries(tree_sha)]
+    return jsonify({"sha": tree_sha, "tree": entries, "truncated": False}), 200
+
+
+# --- Contents API ---
+
+def _content_json(path: str, sha: str, data: bytes):
+    return {"type": "file", "name": os.path.basename(path), "path": path, "sha": sha, "size": len(data),
+            "encoding": "base64", "content": base64.encodebytes(data).decode()}
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/contents/<path:path>', methods=['GET'])
+def get_contents(owner, repo, path):
+    store = _emulator().store
+    tree_sha = store.resolve_tree(request.args.get("ref", current_app.config["EMULATOR_DEFAULT_BRANCH"]))
+    entry = store.flatten_tree(tree_sha).get(path) if tree_sha else None
+    if entry is None:
+        return _error(404, "Not Found")
+    return jsonify(_content_json(path, entry[1], store.get(entry[1])[1])), 200
+
+
+@emulator_routes.route('/repos/<owner>/<repo>/contents/<path:path>', methods=['PUT'])
+def put_contents(owner, repo, path):
+    payload = request.get_json(force=True)
+    store = _emulator().store
+    branch = payload.get("branch", current_app.config["EMULATOR_DEFAULT_BRANCH"])
+    data = base64.b64decode(payload.get("content", ""))
+    with store._lock:
+        head = store.refs.get(branch)
+        if head is None:
+            return _error(404, "Branch not found")
+        files = store.flatten_tree(store.read_commit(head)["tree"])
+        existing = files.get(path)
+        # 既存ファイルの更新には現在のSHAが必要 (GitHub と同じ)
+        if existing and payload.get("sha") is None:
+            return _error(422, "\"sha\" wasn't supplied.")
+        if existing and payload["sha"] != existing[1]:
+            return _error(409, f"{path} does not match {payload['sha']}")
+        blob_sha = store.put("blob", data)
+        files[path] = ("100644", blob_sha)
+        commit_sha = store.write_commit(store.write_tree(files), [head], payload.get("message", f"Update {path}"))
+        store.set_ref(branch, commit_sha)
+    return jsonify({"content": _content_json(path, blob_sha, data), "commit": {"sha": commit_sha}}), \
+        200 if existing else 201
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="GitHub API (Contents / Git Data) のローカルエミュレーター")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_EMULATOR_CONFIG["EMULATOR_LATENCY_MS"])
+    parser.add_argument("--jitter-ms", type=float, default=DEFAULT_EMULATOR_CONFIG["EMULATOR_JITTER_MS"])
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_EMULATOR_CONFIG["EMULATOR_ERROR_RATE"])
+    parser.add_argument("--rate-limit", type=int, default=DEFAULT_EMULATOR_CONFIG["EMULATOR_RATE_LIMIT"])
+    parser.add_argument("--rate-window", type=float, default=DEFAULT_EMULATOR_CONFIG["EMULATOR_RATE_WINDOW"])
+    parser.add_argument("--rate-limit-mode", choices=["primary", "secondary"],
+                        default=DEFAULT_EMULATOR_CONFIG["EMULATOR_RATE_LIMIT_MODE"])
+    parser.add_argument("--store-dir", default=DEFAULT_EMULATOR_CONFIG["EMULATOR_STORE_DIR"])
+    args = parser.parse_args()
+    app = create_emulator_app({
+        "EMULATOR_LATENCY_MS": args.latency_ms, "EMULATOR_JITTER_MS": args.jitter_ms,
+        "EMULATOR_ERROR_RATE": args.error_rate, "EMULATOR_RATE_LIMIT": args.rate_limit,
+        "EMULATOR_RATE_WINDOW": args.rate_window, "EMULATOR_RATE_LIMIT_MODE": args.rate_limit_mode,
+        "EMULATOR_STORE_DIR": args.store_dir,
+    })
+    app.run(host='127.0.0.1', port=args.port, threaded=True)
@@ -2,17 +2,26 @@ import requests
 import base64
 import json
 import os
+import functools
+import random
+import threading
+import time
+import zipfile
+from collections.abc import Mapping
 # --- 修正点: 必要な整形モジュールを全てインポート ---
 # BP (Behavior Pack) 関連
-from mobs import format_mob_data_for_bp 
-from items import format_item_data_for_bp
-from blocks import format_block_data_for_bp
-from structure import process_structure_data 
+from mobs import validate_and_format_mob_data
+from item import validate_and_format_item_data
+from block import validate_and_format_block_data
+from structure import decode_mcstructure, diff_structures, process_structure_data
+from repo_mirror import REPO_MIRROR, git_blob_sha, git_blob_sha_stream # ローカルミラーとブロブSHAの計算
 
 # RP (Resource Pack) 関連
-from lang import format_lang_data_for_rp
-from geometry import format_geometry_data_for_rp # RPのモデル定義
-from textures import format_texture_data_for_rp # テクスチャパス/定義関連
+from lang import validate_and_format_lang_data
+from geometry import GEOMETRY_OPTIMIZE, format_rp_custom_geometry, optimize_geometry # RPのモデル定義
+from textures import format_rp_entity_texture # テクスチャパス/定義関連
+from sounds import SOUND_DEFINITIONS_PATH # サウンド定義 (sound_definitions.json)
+from records import as_plain # パックから抽出したレコード (MobSpec など) を辞書に戻す
 
 # --- 定数設定 ---
 GITHUB_OWNER = os.environ.get("GITHUB_OWNER", "kakaomame") 
@@ -24,7 +33,20 @@ if not GITHUB_TOKEN:
 else:
     print("GITHUB_TOKEN_Found")
 
-GITHUB_API_URL = f"https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents"
+# API のベースURL (ローカルのエミュレーター (github_emulator.py) に向ける場合に変更する)
+GITHUB_API_BASE = os.environ.get("GITHUB_API_BASE", "https://api.github.com").rstrip("/")
+GITHUB_API_URL = f"{GITHUB_API_BASE}/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents"
+GITHUB_GIT_API_URL = f"{GITHUB_API_BASE}/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git"
+# ブロブ送信時に一度に読み込むバイト数 (3の倍数にすると Base64 の端数が出ない)
+UPLOAD_CHUNK_SIZE = 3 * 64 * 1024
+# ZIP からそのままコミットするバイナリアセットの拡張子
+BINARY_ASSET_EXTENSIONS = ('.png', '.tga', '.jpg', '.jpeg', '.ogg', '.wav', '.fsb')
+# 1ファイルの検証エラーに含める Molang エラーの件数 (残りは件数だけ示す)
+MOLANG_ERRORS_REPORTED = 5
+# ブランチの更新が fast-forward にならなかった (他のコミットが先に入った) 場合に、
+# 新しい先頭の上でツリーとコミットを作り直す回数と、再試行前に待つ時間の上限 (秒、回数に比例)
+COMMIT_REF_RETRIES = int(os.environ.get("COMMIT_REF_RETRIES", 10))
+COMMIT_RETRY_BACKOFF = float(os.environ.get("COMMIT_RETRY_BACKOFF", 0.1))
 print(f"GITHUB_API_URL:{GITHUB_API_URL}")
 
 
@@ -52,125 +74,546 @@ def get_sha_of_file(path: str):
         return None
 
 
-def prepare_files_for_commit(client_input: dict) -> list:
+# --- 整形モジュールのアダプター ---
+# 各整形モジュールは戻り値の形式が異なる ({"error": ...} を返すもの、(結果, エラー) を返すもの) ため、
+# ここで (整形済みデータ, エラーメッセージ) の形にそろえる。
+
+def _result_or_error(result):
+    if isinstance(result, dict) and "error" in result:
+        return None, result["error"]
+    return result, None
+
+
+def _format_mob(name: str, data: dict):
+    return _result_or_error(validate_and_format_mob_data(name, data))
+
+
+def _format_item(name: str, data: dict):
+    return _result_or_error(validate_and_format_item_data(name, data))
+
+
+def _format_block(name: str, data: dict):
+    return _result_or_error(validate_and_format_block_data(name, data))
+
+
+def _format_geometry(name: str, data: dict):
+    # パックから読み込んだジオメトリは識別子を変えない (geometry.xxx を参照している定義があるため)
+    identifiers = data.get('identifiers') or []
+    if identifiers and identifiers[0].startswith('geometry.'):
+        name = identifiers[0][len('geometry.'):]
+    bones = data.get('bone_data') or []
+
+    # ボーンが既に Bedrock の形式 (cubes を持ち、size を持たない) の場合はそのまま使う
+    native_bones = all(isinstance(bone, Mapping) and 'name' in bone and 'size' not in bone for bone in bones)
+    geometry, error = _result_or_error(format_rp_custom_geometry(
+        name, data.get('texture_width', 64), data.get('texture_height', 64), [] if native_bones else bones))
+    if geometry and native_bones:
+        geometry["minecraft:geometry"][0]["bones"] = as_plain(bones)
+    if geometry and GEOMETRY_OPTIMIZE:
+        # 隣り合う同じ色のキューブの結合と、隠れているキューブの削除 (見た目は変えない)
+        optimize_geometry(geometry)
+    return geometry, error
+
+
+def _format_texture(name: str, data: dict):
+    if 'texture_path' not in data:
+        return None, "Missing required key: texture_path"
+    return format_rp_entity_texture(name, data['texture_path'], data.get('model_id', "geometry.default")), None
+
+
+def _format_lang(lang_code: str, data: dict):
+    content, error = validate_and_format_lang_data(data)
+    return content, error["error"] if error else None
+
+
+# client_input のキー -> (整形関数, コミット先のパス形式)
+FORMATTERS = {
+    'mobs': (_format_mob, "BP/entities/{name}.json"),
+    'items': (_format_item, "BP/items/{name}.json"),
+    'blocks': (_format_block, "BP/blocks/{name}.json"),
+    'geometry': (_format_geometry, "RP/models/entity/{name}.json"),
+    'textures': (_format_texture, "RP/textures/entity/{name}.json"),
+    'lang': (_format_lang, "RP/texts/{name}.lang"),
+}
+
+
+def _unchanged_structure_content(nbt_for_upload: dict):
+    """
+    書き出し直しただけでブロック・ブロックエンティティ・エンティティが変わっていない構造物は、
+    ミラーにある既存のファイルの中身 (Base64) を返す。ブロブSHAが一致するので、コミット時に変更なしとして省かれる。
+    変わっている場合・既存のファイルがリポジトリに無い場合は新しい中身をそのまま返す。
+    ミラーのインデックスにあるが中身がまだ無い場合 (ツリーだけ同期した直後など) はブロブを取得して比較する。
+    """
+    content_base64 = nbt_for_upload["content_base64"]
+    path = nbt_for_upload["path"]
+    existing = REPO_MIRROR.read_bytes(path, fetch=REPO_MIRROR.known_sha(path) is not None)
+    if existing is None:
+        return content_base64
+    new_bytes = base64.b64decode(content_base64)
+    if existing == new_bytes:
+        return content_base64
+    try:
+        diff = diff_structures(existing, new_bytes, max_changes=0)
+    except Exception as e:
+        # 既存のファイルが読めない場合は比較せずに新しい中身を使う
+        print(f"Structure_Diff_Skipped:{path}_{e}")
+        return content_base64
+    if not diff["identical"]:
+        return content_base64
+    print(f"Structure_Unchanged:{path}")
+    return base64.b64encode(existing).decode('utf-8')
+
+
+def format_client_entry(top_key: str, name: str, data: dict):
+    """
+    client_input の1エントリを検証・整形・シリアライズして、コミット用のファイルにする。
+    ネットワークにはアクセスしない。
+
+    Returns:
+        tuple: (コミット用のファイルリスト, エラーメッセージ)
+    """
+    if top_key == 'manifest':
+        # マニフェストは内容をそのまま使う (name は 'BP' / 'RP')
+        return [{"path": f"{name}/manifest.json", "content": json.dumps(data, indent=4, ensure_ascii=False),
+                 "is_binary": False}], None
+
+    if top_key == 'sound_definitions':
+        # ヘッダから生成・マージした sound_definitions.json (警告はコミットを止めない)
+        return [{"path": SOUND_DEFINITIONS_PATH, "content": json.dumps(data["definitions"], indent=4, ensure_ascii=False),
+                 "is_binary": False}], None
+
+    if top_key == 'parse_errors':
+        # 解析できなかったファイル (name はファイルのパス)。そのファイルを抜いてコミットしないようにエラーにする
+        return [], f"{name}: {data['error']}"
+
+    if top_key == 'molang':
+        # Molang は検証だけ行い、何もコミットしない (name はファイルのパス)
+        errors = data.get("errors") or []
+        if not errors:
+            return [], None
+        details = "; ".join(f"{e['path']}: {e['error']}: \"{e['expression'][:80]}\""
+                            for e in errors[:MOLANG_ERRORS_REPORTED])
+        more = f" (他 {len(errors) - MOLANG_ERRORS_REPORTED} 件)" if len(errors) > MOLANG_ERRORS_REPORTED else ""
+        return [], f"{name}: Molang の構文エラー {len(errors)} 件: {details}{more}"
+
+    if top_key == 'structures':
+        if 'mcstructure' in data:
+            # パックに入っている .mcstructure はそのまま使う (読めることだけ確認する)
+            try:
+                decode_mcstructure(data['mcstructure'])
+            except Exception as e:
+                return [], f"Invalid mcstructure: {type(e).__name__}: {e}"
+            nbt_for_upload = {"path": f"BP/structures/{name}.mcstructure",
+                              "content_base64": base64.b64encode(data['mcstructure']).decode('utf-8')}
+        else:
+            # 編集画面からの JSON (nbt_to_json の形式) はエンコードする
+            nbt_for_upload, error = process_structure_data(name, data, action='to_nbt')
+            if error:
+                return [], error
+        content_base64 = _unchanged_structure_content(nbt_for_upload)
+        files = [{"path": nbt_for_upload["path"], "content": content_base64, "is_binary": True}]
+
+        # 要求された場合はレビュー用のサムネイルを .mcstructure の隣にコミットする
+        # (アップロードフォームの structure_thumbnails。run_pack_pipeline が data['thumbnail'] を立てる)
+        if data.get('thumbnail'):
+            thumbnail, error = process_structure_data(name, {"binary_content": content_base64}, action='thumbnail')
+            if error:
+                return [], error
+            files.append({"path": thumbnail["path"], "content": thumbnail["content_base64"], "is_binary": True})
+        return files, None
+
+    if top_key not in FORMATTERS:
+        # 整形モジュールが無いデータ (spawn_rules など) はコミットしない
+        return [], None
+
+    format_func, path_format = FORMATTERS[top_key]
+    try:
+        result, error = format_func(name, data)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+    if error:
+        return [], error
+
+    content = result if isinstance(result, str) else json.dumps(result, indent=4, ensure_ascii=False)
+    return [{"path": path_format.format(name=name), "content": content, "is_binary": False}], None
+
+
+def prepare_files_for_commit(client_input: dict):
     """
     クライアントからの整形済みデータを受け取り、GitHub APIにコミットするための
     ファイルリスト（パスとコンテンツ）を生成する。
+
+    ネットワークには一切アクセスせず、全てのエントリをメモリ上で検証・整形・シリアライズする。
+    エラーが1つでもあればファイルリストは返さない (不完全なコミットを作らない)。
+
+    Returns:
+        tuple: (コミット用のファイルリスト, エラーのリスト [{'key', 'name', 'error'}])
     """
-    
-    commit_files = [] 
-    
-    # 共通関数: JSONファイルを BP/RP の適切なフォルダに追加
-    # pack_type: 'BP' or 'RP'
-    def add_json_file(top_key, pack_type, sub_folder, format_func):
-        if top_key in client_input:
-            for name, data in client_input[top_key].items():
-                final_json_data = format_func(name, data) 
-                
-                # RPの場合はファイル名が*.json、BPの場合は*.json
-                path = f"{pack_type}/{sub_folder}/{name}.json" 
-                
-                commit_files.append({
-                    "path": path,
-                    "content": json.dumps(final_json_data, indent=4, ensure_ascii=False),
-                    "is_binary": False
-                })
-                print(f"Prepared_JSON_File:{path}")
-    
-    
-    # 1. マニフェストファイルの処理
-    if 'manifest' in client_input:
-        for pack_type, content in client_input['manifest'].items():
-            path = f"{pack_type}/manifest.json"
-            commit_files.append({
-                "path": path,
-                "content": json.dumps(content, indent=4, ensure_ascii=False),
-                "is_binary": False
-            })
-            print(f"Prepared_Manifest:{path}")
-
-    # 2. .langファイルの処理
-    if 'lang' in client_input:
-        for lang_code, data in client_input['lang'].items():
-            final_lang_content = format_lang_data_for_rp(lang_code, data)
-            
-            path = f"RP/texts/{lang_code}.lang" 
-            commit_files.append({
-                "path": path,
-                "content": final_lang_content,
-                "is_binary": False
+
+    commit_files = []
+    errors = []
+
+    for top_key in ['parse_errors', 'manifest', *FORMATTERS, 'structures', 'molang', 'sound_definitions']:
+        for name, data in client_input.get(top_key, {}).items():
+            files, error = format_client_entry(top_key, name, data)
+            if error:
+                errors.append({"key": top_key, "name": name, "error": error})
+                print(f"Validation_Error:{top_key}/{name}_{error}")
+                continue
+            commit_files.extend(files)
+
+    if errors:
+        print(f"Prepare_Failed:{len(errors)}_errors")
+        return [], errors
+
+    for file_data in commit_files:
+        print(f"Prepared_File:{file_data['path']}")
+    return commit_files, []
+
+
+def _git_api(method: str, endpoint: str, payload: dict = None, body=None):
+    """
+    Git Data API (blobs / trees / commits / refs) を呼び出す。
+
+    body にバイト列のジェネレータを渡した場合は、チャンク転送でそのまま送信する。
+    """
+    url = f"{GITHUB_GIT_API_URL}/{endpoint}"
+    if body is None and payload is not None:
+        body = json.dumps(payload, ensure_ascii=False)
+    return requests.request(method, url, headers=get_headers(), data=body)
+
+
+def _iter_source_chunks(source, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """ファイルの中身 (bytes または開く関数) を chunk_size ずつ返す。"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        for offset in range(0, len(source), chunk_size):
+            yield source[offset:offset + chunk_size]
+        return
+    with source() as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _blob_request_body(source, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """
+    ブロブ作成APIのリクエストボディ {"content": "<Base64>", "encoding": "base64"} を少しずつ生成する。
+    中身全体や Base64 文字列全体をメモリに持たないため、ファイルサイズに関係なく使用量はチャンク程度になる。
+    """
+    yield b'{"content": "'
+    remainder = b''
+    for chunk in _iter_source_chunks(source, chunk_size):
+        # Base64 は3バイト単位で区切らないと途中に '=' が入るため、端数は次のチャンクに回す
+        data = remainder + chunk
+        cut = len(data) - len(data) % 3
+        yield base64.b64encode(data[:cut])
+        remainder = data[cut:]
+    yield base64.b64encode(remainder)
+    yield b'", "encoding": "base64"}'
+
+
+def _upload_blob(source, size: int):
+    """ブロブを1つアップロードし、(ブロブSHA, 送信したバイト数) を返す。失敗時は (None, 0)。"""
+    response = _git_api("POST", "blobs", body=_blob_request_body(source))
+    if response.status_code != 201:
+        print(f"Blob_Upload_Error_Status:{response.status_code}_Response:{response.text[:100]}...")
+        return None, 0
+    return response.json()["sha"], 4 * ((size + 2) // 3)
+
+
+def _commit_entry(file_data: dict):
+    """
+    コミット対象のファイルを (パス, 中身, ブロブSHA, サイズ) にする。
+    中身は bytes か、'source' が指定されている場合はファイルを開く関数 (中身をメモリに読み込まない)。
+    """
+    path = file_data['path']
+    if 'source' in file_data:
+        print(f"Content_Type:Stream_{path}")
+        return path, file_data['source'], git_blob_sha_stream(file_data['source'], file_data['size']), file_data['size']
+
+    content = file_data['content']
+    if file_data.get('is_binary', False):
+        content_bytes = base64.b64decode(content)
+        print(f"Content_Type:Binary_{path}")
+    else:
+        content_bytes = content.encode('utf-8')
+        print(f"Content_Type:Text/JSON_{path}")
+    return path, content_bytes, git_blob_sha(content_bytes), len(content_bytes)
+
+
+def collect_binary_assets(zip_file: zipfile.ZipFile):
+    """
+    パック内のテクスチャやサウンドなどのバイナリアセットを、ZIP から直接読み出すコミット対象にする。
+
+    Returns:
+        list: [{'path', 'source' (エントリを開く関数), 'size', 'is_binary': True}]
+    """
+    assets = []
+    for info in zip_file.infolist():
+        if info.filename.startswith(('BP/', 'RP/')) and info.filename.lower().endswith(BINARY_ASSET_EXTENSIONS):
+            assets.append({
+                "path": info.filename,
+                "source": functools.partial(zip_file.open, info),
+                "size": info.file_size,
+                "is_binary": True
             })
-            print(f"Prepared_Lang:{path}")
-            
-    # --- BP データの処理 ---
-    add_json_file('mobs', 'BP', 'entities', format_mob_data_for_bp)
-    add_json_file('items', 'BP', 'items', format_item_data_for_bp)
-    add_json_file('blocks', 'BP', 'blocks', format_block_data_for_bp)
-
-    # --- RP データの処理 ---
-    add_json_file('geometry', 'RP', 'models/entity', format_geometry_data_for_rp) # RPジオメトリ
-    add_json_file('textures', 'RP', 'textures/entity', format_texture_data_for_rp) # RPテクスチャ定義（JSONの場合）
-
-    # 6. 構造物データ (NBTバイナリ) の処理
-    if 'structures' in client_input:
-        for struct_name, struct_data in client_input['structures'].items():
-            nbt_for_upload, error = process_structure_data(struct_name, struct_data, action='to_nbt')
-            
-            if nbt_for_upload and 'content_base64' in nbt_for_upload:
-                commit_files.append({
-                    "path": nbt_for_upload["path"],
-                    "content": nbt_for_upload["content_base64"], 
-                    "is_binary": True 
-                })
-                print(f"Prepared_Structure:{struct_name}_As_Binary")
-            elif error:
-                print(f"Structure_Conversion_Error_for:{struct_name}_{error}")
-            
-    return commit_files
+    print(f"Binary_Assets_Collected:{len(assets)}")
+    return assets
+
+
+class CommitSession:
+    """
+    1回のコミット分のブロブアップロードとコミット作成を行う。
+
+    ブロブSHAはローカルで計算し、既知のブロブ (ミラーのツリーや過去のコミットで見たもの、
+    prefetch_head() で取得したブランチの先頭のツリーにあるもの) はアップロードせずに参照だけする。内容が変わっていないファイルはコミット時にブランチの先頭のツリーと比較して
+    ツリーに含めない (ミラーは古い場合があるので、変更の有無の判定には使わない)。
+    upload() は複数のスレッドから並行に呼んでよい。commit() は全ての upload() が終わってから呼ぶ。
+    progress を指定した場合は、ファイルごとに {'event': 'uploaded' / 'skipped', 'path', ...} を渡して呼ぶ。
+    """
+
+    def __init__(self, progress=None):
+        self.result = {"success": False, "commit_sha": None, "files_changed": 0,
+                       "uploaded_blobs": 0, "uploaded_bytes": 0, "deduplicated_blobs": 0, "deduplicated_bytes": 0}
+        self.changed = []        # コミットの候補 (パス, 中身, ブロブSHA, サイズ)。先頭と同じものは commit() で除く
+        self.deduplicated = []   # アップロードせずに参照したエントリ
+        self.known_blobs = REPO_MIRROR.known_blob_shas()
+        self.progress = progress
+        self._lock = threading.Lock()
+        self._head = None                 # prefetch_head() で取得した (先頭コミットSHA, ツリーSHA, {パス: ブロブSHA}, 途中までか)
+        self._head_ready = threading.Event()
+        self._head_ready.set()
+
+    def prefetch_head(self, branch: str = "main", thread_name: str = "pack-head"):
+        """
+        ブランチの先頭のツリーを別スレッドで取得し、その全ブロブを既知のブロブに加える。
+        ミラーが同期されていないサーバー (起動直後・ディスクが消えた場合) でも、先頭と同じ内容のファイルは送らない。
+        upload() は取得が終わるまで待つ。commit() は先頭が変わっていなければ取得したツリーを使い回す。
+        """
+        self._head_ready.clear()
+        threading.Thread(target=self._load_head, args=(branch,), name=thread_name, daemon=True).start()
+
+    def _load_head(self, branch: str):
+        try:
+            head_sha = self._get_ref(branch)
+            head = self._get_head_tree(head_sha) if head_sha else None
+            if head is not None:
+                self._head = head
+                with self._lock:
+                    self.known_blobs.update(head[2].values())
+                print(f"Head_Tree_Prefetched:{branch}_Blobs:{len(head[2])}")
+        except requests.RequestException as e:
+            print(f"Head_Tree_Prefetch_Error:{branch}_{e}")
+        finally:
+            self._head_ready.set()
+
+    def _emit(self, event: str, **fields):
+        if self.progress is not None:
+            self.progress({"event": event, **fields})
+
+    def upload(self, file_data: dict) -> bool:
+        """
+        ファイルを1つ受け取り、必要ならブロブをアップロードする。
+
+        Returns:
+            bool: 失敗した場合は False (このセッションではコミットしない)
+        """
+        entry = _commit_entry(file_data)
+        path, source, sha, size = entry
+
+        self._head_ready.wait()
+        with self._lock:
+            self.changed.append(entry)
+            deduplicated = sha in self.known_blobs
+            if deduplicated:
+                self.deduplicated.append(entry)
+                self.result["deduplicated_blobs"] += 1
+                self.result["deduplicated_bytes"] += size
+                print(f"Blob_Deduplicated:{path}_SHA:{sha}")
+            else:
+                # 同じ内容のファイルを別スレッドが同時にアップロードしないよう、先に登録しておく
+                self.known_blobs.add(sha)
+        if deduplicated:
+            self._emit("uploaded", path=path, size=size, sent_bytes=0, deduplicated=True)
+            return True
+
+        uploaded_sha, sent_bytes = _upload_blob(source, size)
+        with self._lock:
+            if uploaded_sha is None:
+                self.known_blobs.discard(sha)
+                return False
+            self.result["uploaded_blobs"] += 1
+            self.result["uploaded_bytes"] += sent_bytes
+        self._emit("uploaded", path=path, size=size, sent_bytes=sent_bytes, deduplicated=False)
+        return True
+
+    def _fetch_head(self, branch: str):
+        """
+        ブランチの先頭コミット・ツリーと、コミット候補のパスの先頭でのブロブSHAを取得する。
+
+        Returns:
+            tuple: (先頭コミットSHA, ツリーSHA, {パス: ブロブSHA} (ツリーが大きすぎて一覧が途中までの場合は None))
+                   取得に失敗した場合は None
+        """
+        head_sha = self._get_ref(branch)
+        if head_sha is None:
+            return None
+        # 先読みしてから先頭が変わっていなければ、そのツリーを使い回す
+        head = self._head if self._head and self._head[0] == head_sha else self._get_head_tree(head_sha)
+        if head is None:
+            return None
+        _, base_tree_sha, files, truncated = head
+        if truncated:
+            return head_sha, base_tree_sha, None
+        paths = {entry[0] for entry in self.changed}
+        return head_sha, base_tree_sha, {path: sha for path, sha in files.items() if path in paths}
+
+    @staticmethod
+    def _get_ref(branch: str):
+        """ブランチの先頭コミットSHA (取得に失敗した場合は None)。"""
+        response = _git_api("GET", f"ref/heads/{branch}")
+        if response.status_code != 200:
+            print(f"Ref_Fetch_Error:{branch}_Status:{response.status_code}")
+            return None
+        return response.json()["object"]["sha"]
+
+    @staticmethod
+    def _get_head_tree(head_sha: str):
+        """
+        コミットのツリーを再帰的に取得する。
+
+        Returns:
+            tuple: (コミットSHA, ツリーSHA, {パス: ブロブSHA}, 一覧が途中までか) (取得に失敗した場合は None)
+        """
+        response = _git_api("GET", f"commits/{head_sha}")
+        if response.status_code != 200:
+            print(f"Commit_Fetch_Error:{head_sha}_Status:{response.status_code}")
+            return None
+        base_tree_sha = response.json()["tree"]["sha"]
+
+        response = _git_api("GET", f"trees/{base_tree_sha}?recursive=1")
+        if response.status_code != 200:
+            print(f"Tree_Fetch_Error:{base_tree_sha}_Status:{response.status_code}")
+            return None
+        tree = response.json()
+        files = {item["path"]: item["sha"] for item in tree.get("tree", []) if item.get("type") == "blob"}
+        return head_sha, base_tree_sha, files, bool(tree.get("truncated"))
+
+    def _create_tree(self, base_tree_sha: str, entries: list):
+        """base_tree に entries を重ねたツリーを作り、ツリーSHAを返す (失敗時は None)。"""
+        result = self.result
+        tree_payload = {
+            "base_tree": base_tree_sha,
+            "tree": [{"path": path, "mode": "100644", "type": "blob", "sha": sha} for path, _, sha, _ in entries]
+        }
+        response = _git_api("POST", "trees", tree_payload)
+        if response.status_code == 422 and self.deduplicated:
+            # 既知として参照したブロブがリモートに無かった場合 (履歴の書き換えなど) はアップロードし直す
+            print("Tree_Create_Failed:Retrying_Without_Deduplication")
+            retry = list({entry[2]: entry for entry in self.deduplicated}.values())
+            result["deduplicated_blobs"] -= len(self.deduplicated)
+            result["deduplicated_bytes"] -= sum(entry[3] for entry in self.deduplicated)
+            self.deduplicated.clear()
+            for path, source, sha, size in retry:
+                uploaded_sha, sent_bytes = _upload_blob(source, size)
+                if uploaded_sha is None:
+                    return None
+                result["uploaded_blobs"] += 1
+                result["uploaded_bytes"] += sent_bytes
+            response = _git_api("POST", "trees", tree_payload)
+        if response.status_code != 201:
+            print(f"Tree_Create_Error_Status:{response.status_code}_Response:{response.text[:100]}...")
+            return None
+        return response.json()["sha"]
+
+    def commit(self, commit_message: str, branch: str = "main"):
+        """
+        アップロード済みのブロブからツリーとコミットを作り、ブランチを進める。結果の辞書を返す。
+        ブランチの更新が fast-forward にならなかった場合は、新しい先頭を取得してツリーとコミットを作り直す
+        (COMMIT_REF_RETRIES 回まで)。
+        """
+        result = self.result
+        if not self.changed:
+            print("Commit_Skipped:No_Changes")
+            result["success"] = True
+            return result
+
+        for attempt in range(COMMIT_REF_RETRIES + 1):
+            if attempt:
+                time.sleep(random.uniform(0, COMMIT_RETRY_BACKOFF * attempt))
+
+            # 1. 現在のブランチの先頭コミットとツリーを取得し、先頭と同じ内容のファイルを除く
+            head = self._fetch_head(branch)
+            if head is None:
+                return result
+            head_sha, base_tree_sha, head_files = head
+            if head_files is None:
+                entries, unchanged = self.changed, []
+            else:
+                entries = [entry for entry in self.changed if head_files.get(entry[0]) != entry[2]]
+                unchanged = [entry for entry in self.changed if head_files.get(entry[0]) == entry[2]]
+
+            # 2. ツリーを作成する (全て先頭と同じならコミットしない)
+            tree_sha = self._create_tree(base_tree_sha, entries) if entries else base_tree_sha
+            if tree_sha is None:
+                return result
+            if tree_sha == base_tree_sha:
+                print("Commit_Skipped:No_Changes")
+                for path, _, _, size in self.changed:
+                    self._emit("skipped", path=path, reason="unchanged", size=size)
+                REPO_MIRROR.record_files((path, source, sha) for path, source, sha, _ in self.changed)
+                result.update({"success": True, "files_changed": 0})
+                return result
+
+            # 3. コミットを作成し、ブランチを進める
+            response = _git_api("POST", "commits", {"message": commit_message, "tree": tree_sha, "parents": [head_sha]})
+            if response.status_code != 201:
+                print(f"Commit_Create_Error_Status:{response.status_code}_Response:{response.text[:100]}...")
+                return result
+            commit_sha = response.json()["sha"]
+
+            response = _git_api("PATCH", f"refs/heads/{branch}", {"sha": commit_sha})
+            if response.status_code == 200:
+                break
+            if response.status_code == 422 and "fast forward" in response.text.lower() and attempt < COMMIT_REF_RETRIES:
+                # 取得してから更新するまでの間に他のコミットが入った: 新しい先頭の上で作り直す
+                print(f"Ref_Update_Conflict:{branch}_Attempt:{attempt + 1}")
+                continue
+            print(f"Ref_Update_Error:{branch}_Status:{response.status_code}_Response:{response.text[:100]}...")
+            return result
+
+        for path, _, _, size in unchanged:
+            self._emit("skipped", path=path, reason="unchanged", size=size)
+
+        # 4. 次回の読み込みのために、コミットした内容をミラーに反映する
+        REPO_MIRROR.record_files((path, source, sha) for path, source, sha, _ in self.changed)
+
+        result.update({"success": True, "commit_sha": commit_sha, "files_changed": len(entries),
+                       "ref_update_retries": attempt})
+        print(f"Commit_Success:{commit_sha}_Files:{len(entries)}_Uploaded_Bytes:{result['uploaded_bytes']}"
+              f"_Deduplicated_Bytes:{result['deduplicated_bytes']}_Retries:{attempt}")
+        return result
 
 
 def unified_commit_to_github(commit_files: list, commit_message: str, branch: str = "main"):
     """
     複数のファイルを一つのコミットとしてGitHubにプッシュする。（バイナリ対応）
+
+    Git Data API で ブロブ -> ツリー -> コミット -> ref 更新 の順に行う (CommitSession を参照)。
+
+    Returns:
+        dict: {'success': bool, 'commit_sha', 'files_changed', 'uploaded_blobs',
+               'uploaded_bytes' (送信したBase64のバイト数), 'deduplicated_blobs', 'deduplicated_bytes'}
     """
-    
+
+    session = CommitSession()
     if not GITHUB_TOKEN:
         print("Commit_Failed: GITHUB_TOKEN is missing.")
-        return False
-        
-    success_count = 0
-    
+        return session.result
+
     for file_data in commit_files:
-        path = file_data['path']
-        content = file_data['content']
-        is_binary = file_data.get('is_binary', False) 
-        
-        # ... (エンコードとコミットロジックは変更なし) ...
-        if is_binary:
-            content_encoded = content
-            print(f"Content_Type:Binary_{path}")
-        else:
-            content_bytes = content.encode('utf-8')
-            content_encoded = base64.b64encode(content_bytes).decode('utf-8')
-            print(f"Content_Type:Text/JSON_{path}")
-
-        sha = get_sha_of_file(path)
-        
-        payload = {
-            "message": commit_message,
-            "content": content_encoded,
-            "branch": branch,
-        }
-        if sha:
-            payload["sha"] = sha 
-            
-        url = f"{GITHUB_API_URL}/{path}"
-        response = requests.put(url, headers=get_headers(), data=json.dumps(payload, ensure_ascii=False))
-
-        if response.status_code in [200, 201]:
-            print(f"File_Commit_Success:{path}")
-            success_count += 1
-        else:
-            print(f"File_Commit_Error:{path}_Status:{response.status_code}_Response:{response.text[:100]}...")
-            
-    return success_count == len(commit_files)
+        if not session.upload(file_data):
+            return session.result
+    return session.commit(commit_message, branch)
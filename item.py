@@ -1,3 +1,4 @@
+import copy
 import json
 import uuid
 
@@ -42,7 +43,7 @@ def validate_and_format_item_data(item_name: str, client_data: dict):
             return {"error": f"Missing required key: {key}"}
     
     # 2. テンプレートのコピーとidentifierの設定
-    final_json = ITEM_TEMPLATE.copy()
+    final_json = copy.deepcopy(ITEM_TEMPLATE)
     
     # 内部識別子 (例: custom:custom_sword) を設定
     identifier = f"custom:{item_name}"
@@ -0,0 +1,258 @@
+import argparse
+import collections
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# --- 負荷試験ドライバー ---
+# Flask アプリ (main.py) に N 件のパックを同時にアップロードし、スループット・レイテンシの分布・
+# GitHub API の呼び出し回数 (エミュレーターの統計の差分) を報告する。
+# 解析・整形などの各段階を単体で計る場合は benchmarks.py を使う。
+#
+#   # エミュレーターとアプリを一時ディレクトリで起動して試験する
+#   python load_driver.py --spawn --concurrency 4 --requests 40 --latency-ms 40 --jitter-ms 20
+#   # 既に起動しているものに対して試験する
+#   python load_driver.py --app-url http://127.0.0.1:5000 --emulator-url http://127.0.0.1:5055
+#
+# --spawn の場合、アプリは GITHUB_API_BASE をエミュレーターに向け、ミラーと検索用インデックスを
+# 一時ディレクトリに置いて別プロセスで起動する (本番のミラーやインデックスには触れない)。
+# パックはリクエストごとに識別子とテクスチャの中身を変えて生成するため、重複排除で送信が省かれることはない。
+LOAD_DRIVER_TIMEOUT = float(os.environ.get("LOAD_DRIVER_TIMEOUT", 300))
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def build_pack(entities: int, textures: int, texture_bytes: int, seed: str = None) -> bytes:
+    """
+    試験用のパック (BP のエンティティと RP のテクスチャ) を生成する。
+
+    Args:
+        entities (int): エンティティの数
+        textures (int): テクスチャの数
+        texture_bytes (int): テクスチャ1枚あたりのバイト数 (中身はランダム)
+        seed (str): 識別子に付ける文字列 (省略時はランダム)
+
+    Returns:
+        bytes: ZIP のバイト列
+    """
+    seed = seed or uuid.uuid4().hex[:8]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for i in range(entities):
+            entity = {"minecraft:entity": {
+                "description": {"identifier": f"load:{seed}_mob{i}"},
+                "components": {
+                    "minecraft:health": {"value": 10 + i % 20},
+                    "minecraft:movement": {"value": 0.25},
+                    "minecraft:type_family": {"family": ["mob", "load_test"]},
+                    "minecraft:behavior.random_stroll": {"priority": 6, "speed_multiplier": 1.0},
+                },
+            }}
+            zf.writestr(f"BP/entities/{seed}_mob{i}.json", json.dumps(entity))
+        for i in range(textures):
+            zf.writestr(f"RP/textures/entity/{seed}_mob{i}.png", os.urandom(texture_bytes))
+    return buffer.getvalue()
+
+
+def _percentile(values: list, percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _emulator_stats(emulator_url: str) -> dict:
+    if not emulator_url:
+        return {}
+    return requests.get(f"{emulator_url}/_emulator/stats", timeout=10).json()
+
+
+def _wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited before becoming ready: {url} (code {process.returncode})")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def _free_port() -> int:
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_servers(work_dir: str, emulator_args: list, app_env: dict):
+    """
+    エミュレーターとアプリを別プロセスで起動する。
+
+    Returns:
+        tuple: (アプリのURL, エミュレーターのURL, プロセスのリスト)
+    """
+    emulator_port, app_port = _free_port(), _free_port()
+    emulator_url = f"http://127.0.0.1:{emulator_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    processes = []
+
+    emulator_log = open(os.path.join(work_dir, "emulator.log"), 'w')
+    processes.append(subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, "github_emulator.py"), "--port", str(emulator_port)] + emulator_args,
+        stdout=emulator_log, stderr=subprocess.STDOUT, cwd=ROOT_DIR))
+    _wait_until_ready(f"{emulator_url}/_emulator/stats", processes[-1])
+
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(app_port),
+        "GITHUB_API_BASE": emulator_url,
+        "GITHUB_TOKEN": env.get("GITHUB_TOKEN", "load-driver"),
+        "REPO_MIRROR_DIR": os.path.join(work_dir, "mirror"),
+        "PACK_INDEX_DB": os.path.join(work_dir, "pack_index.sqlite3"),
+    })
+    env.pop("FLASK_DEBUG", None)
+    env.update(app_env)
+    app_log = open(os.path.join(work_dir, "app.log"), 'w')
+    processes.append(subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, "main.py")],
+                                      stdout=app_log, stderr=subprocess.STDOUT, cwd=ROOT_DIR, env=env))
+    _wait_until_ready(app_url, processes[-1])
+    print(f"Load_Driver_Spawned:App:{app_url}_Emulator:{emulator_url}_Logs:{work_dir}")
+    return app_url, emulator_url, processes
+
+
+def upload_pack(app_url: str, pack: bytes, name: str, retry_busy: bool):
+    """
+    パックを1件アップロードする。
+
+    Returns:
+        dict: {'status': HTTPステータス (接続エラーは 0), 'elapsed': 秒, 'busy_retries': 429 で待った回数}
+    """
+    started = time.perf_counter()
+    busy_retries = 0
+    while True:
+        try:
+            response = requests.post(app_url, files={"pack_file": (name, pack, "application/zip")},
+                                     data={"commit_message": f"load: {name}"}, timeout=LOAD_DRIVER_TIMEOUT)
+        except requests.RequestException as e:
+            print(f"Load_Request_Error:{name}_{e}")
+            return {"status": 0, "elapsed": time.perf_counter() - started, "busy_retries": busy_retries}
+        if response.status_code == 429 and retry_busy:
+            busy_retries += 1
+            time.sleep(float(response.headers.get("Retry-After", 1)))
+            continue
+        if response.status_code != 200:
+            print(f"Load_Request_Failed:{name}_Status:{response.status_code}_{response.text[:200]}")
+        return {"status": response.status_code, "elapsed": time.perf_counter() - started,
+                "busy_retries": busy_retries}
+
+
+def run_load(app_url: str, emulator_url: str, concurrency: int, total: int, pack_options: dict,
+             retry_busy: bool = False) -> dict:
+    """
+    total 件のパックを concurrency 並列でアップロードし、結果を集計する。
+
+    Returns:
+        dict: スループット・レイテンシの分位点・ステータスごとの件数・API の呼び出し回数
+    """
+    # 生成に掛かる時間を計測に含めないよう、先に全てのパックを作っておく
+    packs = [(f"load_{i:04d}.mcpack", build_pack(seed=f"{uuid.uuid4().hex[:6]}{i}", **pack_options))
+             for i in range(total)]
+    before = _emulator_stats(emulator_url).get("calls", {})
+
+    results = []
+    lock = threading.Lock()
+
+    def worker(item):
+        name, pack = item
+        result = upload_pack(app_url, pack, name, retry_busy)
+        with lock:
+            results.append(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, packs))
+    wall = time.perf_counter() - started
+
+    after = _emulator_stats(emulator_url).get("calls", {})
+    api_calls = {key: after.get(key, 0) - before.get(key, 0) for key in after
+                 if after.get(key, 0) != before.get(key, 0)}
+    latencies = [result["elapsed"] for result in results]
+    succeeded = sum(1 for result in results if result["status"] == 200)
+    return {
+        "requests": total, "concurrency": concurrency, "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(succeeded / wall, 3) if wall else 0.0,
+        "latency_seconds": {name: round(_percentile(latencies, percent), 3)
+                            for name, percent in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))},
+        "status_counts": dict(collections.Counter(str(result["status"]) for result in results)),
+        "busy_retries": sum(result["busy_retries"] for result in results),
+        "api_calls": dict(sorted(api_calls.items())),
+        "api_calls_per_pack": round(sum(count for key, count in api_calls.items() if " " in key) / total, 1)
+        if total else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="パックのアップロードの負荷試験")
+    parser.add_argument("--app-url", help="試験するアプリのURL (--spawn の場合は不要)")
+    parser.add_argument("--emulator-url", help="API の呼び出し回数を取得するエミュレーターのURL")
+    parser.add_argument("--spawn", action="store_true", help="エミュレーターとアプリを一時ディレクトリで起動する")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--textures", type=int, default=10)
+    parser.add_argument("--texture-bytes", type=int, default=16 * 1024)
+    parser.add_argument("--retry-busy", action="store_true", help="429 の場合は Retry-After だけ待って再送する")
+    parser.add_argument("--max-concurrent-packs", type=int, help="--spawn の場合のアプリの MAX_CONCURRENT_PACKS")
+    # --spawn の場合にエミュレーターへ渡す設定
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit", type=int, default=0)
+    parser.add_argument("--rate-window", type=float, default=60)
+    parser.add_argument("--rate-limit-mode", choices=["primary", "secondary"], default="primary")
+    args = parser.parse_args(argv)
+
+    if not args.spawn and not args.app_url:
+        parser.error("--app-url か --spawn のどちらかを指定してください")
+
+    processes = []
+    try:
+        if args.spawn:
+            work_dir = tempfile.mkdtemp(prefix="load_driver_")
+            emulator_args = ["--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                             "--error-rate", str(args.error_rate), "--rate-limit", str(args.rate_limit),
+                             "--rate-window", str(args.rate_window), "--rate-limit-mode", args.rate_limit_mode,
+                             "--store-dir", os.path.join(work_dir, "emulator.git")]
+            app_env = {}
+            if args.max_concurrent_packs:
+                app_env["MAX_CONCURRENT_PACKS"] = str(args.max_concurrent_packs)
+            app_url, emulator_url, processes = spawn_servers(work_dir, emulator_args, app_env)
+        else:
+            app_url, emulator_url = args.app_url.rstrip("/"), (args.emulator_url or "").rstrip("/")
+
+        report = run_load(app_url, emulator_url, args.concurrency, args.requests,
+                          {"entities": args.entities, "textures": args.textures,
+                           "texture_bytes": args.texture_bytes}, retry_busy=args.retry_busy)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0 if report["status_counts"].get("200", 0) == args.requests else 1
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,47 @@
-from flask import Flask, request, render_template_string, jsonify
+from flask import (Flask, Blueprint, Response, current_app, make_response, request, render_template_string, jsonify,
+                   send_file)
+from werkzeug.datastructures import Headers
+import threading
+import queue
 import zipfile
 import io
 import os
 import json
+import re
+import time
 
 # --- 外部モジュールのインポート ---
-from pack_parser import parse_pack_file_to_client_data # 新しい解析モジュール
-from github_uploader import prepare_files_for_commit, unified_commit_to_github 
+from pack_pipeline import run_pack_pipeline # 解析・整形・アップロードのパイプライン
+from structure import render_structure_thumbnail, thumbnail_cache_path, thumbnail_scale
+from pack_index import index_client_input, pack_index_id, query_index
+from repo_mirror import REPO_MIRROR
+from profiling import (PROFILE_ADMIN_TOKEN, PROFILE_DIR, PROFILE_HEADER, PROFILE_SAMPLE_RATE, PROFILE_SLOW_SECONDS,
+                       RequestProfiler)
+from upload_sessions import UPLOAD_MAX_BYTES, UPLOAD_SESSION_DIR, UPLOAD_SESSION_TTL, UploadError, UploadSessionStore
 
-app = Flask(__name__)
-print(f"Flask_App_Initialized: {app.name}")
+# --- サーバー設定のデフォルト値 (環境変数で上書き可能) ---
+# MAX_CONTENT_LENGTH: リクエストボディの上限 (超過時は 413)
+# MAX_CONCURRENT_PACKS: 1プロセスあたり同時に処理するパック数の上限 (超過時は 429)
+# PACK_RETRY_AFTER: 429 応答に付与する Retry-After 秒数
+# PROFILE_*: パック処理のプロファイリング (profiling.py を参照。全て未設定なら無効)
+# UPLOAD_*: 再開可能な分割アップロード (upload_sessions.py を参照)
+# STREAM_HEARTBEAT_SECONDS: NDJSON の進捗応答で、イベントが途切れたときに heartbeat を送る間隔
+DEFAULT_CONFIG = {
+    "MAX_CONTENT_LENGTH": int(os.environ.get("MAX_CONTENT_LENGTH", 200 * 1024 * 1024)),
+    "MAX_CONCURRENT_PACKS": int(os.environ.get("MAX_CONCURRENT_PACKS", 2)),
+    "PACK_RETRY_AFTER": int(os.environ.get("PACK_RETRY_AFTER", 5)),
+    "PROFILE_ADMIN_TOKEN": PROFILE_ADMIN_TOKEN,
+    "PROFILE_SAMPLE_RATE": PROFILE_SAMPLE_RATE,
+    "PROFILE_SLOW_SECONDS": PROFILE_SLOW_SECONDS,
+    "PROFILE_DIR": PROFILE_DIR,
+    "UPLOAD_SESSION_DIR": UPLOAD_SESSION_DIR,
+    "UPLOAD_SESSION_TTL": UPLOAD_SESSION_TTL,
+    "UPLOAD_MAX_BYTES": UPLOAD_MAX_BYTES,
+    "STREAM_HEARTBEAT_SECONDS": float(os.environ.get("STREAM_HEARTBEAT_SECONDS", 10)),
+}
+print(f"DEFAULT_CONFIG_Loaded:{DEFAULT_CONFIG}")
+
+pack_routes = Blueprint('pack_routes', __name__)
 
 # --- HTMLフォームの定義 (変更なし) ---
 PACK_UPLOAD_HTML = """
@@ -19,14 +51,67 @@ PACK_UPLOAD_HTML = """
 <form method="POST" enctype="multipart/form-data">
     <input type="file" name="pack_file">
     <input type="text" name="commit_message" placeholder="コミットメッセージを入力">
+    <label><input type="checkbox" name="structure_thumbnails" value="1"> 構造物のサムネイルもコミットする</label>
     <input type="submit" value="アップロードしてGitHubにコミット">
 </form>
 """
 print("PACK_UPLOAD_HTML_Defined")
 
+
+def create_app(config: dict = None):
+    """
+    Flaskアプリケーションを生成する。
+    サーバーの起動に使うのはファイルの末尾で生成する app だけ (gunicorn main:app)。
+    ここを直接呼ぶのは、設定を変えた別のアプリが必要なテストなどに限る。
+
+    Args:
+        config (dict): DEFAULT_CONFIG を上書きする設定値 (例: {'MAX_CONCURRENT_PACKS': 4})
+
+    Returns:
+        Flask: 設定済みのアプリケーション
+    """
+
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    if config:
+        app.config.update(config)
+
+    # パック処理の同時実行数を制限するセマフォ (プロセス単位)
+    app.extensions['pack_semaphore'] = threading.BoundedSemaphore(app.config["MAX_CONCURRENT_PACKS"])
+
+    # プロファイリングは設定で有効にした場合だけ登録する (無効なら handle_pack は何もしない)
+    profiler = RequestProfiler.from_config(app.config)
+    if profiler:
+        app.extensions['pack_profiler'] = profiler
+        print(f"Pack_Profiler_Enabled:Sample_Rate:{profiler.sample_rate}_Slow_Seconds:{profiler.slow_seconds}")
+
+    # 分割アップロードのセッション (ディスク上。gunicorn の各ワーカーで同じディレクトリを共有する)
+    app.extensions['upload_sessions'] = UploadSessionStore(
+        app.config["UPLOAD_SESSION_DIR"], app.config["UPLOAD_SESSION_TTL"], app.config["UPLOAD_MAX_BYTES"])
+
+    app.register_blueprint(pack_routes)
+
+    @app.errorhandler(413)
+    def handle_too_large(e):
+        limit_mb = app.config["MAX_CONTENT_LENGTH"] // (1024 * 1024)
+        return jsonify({"error": f"アップロードサイズが上限 ({limit_mb} MB) を超えています。"}), 413
+
+    print(f"Flask_App_Initialized: {app.name}_Max_Concurrent_Packs:{app.config['MAX_CONCURRENT_PACKS']}")
+    return app
+
+
+def reject_busy():
+    """同時処理数の上限に達している場合の 429 応答を生成する。"""
+    retry_after = current_app.config["PACK_RETRY_AFTER"]
+    response = jsonify({"error": "サーバーが混み合っています。しばらくしてから再試行してください。"})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    print("Pack_Request_Rejected:429")
+    return response
+
 # --- メインルーティング ---
 
-@app.route('/', methods=['GET', 'POST'])
+@pack_routes.route('/', methods=['GET', 'POST'])
 def handle_pack():
     if request.method == 'GET':
         print("Received_GET_Request")
@@ -34,71 +119,505 @@ def handle_pack():
 
     elif request.method == 'POST':
         print("Received_POST_Request")
-        
-        # 1. ファイルとコミットメッセージの取得 (エラーチェックは省略)
-        uploaded_file = request.files['pack_file']
-        commit_message = request.form.get('commit_message', 'feat: Uploaded new pack via web server')
-        
-        if uploaded_file.filename == '':
+
+        # 上限に達している場合はボディを読む前に即座に 429 を返す
+        semaphore = current_app.extensions['pack_semaphore']
+        if not semaphore.acquire(blocking=False):
+            return reject_busy()
+
+        if wants_ndjson():
+            # セマフォは処理を行うスレッドが終了時に返す (応答を返した時点ではまだ処理中)
+            return stream_pack_upload(semaphore)
+
+        try:
+            profiler = current_app.extensions.get('pack_profiler')
+            if profiler is None:
+                return process_pack_upload()
+            return profiled_pack_upload(profiler)
+        finally:
+            semaphore.release()
+
+
+# --- 進捗のストリーミング (NDJSON) ---
+# 通常の応答はコミットが終わるまで何も返さないため、大きなパックではクライアントがタイムアウトして再送し、
+# 同じパックを二重に処理することになる。Accept: application/x-ndjson のリクエストには、
+# 受け付けた直後から進捗を1行1イベントの JSON で流す:
+#
+#   {"event": "accepted", "filename", "size"}                 最初の行 (すぐに返る)
+#   {"event": "parsed" / "formatted" / "uploaded" / "skipped" / "failed" / "stage", ..., "elapsed"}
+#                                                             run_pack_pipeline のイベント + 受け付けてからの秒数
+#   {"event": "heartbeat", "elapsed"}                         STREAM_HEARTBEAT_SECONDS の間イベントが無いとき
+#   {"event": "result", "status_code", "result"}              最後の行。result は通常の応答と同じ内容
+#
+# HTTP ステータスは最初の行を送る時点で 200 に決まるため、成否は最後の行の status_code で判断する。
+# 処理は別スレッドで行い、クライアントが途中で切断しても最後まで続ける (コミットの有無は通常の応答と同じ)。
+NDJSON_MIMETYPE = "application/x-ndjson"
+_STREAM_END = object()
+
+
+def wants_ndjson() -> bool:
+    """Accept で application/json より application/x-ndjson が優先されているか。"""
+    return request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def wants_structure_thumbnails() -> bool:
+    """アップロードフォームで構造物のサムネイルのコミットが選ばれているか (structure_thumbnails=1)。"""
+    return request.form.get('structure_thumbnails', '') in ('1', 'true', 'on')
+
+
+def ndjson_line(event: dict) -> bytes:
+    return (json.dumps(event, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+def stream_pack_upload(semaphore):
+    """
+    アップロードされたパックを別スレッドで処理し、進捗を NDJSON で流す応答を返す。
+    semaphore (取得済み) は処理の終了時に返す。
+    """
+    try:
+        uploaded_file = request.files.get('pack_file')
+        if uploaded_file is None or uploaded_file.filename == '':
+            semaphore.release()
             return jsonify({"error": "ファイルが選択されていません。"}), 400
-            
-        # 2. ファイルの解凍と解析
+        filename = uploaded_file.filename
+        commit_message = request.form.get('commit_message', 'feat: Uploaded new pack via web server')
+        structure_thumbnails = wants_structure_thumbnails()
+        # リクエストのコンテキストは応答を返すと終わるので、ボディはここで読み切る
+        content = uploaded_file.read()
+    except Exception:
+        semaphore.release()
+        raise
+
+    profiler = current_app.extensions.get('pack_profiler')
+    headers = Headers(request.headers)  # 応答後も読めるようにコピーする
+    file_stream = io.BytesIO(content)
+    heartbeat = current_app.config["STREAM_HEARTBEAT_SECONDS"]
+    events = queue.Queue()
+    started = time.perf_counter()
+
+    def progress(event):
+        event["elapsed"] = round(time.perf_counter() - started, 3)
+        events.put(event)
+
+    def process(timings=None):
+        return pack_archive_result(file_stream, filename, commit_message, timings, progress, structure_thumbnails)
+
+    def work():
         try:
-            # ファイルをメモリ上で操作するためのバイトストリームに変換
-            file_stream = io.BytesIO(uploaded_file.read())
-            
-            # ZIPファイルとして開く
-            with zipfile.ZipFile(file_stream, 'r') as zf:
-                
-                # --- [統合ポイント 1] pack_parser を呼び出し、シンプルなデータ構造にマッピング ---
-                # この結果が、以前作成した整形モジュール群が期待する形式です。
-                client_input_data = parse_pack_file_to_client_data(zf)
-                print(f"Pack_Parsed_Successfully._Keys:{list(client_input_data.keys())}")
-                
-                if not client_input_data:
-                     return jsonify({"status": "warning", "message": "パックを解析しましたが、コミット対象となるデータ（モブやアイテムなど）は見つかりませんでした。"}), 200
-
-                # 3. 整形・コミットリストを作成
-                # --- [統合ポイント 2] github_uploader の prepare 関数に解析結果を渡す ---
-                files_to_commit = prepare_files_for_commit(client_input_data)
-                print(f"Total_Files_Prepared_for_Commit:{len(files_to_commit)}")
-
-                if not files_to_commit:
-                    return jsonify({"status": "warning", "message": "解析されたデータから、コミット可能なファイルは生成されませんでした。"}), 200
-
-                # 4. GitHubへのコミットを実行
-                # NOTE: 実際に実行するには有効なGITHUB_TOKENが必要です
-                commit_success = unified_commit_to_github(files_to_commit, commit_message)
-
-                if commit_success:
-                    return jsonify({
-                        "status": "success", 
-                        "message": f"アドオンパックが解析され、{len(files_to_commit)} 個のファイルがGitHubにコミットされました。🎉", 
-                        "commit_msg": commit_message
-                    }), 200
-                else:
-                    return jsonify({"status": "error", "message": "GitHubへのコミット中にエラーが発生しました。トークンまたはAPIを確認してください。"}), 500
-
-        except zipfile.BadZipFile:
-            return jsonify({"error": "無効なZIPまたはMCPACKファイル形式です。"}), 400
+            if profiler is None:
+                (payload, status), profile_id = process(), None
+            else:
+                (payload, status), profile_id = profiler.run(process, headers, filename)
+            final = {"event": "result", "status_code": status, "result": payload}
+            if profile_id and profiler.is_admin(headers):
+                final["profile_id"] = profile_id
         except Exception as e:
-            # エラーをログに出力し、ユーザーに通知
-            import traceback
-            traceback.print_exc()
-            return jsonify({"error": f"予期せぬサーバーエラーが発生しました: {str(e)}"}), 500
+            final = {"event": "result", "status_code": 500,
+                     "result": {"error": f"予期せぬサーバーエラーが発生しました: {str(e)}"}}
+        finally:
+            semaphore.release()
+        progress(final)
+        print(f"Pack_Stream_Finished:{filename}_Status:{final['status_code']}_Elapsed:{final['elapsed']}s")
+        events.put(_STREAM_END)
+
+    threading.Thread(target=work, name="pack-stream", daemon=True).start()
+
+    def generate():
+        yield ndjson_line({"event": "accepted", "filename": filename, "size": len(content)})
+        while True:
+            try:
+                event = events.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ndjson_line({"event": "heartbeat", "elapsed": round(time.perf_counter() - started, 3)})
+                continue
+            if event is _STREAM_END:
+                return
+            yield ndjson_line(event)
+
+    print(f"Pack_Stream_Started:{filename}")
+    response = Response(generate(), mimetype=NDJSON_MIMETYPE)
+    # プロキシ (nginx など) にバッファさせない
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def profiled_pack_upload(profiler: RequestProfiler, process=None, description: str = None):
+    """
+    process_pack_upload (または process) をプロファイラを通して実行する。管理者には応答ヘッダでプロファイルIDを返す。
+
+    Args:
+        process: timings を受け取ってパックを処理する関数 (省略時は process_pack_upload)
+        description (str): プロファイルの説明 (省略時はアップロードされたファイル名)
+    """
+    if description is None:
+        uploaded_file = request.files.get('pack_file')
+        description = uploaded_file.filename if uploaded_file else ""
+    result, profile_id = profiler.run(process or process_pack_upload, request.headers, description)
+    response = make_response(result)
+    if profile_id and profiler.is_admin(request.headers):
+        response.headers[f"{PROFILE_HEADER}-Id"] = profile_id
+    return response
+
+
+def process_pack_upload(timings=None):
+    """
+    アップロードされたパックを解析・整形し、GitHubにコミットする。
+
+    Args:
+        timings (Counter): プロファイリング中の場合は段階ごとの所要時間を加算する (run_pack_pipeline を参照)
+    """
+
+    # 1. ファイルとコミットメッセージの取得 (エラーチェックは省略)
+    uploaded_file = request.files['pack_file']
+    commit_message = request.form.get('commit_message', 'feat: Uploaded new pack via web server')
+
+    if uploaded_file.filename == '':
+        return jsonify({"error": "ファイルが選択されていません。"}), 400
+
+    # ファイルをメモリ上で操作するためのバイトストリームに変換
+    file_stream = io.BytesIO(uploaded_file.read())
+    return process_pack_archive(file_stream, uploaded_file.filename, commit_message, timings,
+                                wants_structure_thumbnails())
+
+
+def process_pack_archive(file_stream, filename: str, commit_message: str, timings=None,
+                         structure_thumbnails: bool = False):
+    """
+    パック (ZIP) を解析・整形し、GitHubにコミットする。通常のアップロードと分割アップロードで共通。
+
+    Args:
+        file_stream: ZIP のファイルオブジェクトまたはディスク上のパス
+        filename (str): アップロードされたファイル名 (検索用インデックスのパック名に使う)
+        commit_message (str): コミットメッセージ
+        timings (Counter): プロファイリング中の場合は段階ごとの所要時間を加算する
+        structure_thumbnails (bool): 構造物のサムネイルも一緒にコミットするか
+
+    Returns:
+        tuple: (応答, HTTPステータス)
+    """
+    payload, status = pack_archive_result(file_stream, filename, commit_message, timings,
+                                          structure_thumbnails=structure_thumbnails)
+    return jsonify(payload), status
+
+
+def pack_archive_result(file_stream, filename: str, commit_message: str, timings=None, progress=None,
+                        structure_thumbnails: bool = False):
+    """
+    process_pack_archive の本体。応答を JSON にする前の辞書を返す (NDJSON の最後のイベントにも使う)。
+
+    Args:
+        progress: 指定した場合はパイプラインの進捗のイベントごとに呼ぶ (run_pack_pipeline を参照)
+
+    Returns:
+        tuple: (応答の辞書, HTTPステータス)
+    """
+
+    # 2. ファイルの解凍と解析
+    try:
+        # ZIPファイルとして開く
+        with zipfile.ZipFile(file_stream, 'r') as zf:
 
-# サーバー起動コマンド (開発用)
-# ... (handle_pack関数の終了) ...
+            # --- 解析 -> 整形 -> アップロード をパイプラインで重ねて実行する ---
+            # 検証エラーが1つでもあればコミット (ツリー・ref の更新) は行わない。
+            # NOTE: 実際に実行するには有効なGITHUB_TOKENが必要です
+            commit_result, errors, indexed_input = run_pack_pipeline(zf, commit_message, timings=timings,
+                                                                     progress=progress,
+                                                                     structure_thumbnails=structure_thumbnails)
+            print(f"Pack_Pipeline_Finished:Files:{commit_result['files_total']}_Errors:{len(errors)}")
+
+            if errors:
+                return {"status": "error", "message": "パックの検証に失敗しました。何もコミットされていません。",
+                        "errors": errors}, 400
+
+            if not commit_result["files_total"]:
+                return {"status": "warning", "message": "パックを解析しましたが、コミット対象となるデータ（モブやアイテムなど）は見つかりませんでした。"}, 200
+
+            if commit_result["success"]:
+                # 検索用インデックスはコミットできたパックだけを登録する (失敗してもコミット結果は変わらない)
+                index_pack_contents(filename, indexed_input)
+                return {
+                    "status": "success",
+                    "message": f"アドオンパックが解析され、{commit_result['files_total']} 個のファイルがGitHubにコミットされました。🎉",
+                    "commit_msg": commit_message,
+                    "commit_sha": commit_result["commit_sha"],
+                    "files_changed": commit_result["files_changed"],
+                    "uploaded_bytes": commit_result["uploaded_bytes"],
+                    "deduplicated_bytes": commit_result["deduplicated_bytes"],
+                    "warnings": commit_result.get("warnings", [])
+                }, 200
+            else:
+                return {"status": "error", "message": "GitHubへのコミット中にエラーが発生しました。トークンまたはAPIを確認してください。"}, 500
+
+    except zipfile.BadZipFile:
+        return {"error": "無効なZIPまたはMCPACKファイル形式です。"}, 400
+    except Exception as e:
+        # エラーをログに出力し、ユーザーに通知
+        import traceback
+        traceback.print_exc()
+        return {"error": f"予期せぬサーバーエラーが発生しました: {str(e)}"}, 500
+
+def index_pack_contents(filename: str, indexed_input: dict):
+    """
+    パックの内容を検索用インデックスに登録する。パックはマニフェストの UUID で識別する
+    (同じファイル名の別のパックで上書きしない)。UUID が無い場合はファイル名を使う。
+    """
+    if not indexed_input:
+        return
+    try:
+        index_client_input(pack_index_id(indexed_input, os.path.splitext(filename)[0]), indexed_input)
+    except Exception as e:
+        print(f"Pack_Index_Error:{e}")
+
+# --- 再開可能な分割アップロード (upload_sessions.py を参照) ---
+
+def upload_error_response(e: UploadError):
+    return jsonify({"error": str(e)}), e.status
+
+
+@pack_routes.route('/uploads', methods=['POST'])
+def create_upload_session():
+    """分割アップロードのセッションを作る。"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        session = current_app.extensions['upload_sessions'].create(
+            payload.get('filename'), payload.get('size'), payload.get('commit_message'), payload.get('sha256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    response = jsonify(session)
+    response.status_code = 201
+    response.headers["Location"] = f"/uploads/{session['upload_id']}"
+    return response
+
+
+@pack_routes.route('/uploads/<upload_id>', methods=['GET'])
+def describe_upload_session(upload_id):
+    """受信済み・未受信の範囲を返す (クライアントはこれを見て途中から再開する)。"""
+    try:
+        return jsonify(current_app.extensions['upload_sessions'].describe(upload_id)), 200
+    except UploadError as e:
+        return upload_error_response(e)
+
+
+@pack_routes.route('/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """チャンクを受け取って offset の位置に書き込む。ボディはメモリに溜めずにディスクへ流す。"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({"error": "offset を指定してください。"}), 400
+    if request.content_length is None:
+        return jsonify({"error": "Content-Length が必要です。"}), 411
+    try:
+        session = current_app.extensions['upload_sessions'].write_chunk(
+            upload_id, offset, request.content_length, request.stream, request.headers.get('X-Chunk-Sha256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    print(f"Upload_Chunk_Received:{upload_id}_Offset:{offset}_Bytes:{request.content_length}"
+          f"_Progress:{session['received_bytes']}/{session['size']}")
+    return jsonify(session), 200
+
+
+@pack_routes.route('/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload_session(upload_id):
+    try:
+        current_app.extensions['upload_sessions'].describe(upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    current_app.extensions['upload_sessions'].delete(upload_id)
+    return jsonify({"status": "deleted"}), 200
+
+
+@pack_routes.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload_session(upload_id):
+    """全てのチャンクが揃ったパックを、通常のアップロードと同じパイプラインで処理する。"""
+    sessions = current_app.extensions['upload_sessions']
+    semaphore = current_app.extensions['pack_semaphore']
+    if not semaphore.acquire(blocking=False):
+        return reject_busy()
+
+    try:
+        try:
+            meta = sessions.begin_finalize(upload_id)
+        except UploadError as e:
+            return upload_error_response(e)
+
+        payload = request.get_json(silent=True) or {}
+        commit_message = (payload.get('commit_message') or meta["commit_message"]
+                          or 'feat: Uploaded new pack via web server')
+        structure_thumbnails = bool(payload.get('structure_thumbnails'))
+        data_path = sessions.data_path(upload_id)
+
+        def process(timings=None):
+            # ディスク上のファイルをそのまま ZIP として開く (全体をメモリに読み込まない)
+            return process_pack_archive(data_path, meta["filename"], commit_message, timings, structure_thumbnails)
+
+        status = 500
+        try:
+            profiler = current_app.extensions.get('pack_profiler')
+            response = process() if profiler is None else profiled_pack_upload(profiler, process, meta["filename"])
+            status = make_response(response).status_code
+            return response
+        finally:
+            # コミットに失敗した (5xx) 場合は、送り直さずにもう一度 finalize できるよう残しておく
+            sessions.end_finalize(upload_id, keep=status >= 500)
+            print(f"Upload_Session_Finalized:{upload_id}_Status:{status}")
+    finally:
+        semaphore.release()
+
+
+# --- パック内容の検索 ---
+
+@pack_routes.route('/index/<table>', methods=['GET'])
+def search_pack_index(table):
+    """
+    インデックス済みのパック内容を検索する。
+    例: /index/mobs?family=monster&min_hp=40 、 /index/items?max_durability=100
+    """
+    filters = request.args.to_dict()
+    limit = filters.pop('limit', 100)
+    try:
+        limit = int(limit)
+    except ValueError:
+        return jsonify({"error": f"limit が不正です: {limit}"}), 400
+
+    started = time.perf_counter()
+    results, error = query_index(table, filters, limit)
+    if error:
+        return jsonify({"error": error}), 400
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"Pack_Index_Query:{table}_Results:{len(results)}_Ms:{elapsed_ms:.1f}")
+    return jsonify({"table": table, "count": len(results), "results": results, "elapsed_ms": round(elapsed_ms, 2)}), 200
+
+
+# --- リポジトリのローカルミラー ---
+
+@pack_routes.route('/mirror/sync', methods=['POST'])
+def sync_repo_mirror():
+    """GitHub のツリーを取得してローカルミラーのインデックスを更新する。"""
+    result = REPO_MIRROR.sync_from_tree(prefetch=request.args.get('prefetch') == '1')
+    if result is None:
+        return jsonify({"error": "GitHub からツリーを取得できませんでした。"}), 502
+    return jsonify({"status": "success", **result}), 200
+
+
+@pack_routes.route('/mirror/<path:path>', methods=['GET'])
+def read_repo_file(path):
+    """編集画面用に、リポジトリのファイルをローカルミラーから返す。"""
+    try:
+        if path.endswith('.json'):
+            data = REPO_MIRROR.read_json(path)
+            if data is not None:
+                return jsonify(data), 200
+        else:
+            # 大きなファイルもメモリに読まずにミラーのファイルからそのまま流す
+            local_path = REPO_MIRROR.local_file(path)
+            if local_path is not None:
+                return send_file(local_path, mimetype='application/octet-stream')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"error": f"ファイルが見つかりません: {path}"}), 404
+
+
+# --- プロファイル (管理者用) ---
+
+def admin_profiler():
+    """管理者トークン付きのリクエストならプロファイラを返す。"""
+    profiler = current_app.extensions.get('pack_profiler')
+    if profiler is None or not profiler.is_admin(request.headers):
+        return None
+    return profiler
+
+
+@pack_routes.route('/profiles', methods=['GET'])
+def list_profiles():
+    """保存されているプロファイルの一覧 (新しい順)。slow=1 で遅いリクエストのログだけを返す。"""
+    profiler = admin_profiler()
+    if profiler is None:
+        return jsonify({"error": "Not found"}), 404
+    rings = [profiler.slow] if request.args.get('slow') == '1' else [profiler.recent, profiler.slow]
+    profiles = {}
+    for ring in rings:
+        for profile_id in ring.list_ids():
+            profiles[profile_id] = ring.read_meta(profile_id)
+    return jsonify({"profiles": [profiles[key] for key in sorted(profiles, reverse=True) if profiles[key]]}), 200
+
+
+@pack_routes.route('/profiles/<profile_id>.collapsed', methods=['GET'])
+def read_profile(profile_id):
+    """collapsed stack 形式のプロファイル (flamegraph.pl や speedscope にそのまま渡せる)。"""
+    profiler = admin_profiler()
+    if profiler is None or not re.fullmatch(r'\d{8}T\d{6}-[0-9a-f]{8}', profile_id):
+        return jsonify({"error": "Not found"}), 404
+    ring, _ = profiler.find(profile_id)
+    if ring is None:
+        return jsonify({"error": "Not found"}), 404
+    with open(ring.collapsed_path(profile_id), encoding='utf-8') as f:
+        return Response(f.read(), mimetype='text/plain')
+
+
+# --- 構造物のサムネイル ---
+
+def thumbnail_etag(content_hash: str, scale: int) -> str:
+    # 同じ内容でも拡大率が違えば画像は別物なので、ETag には拡大率も含める
+    return f"{content_hash}-{scale}"
+
+
+def thumbnail_response(png: bytes, content_hash: str, scale: int):
+    response = Response(png, mimetype='image/png')
+    # 内容のハッシュ + 拡大率がそのまま ETag になる (同じなら画像も同じ)
+    response.headers["ETag"] = f'"{thumbnail_etag(content_hash, scale)}"'
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@pack_routes.route('/structure/thumbnail', methods=['POST'])
+def upload_structure_thumbnail():
+    """アップロードされた .mcstructure を真上から見たサムネイル PNG を返す。"""
+    uploaded_file = request.files.get('structure_file')
+    if uploaded_file is None or uploaded_file.filename == '':
+        return jsonify({"error": "ファイルが選択されていません。"}), 400
+    scale = thumbnail_scale(request.args.get('scale', 1, type=int))
+
+    try:
+        png, content_hash = render_structure_thumbnail(uploaded_file.read(), scale)
+    except Exception as e:
+        return jsonify({"error": f"構造物ファイルを読み込めませんでした: {str(e)}"}), 400
+
+    print(f"Structure_Thumbnail_Served:{content_hash[:12]}")
+    return thumbnail_response(png, content_hash, scale)
+
+
+@pack_routes.route('/structure/thumbnail/<content_hash>.png', methods=['GET'])
+def cached_structure_thumbnail(content_hash):
+    """一度描画したサムネイルを内容のハッシュで返す (レビュー用のリンクに使う)。"""
+    if not re.fullmatch(r'[0-9a-f]{64}', content_hash):
+        return jsonify({"error": "無効なハッシュです。"}), 400
+    scale = thumbnail_scale(request.args.get('scale', 1, type=int))
+
+    # キャッシュが消えている (別のワーカー・再起動など) 場合は 304 ではなく 404 を返す
+    cache_path = thumbnail_cache_path(content_hash, scale)
+    if not os.path.exists(cache_path):
+        return jsonify({"error": "サムネイルが見つかりません。"}), 404
+    if request.if_none_match.contains(thumbnail_etag(content_hash, scale)):
+        return Response(status=304)
+    with open(cache_path, 'rb') as f:
+        return thumbnail_response(f.read(), content_hash, scale)
+
+# 起動に使うアプリはこのモジュールレベルの app の1つだけ (gunicorn main:app / flask --app main run / python main.py)。
+# "main:create_app()" で起動すると、import 時にこの app も作られて各ワーカーでアプリが2つになるので使わない。
+# ルートを全て Blueprint に登録した後 (ファイルの末尾) で生成する。
+app = create_app()
 
 # サーバー起動コマンド
+# 本番環境ではマルチワーカーの WSGI サーバーから起動する:
+#   gunicorn -w 4 main:app
+# 同時実行数の上限 (429) と Retry-After の負荷試験は load_driver.py で再現できる:
+#   python load_driver.py --spawn --max-concurrent-packs 2 --concurrency 40 --requests 40
 if __name__ == '__main__':
     # Renderのようなデプロイ環境でPORT環境変数を使う場合に対応
     port = int(os.environ.get("PORT", 5000))
+    # デバッガ/リローダーは FLASK_DEBUG=1 の場合のみ有効にする
+    debug = os.environ.get("FLASK_DEBUG") == "1"
     # 外部からのアクセスを許可するため host='0.0.0.0' を指定
-    app.run(debug=True, host='0.0.0.0', port=port) 
-
-# --- 以前のコードの誤りがあった部分（修正後） ---
-# 修正前は以下のようにインデントが不適切だった可能性があります:
-# if __name__ == '__main__':
-# # app.run(debug=True, host='0.0.0.0', port=5000)
-#     app.run(debug=True, host='0.0.0.0', port=5000) # <- このインデントがズレていた
+    app.run(debug=debug, host='0.0.0.0', port=port)
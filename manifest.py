@@ -56,6 +56,54 @@ def generate_full_manifest(client_data: dict, rp_uuid: str = None, bp_uuid: str
 
     return manifest
 
+
+# modules[].type からパックの種類 (リポジトリ上のフォルダ) への対応
+MODULE_PACK_TYPES = {"data": "BP", "script": "BP", "javascript": "BP", "resources": "RP"}
+
+
+def detect_pack_type(manifest: dict):
+    """
+    manifest.json の modules からパックの種類を判定する。
+
+    Returns:
+        str | None: 'BP' / 'RP' (判定できない場合は None)
+    """
+    modules = manifest.get("modules") if isinstance(manifest, dict) else None
+    for module in modules or []:
+        if isinstance(module, dict):
+            pack_type = MODULE_PACK_TYPES.get(str(module.get("type", "")).lower())
+            if pack_type:
+                return pack_type
+    return None
+
+
+def link_pack_manifests(manifests: dict):
+    """
+    BP と RP のマニフェストを相互に依存させる (既に依存している場合は何もしない)。
+    .mcaddon のように別々のパックとしてアップロードされた BP/RP を1つのアドオンとして読み込ませるため。
+
+    Args:
+        manifests (dict): {'BP': マニフェスト, 'RP': マニフェスト} (その場で書き換える)
+
+    Returns:
+        int: 追加した依存関係の数
+    """
+    linked = 0
+    for pack_type, other_type in (("BP", "RP"), ("RP", "BP")):
+        manifest, other = manifests.get(pack_type), manifests.get(other_type)
+        if not isinstance(manifest, dict) or not isinstance(other, dict):
+            continue
+        other_header = other.get("header") or {}
+        if not other_header.get("uuid"):
+            continue
+        dependencies = manifest.setdefault("dependencies", [])
+        if any(isinstance(dep, dict) and dep.get("uuid") == other_header["uuid"] for dep in dependencies):
+            continue
+        dependencies.append({"uuid": other_header["uuid"], "version": other_header.get("version", [1, 0, 0])})
+        linked += 1
+        print(f"Manifest_Linked:{pack_type}->{other_type}_{other_header['uuid']}")
+    return linked
+
 # --- 実行例 (カスタムBPを生成し、RP:AAAA-AAAA-AAAAに依存させる) ---
 # 既存RPのUUIDを仮定
 EXISTING_RP_UUID = "aaaaa-bbbbb-ccccc-ddddd" 
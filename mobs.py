@@ -1,3 +1,4 @@
+import copy
 import json
 import uuid
 import re
@@ -59,7 +60,7 @@ def validate_and_format_mob_data(mob_name: str, client_data: dict):
         return {"error": "Families must be a non-empty list."}
     
     # 2. テンプレートのコピーとidentifierの設定
-    final_json = MOB_TEMPLATE.copy()
+    final_json = copy.deepcopy(MOB_TEMPLATE)
     
     # 内部識別子 (例: minecraft:sheep) を設定
     identifier = f"minecraft:{mob_name}"
@@ -0,0 +1,404 @@
+import os
+import re
+from functools import lru_cache
+
+print("Molang_Module_Loaded")
+
+# --- Molang の構文チェック ---
+# RP のアニメーション・アニメーションコントローラー・レンダーコントローラーに書かれた Molang 式を解析し、
+# ゲーム内で初めて分かる構文エラーをアップロード時に見つける。
+#
+# パックの中では同じ式 (例: "query.is_baby" や "math.cos(query.anim_time * 38.17) * 80.0") が何千回も
+# 出てくるため、解析結果 (AST) は式の文字列をキーに LRU キャッシュする。エラーもキャッシュされる。
+# AST はタプルだけで組み立てるので、キャッシュから返したものを呼び出し側が壊すことはない。
+#
+# AST の形:
+#   ('num', 1.0) / ('str', 'abc') / ('name', ('query', 'is_baby'))
+#   ('call', ('math', 'sin'), (引数, ...)) / ('index', 式, 式) / ('arrow', 式, 式)
+#   ('unary', '!', 式) / ('binary', '+', 左, 右) / ('ternary', 条件, 真, 偽) / ('conditional', 条件, 真)
+#   ('assign', ('name', ...), 式) / ('block', (文, ...)) / ('return', 式) / ('break',) / ('continue',)
+#   ('statements', (文, ...))   ';' で区切られた複数の文
+MOLANG_CACHE_SIZE = int(os.environ.get("MOLANG_CACHE_SIZE", 4096))
+
+# 名前空間 (大文字・小文字は区別しない)。書き込めるのは variable / temp だけ
+MOLANG_NAMESPACES = {
+    "query": "query", "q": "query", "variable": "variable", "v": "variable", "temp": "temp", "t": "temp",
+    "context": "context", "c": "context", "math": "math", "geometry": "geometry", "texture": "texture",
+    "material": "material", "array": "array",
+}
+MOLANG_WRITABLE = {"variable", "temp"}
+MOLANG_KEYWORDS = {"this", "true", "false", "loop", "for_each"}
+MOLANG_MATH_FUNCTIONS = {
+    "abs", "acos", "asin", "atan", "atan2", "ceil", "clamp", "copy_sign", "cos", "die_roll", "die_roll_integer",
+    "exp", "floor", "hermite_blend", "inverse_lerp", "lerp", "lerprotate", "ln", "max", "min", "min_angle",
+    "mod", "pi", "pow", "random", "random_integer", "round", "sign", "sin", "sqrt", "trunc",
+}
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<number>(?:\d+(?:\.\d*)?|\.\d+)f?)
+  | (?P<string>'[^']*')
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>\?\?|->|==|!=|<=|>=|&&|\|\||[-+*/<>!?:=(),;{}\[\].])
+""", re.VERBOSE)
+
+# 二項演算子の結合力 (大きいほど強い)
+_BINARY_POWER = {
+    "??": 10, "||": 20, "&&": 30, "==": 40, "!=": 40,
+    "<": 50, "<=": 50, ">": 50, ">=": 50, "+": 60, "-": 60, "*": 70, "/": 70,
+}
+_TERNARY_POWER = 5
+_UNARY_POWER = 80
+
+
+class MolangSyntaxError(Exception):
+    def __init__(self, message: str, position: int):
+        super().__init__(message)
+        self.position = position
+
+
+def tokenize(expression: str):
+    """
+    式をトークンのリスト [(種類, 値, 位置), ...] に分割する。最後は ('end', None, 長さ)。
+    """
+    tokens = []
+    position = 0
+    while position < len(expression):
+        match = _TOKEN_RE.match(expression, position)
+        if match is None:
+            raise MolangSyntaxError(f"使えない文字 '{expression[position]}'", position)
+        kind = match.lastgroup
+        if kind != "space":
+            tokens.append((kind, match.group(), position))
+        position = match.end()
+    tokens.append(("end", None, len(expression)))
+    return tokens
+
+
+class _Parser:
+    """トークン列を AST に変換する (演算子の優先順位は Pratt 法で処理する)。"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.index = 0
+
+    def peek(self, value=None):
+        kind, token, _ = self.tokens[self.index]
+        if value is None:
+            return token
+        return kind == "op" and token == value
+
+    def advance(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, value: str):
+        kind, token, position = self.advance()
+        if kind != "op" or token != value:
+            raise MolangSyntaxError(f"'{value}' が必要ですが '{token or '式の終わり'}' があります", position)
+
+    def error(self, message: str):
+        raise MolangSyntaxError(message, self.tokens[self.index][2])
+
+    # --- 文 ---
+
+    def parse_program(self, closing: str = None):
+        """';' で区切られた文の並び。closing ('}') が来るか、式の終わりで止まる。"""
+        statements = []
+        while True:
+            while self.peek(";"):
+                self.advance()
+            if self.tokens[self.index][0] == "end" or (closing and self.peek(closing)):
+                break
+            statements.append(self.parse_statement())
+            if not self.peek(";"):
+                break
+        if closing:
+            self.expect(closing)
+        elif self.tokens[self.index][0] != "end":
+            kind, token, position = self.tokens[self.index]
+            raise MolangSyntaxError(f"予期しない '{token}'", position)
+        if not statements:
+            return ("statements", ())
+        return statements[0] if len(statements) == 1 and closing is None else ("statements", tuple(statements))
+
+    def parse_statement(self):
+        kind, token, position = self.tokens[self.index]
+        if kind == "name" and token.lower() == "return":
+            self.advance()
+            return ("return", self.parse_expression())
+        target = self.parse_expression()
+        if self.peek("="):
+            self.advance()
+            if target[0] != "name" or MOLANG_NAMESPACES.get(target[1][0]) not in MOLANG_WRITABLE:
+                raise MolangSyntaxError("代入できるのは variable / temp の変数だけです", position)
+            return ("assign", target, self.parse_expression())
+        return target
+
+    # --- 式 ---
+
+    def parse_expression(self, min_power: int = 0):
+        left = self.parse_unary()
+        while True:
+            kind, token, position = self.tokens[self.index]
+            if kind != "op":
+                return left
+            if token == "?" and min_power <= _TERNARY_POWER:
+                self.advance()
+                when_true = self.parse_expression(_TERNARY_POWER)
+                if self.peek(":"):
+                    self.advance()
+                    left = ("ternary", left, when_true, self.parse_expression(_TERNARY_POWER))
+                else:
+                    left = ("conditional", left, when_true)
+                continue
+            power = _BINARY_POWER.get(token)
+            if power is None or power <= min_power:
+                return left
+            self.advance()
+            # '??' は右結合、それ以外は左結合
+            right = self.parse_expression(power - 1 if token == "??" else power)
+            left = ("binary", token, left, right)
+
+    def parse_unary(self):
+        if self.peek("!") or self.peek("-"):
+            operator = self.advance()[1]
+            return ("unary", operator, self.parse_expression(_UNARY_POWER))
+        return self.parse_postfix(self.parse_primary())
+
+    def parse_postfix(self, node):
+        while True:
+            if self.peek("["):
+                self.advance()
+                index = self.parse_expression()
+                self.expect("]")
+                node = ("index", node, index)
+            elif self.peek("->"):
+                self.advance()
+                node = ("arrow", node, self.parse_postfix(self.parse_name()))
+            else:
+                return node
+
+    def parse_primary(self):
+        kind, token, position = self.tokens[self.index]
+        if kind == "number":
+            self.advance()
+            return ("num", float(token.rstrip("f")))
+        if kind == "string":
+            self.advance()
+            return ("str", token[1:-1])
+        if kind == "name":
+            return self.parse_name()
+        if self.peek("("):
+            self.advance()
+            node = self.parse_expression()
+            self.expect(")")
+            return node
+        if self.peek("{"):
+            self.advance()
+            body = self.parse_program(closing="}")
+            return ("block", body[1] if body[0] == "statements" else (body,))
+        if kind == "end":
+            self.error("式が途中で終わっています")
+        self.error(f"予期しない '{token}'")
+
+    def parse_name(self):
+        kind, token, position = self.advance()
+        if kind != "name":
+            raise MolangSyntaxError(f"名前が必要ですが '{token or '式の終わり'}' があります", position)
+        parts = [token.lower()]
+        while self.peek("."):
+            self.advance()
+            kind, token, _ = self.advance()
+            if kind != "name":
+                raise MolangSyntaxError(f"'.' の後に名前が必要です", self.tokens[self.index - 1][2])
+            parts.append(token.lower())
+
+        if len(parts) == 1:
+            if parts[0] in ("true", "false"):
+                return ("num", 1.0 if parts[0] == "true" else 0.0)
+            # "(v.x > 5) ? break;" のように条件式の中にも書ける
+            if parts[0] in ("break", "continue"):
+                return (parts[0],)
+            if parts[0] not in MOLANG_KEYWORDS:
+                raise MolangSyntaxError(f"不明な名前 '{parts[0]}' (query. / variable. などの名前空間が必要です)",
+                                        position)
+        elif parts[0] not in MOLANG_NAMESPACES:
+            raise MolangSyntaxError(f"不明な名前空間 '{parts[0]}'", position)
+        elif MOLANG_NAMESPACES[parts[0]] == "math" and (len(parts) != 2 or not (
+                parts[1] in MOLANG_MATH_FUNCTIONS or parts[1].startswith("ease_"))):
+            raise MolangSyntaxError(f"不明な関数 'math.{'.'.join(parts[1:])}'", position)
+        name = tuple(parts)
+
+        if self.peek("("):
+            self.advance()
+            arguments = []
+            while not self.peek(")"):
+                # loop / for_each の本体は { } のブロック
+                arguments.append(self.parse_expression())
+                if not self.peek(","):
+                    break
+                self.advance()
+            self.expect(")")
+            return ("call", name, tuple(arguments))
+        return ("name", name)
+
+
+def _parse(expression: str):
+    try:
+        return _Parser(tokenize(expression)).parse_program(), None
+    except MolangSyntaxError as e:
+        return None, f"{e} (列 {e.position + 1})"
+
+
+@lru_cache(maxsize=MOLANG_CACHE_SIZE)
+def parse_molang(expression: str):
+    """
+    Molang 式 (';' で区切った複数の文も可) を解析する。結果は式の文字列ごとにキャッシュされる。
+
+    Returns:
+        tuple: (AST, エラーメッセージ) (成功した場合はエラーが None、失敗した場合は AST が None)
+    """
+    return _parse(expression)
+
+
+# --- パック内の Molang の位置 ---
+# ファイルの種類ごとに、Molang が書かれるフィールドだけを調べる (アニメーション名やテクスチャのパスは対象外)。
+
+def _check(expression, path, found, parse):
+    # 数値・真偽値はそのまま使える。文字列だけを解析する
+    if isinstance(expression, str):
+        found["expressions"] += 1
+        _, error = parse(expression)
+        if error:
+            found["errors"].append({"path": "/".join(path), "expression": expression, "error": error})
+
+
+def _check_vector(value, path, found, parse):
+    # [x, y, z] / 1つの式 / キーフレーム {"時刻": 値 | {"pre": 値, "post": 値, "lerp_mode": ...}}
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            _check(item, path + [f"[{i}]"], found, parse)
+    elif isinstance(value, dict):
+        for key, frame in value.items():
+            if isinstance(frame, dict):
+                for side in ("pre", "post"):
+                    if side in frame:
+                        _check_vector(frame[side], path + [key, side], found, parse)
+            else:
+                _check_vector(frame, path + [key], found, parse)
+    else:
+        _check(value, path, found, parse)
+
+
+def _check_statements(value, path, found, parse):
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            _check(item, path + [f"[{i}]"], found, parse)
+    else:
+        _check(value, path, found, parse)
+
+
+def _check_effects(effects, path, found, parse):
+    # particle_effects / sound_effects: {"時刻": 効果 | [効果, ...]} またはコントローラーの [効果, ...]
+    items = effects.items() if isinstance(effects, dict) else enumerate(effects or [])
+    for key, effect in items:
+        key = key if isinstance(key, str) else f"[{key}]"
+        for i, item in enumerate(effect if isinstance(effect, list) else [effect]):
+            if isinstance(item, dict) and "pre_effect_script" in item:
+                item_path = path + [key] + ([f"[{i}]"] if isinstance(effect, list) else [])
+                _check(item["pre_effect_script"], item_path + ["pre_effect_script"], found, parse)
+
+
+def _dict_items(value):
+    return value.items() if isinstance(value, dict) else ()
+
+
+def _walk_animations(document, found, parse):
+    for name, animation in _dict_items(document.get("animations")):
+        if not isinstance(animation, dict):
+            continue
+        path = ["animations", name]
+        for key in ("anim_time_update", "blend_weight", "start_delay", "loop_delay"):
+            if key in animation:
+                _check(animation[key], path + [key], found, parse)
+        for bone, channels in _dict_items(animation.get("bones")):
+            for channel in ("rotation", "position", "scale"):
+                if isinstance(channels, dict) and channel in channels:
+                    _check_vector(channels[channel], path + ["bones", bone, channel], found, parse)
+        for time_key, statements in _dict_items(animation.get("timeline")):
+            _check_statements(statements, path + ["timeline", time_key], found, parse)
+        for key in ("particle_effects", "sound_effects"):
+            if key in animation:
+                _check_effects(animation[key], path + [key], found, parse)
+
+
+def _walk_animation_controllers(document, found, parse):
+    for name, controller in _dict_items(document.get("animation_controllers")):
+        for state_name, state in _dict_items(controller.get("states") if isinstance(controller, dict) else None):
+            if not isinstance(state, dict):
+                continue
+            path = ["animation_controllers", name, "states", state_name]
+            for i, animation in enumerate(state.get("animations") or []):
+                # "名前" または {"名前": ブレンドの重みの式}
+                for key, expression in _dict_items(animation):
+                    _check(expression, path + ["animations", f"[{i}]", key], found, parse)
+            for i, transition in enumerate(state.get("transitions") or []):
+                for target, expression in _dict_items(transition):
+                    _check(expression, path + ["transitions", f"[{i}]", target], found, parse)
+            for key in ("on_entry", "on_exit", "parameters"):
+                if key in state:
+                    _check_statements(state[key], path + [key], found, parse)
+            for variable, definition in _dict_items(state.get("variables")):
+                if isinstance(definition, dict) and "input" in definition:
+                    _check(definition["input"], path + ["variables", variable, "input"], found, parse)
+            for key in ("particle_effects", "sound_effects"):
+                if key in state:
+                    _check_effects(state[key], path + [key], found, parse)
+
+
+def _walk_render_controllers(document, found, parse):
+    for name, controller in _dict_items(document.get("render_controllers")):
+        if not isinstance(controller, dict):
+            continue
+        path = ["render_controllers", name]
+        for key in ("geometry", "light_color_multiplier"):
+            if key in controller:
+                _check(controller[key], path + [key], found, parse)
+        _check_statements(controller.get("textures", []), path + ["textures"], found, parse)
+        for key in ("materials", "part_visibility"):
+            for i, mapping in enumerate(controller.get(key) or []):
+                for bone, expression in _dict_items(mapping):
+                    _check(expression, path + [key, f"[{i}]", bone], found, parse)
+        for key in ("color", "overlay_color", "on_fire_color", "is_hurt_color"):
+            for channel, expression in _dict_items(controller.get(key)):
+                _check(expression, path + [key, channel], found, parse)
+        for key, vector in _dict_items(controller.get("uv_anim")):
+            _check_vector(vector, path + ["uv_anim", key], found, parse)
+
+
+# RP のフォルダ -> その中の JSON を調べる関数
+MOLANG_FOLDERS = {
+    "RP/animations": _walk_animations,
+    "RP/animation_controllers": _walk_animation_controllers,
+    "RP/render_controllers": _walk_render_controllers,
+}
+
+
+def validate_molang_document(folder: str, document: dict, parse=parse_molang):
+    """
+    アニメーション等の JSON に含まれる Molang 式を全て解析する。
+
+    Args:
+        folder (str): MOLANG_FOLDERS のキー (例: 'RP/animations')
+        document (dict): JSON の内容
+        parse: 式を解析する関数 (キャッシュしない場合の比較用に差し替えられる)
+
+    Returns:
+        dict: {'expressions': 調べた式の数, 'errors': [{'path': JSONパス, 'expression', 'error'}]}
+    """
+    found = {"expressions": 0, "errors": []}
+    if isinstance(document, dict):
+        MOLANG_FOLDERS[folder](document, found, parse)
+    return found
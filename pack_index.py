@@ -0,0 +1,257 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+print("Pack_Index_Module_Loaded")
+
+# --- パック内容の検索用インデックス (SQLite) ---
+# parse_pack_file_to_client_data の結果 (client_input) を正規化したテーブルに保存し、
+# 「family が monster で hp が 40 を超えるモブ」のような検索をパックを再解析せずに行えるようにする。
+# パックを再アップロードした場合は、そのパックの行をまとめて入れ替える。
+PACK_INDEX_DB = os.environ.get(
+    "PACK_INDEX_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "pack_index.sqlite3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packs (
+    pack_id     TEXT PRIMARY KEY,
+    indexed_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mobs (
+    pack_id     TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    identifier  TEXT,
+    hp          REAL,
+    speed       REAL,
+    PRIMARY KEY (pack_id, name)
+);
+CREATE INDEX IF NOT EXISTS mobs_hp ON mobs (hp);
+CREATE INDEX IF NOT EXISTS mobs_identifier ON mobs (identifier);
+CREATE TABLE IF NOT EXISTS mob_families (
+    pack_id     TEXT NOT NULL,
+    mob_name    TEXT NOT NULL,
+    family      TEXT NOT NULL,
+    PRIMARY KEY (pack_id, mob_name, family)
+);
+CREATE INDEX IF NOT EXISTS mob_families_family ON mob_families (family, pack_id, mob_name);
+CREATE TABLE IF NOT EXISTS items (
+    pack_id     TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    identifier  TEXT,
+    durability  INTEGER,
+    stack_size  INTEGER,
+    attack      REAL,
+    PRIMARY KEY (pack_id, name)
+);
+CREATE INDEX IF NOT EXISTS items_durability ON items (durability);
+CREATE INDEX IF NOT EXISTS items_identifier ON items (identifier);
+CREATE TABLE IF NOT EXISTS blocks (
+    pack_id     TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    identifier  TEXT,
+    hardness    REAL,
+    resistance  REAL,
+    PRIMARY KEY (pack_id, name)
+);
+CREATE INDEX IF NOT EXISTS blocks_hardness ON blocks (hardness);
+CREATE INDEX IF NOT EXISTS blocks_identifier ON blocks (identifier);
+CREATE TABLE IF NOT EXISTS lang (
+    pack_id     TEXT NOT NULL,
+    lang_code   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    value       TEXT,
+    PRIMARY KEY (pack_id, lang_code, key)
+);
+CREATE INDEX IF NOT EXISTS lang_key ON lang (key);
+"""
+
+# パックの行を入れ替えるときに削除するテーブルと、パックIDの列
+PACK_TABLES = ("mobs", "mob_families", "items", "blocks", "lang")
+
+# 検索で使えるフィルタ: {テーブル: {パラメータ名: (SQL の条件, 値の型)}}
+# 値はプレースホルダで渡すので、ここに無いパラメータは受け付けない。
+QUERY_FILTERS = {
+    "mobs": {
+        "pack": ("m.pack_id = ?", str),
+        "identifier": ("m.identifier = ?", str),
+        "family": ("EXISTS (SELECT 1 FROM mob_families f WHERE f.family = ?"
+                   " AND f.pack_id = m.pack_id AND f.mob_name = m.name)", str),
+        "min_hp": ("m.hp >= ?", float),
+        "max_hp": ("m.hp <= ?", float),
+        "min_speed": ("m.speed >= ?", float),
+        "max_speed": ("m.speed <= ?", float),
+    },
+    "items": {
+        "pack": ("m.pack_id = ?", str),
+        "identifier": ("m.identifier = ?", str),
+        "min_durability": ("m.durability >= ?", int),
+        "max_durability": ("m.durability <= ?", int),
+        "min_stack_size": ("m.stack_size >= ?", int),
+        "max_stack_size": ("m.stack_size <= ?", int),
+        "min_attack": ("m.attack >= ?", float),
+        "max_attack": ("m.attack <= ?", float),
+    },
+    "blocks": {
+        "pack": ("m.pack_id = ?", str),
+        "identifier": ("m.identifier = ?", str),
+        "min_hardness": ("m.hardness >= ?", float),
+        "max_hardness": ("m.hardness <= ?", float),
+        "min_resistance": ("m.resistance >= ?", float),
+        "max_resistance": ("m.resistance <= ?", float),
+    },
+    "lang": {
+        "pack": ("m.pack_id = ?", str),
+        "lang_code": ("m.lang_code = ?", str),
+        "key": ("m.key = ?", str),
+        # LIKE ではなく範囲条件にすると lang_key のインデックスが使える
+        "key_prefix": ("m.key >= ? AND m.key < ? || char(1114111)", str),
+    },
+}
+
+QUERY_SELECT = {
+    "mobs": "SELECT m.pack_id, m.name, m.identifier, m.hp, m.speed,"
+            " (SELECT json_group_array(f.family) FROM mob_families f"
+            "  WHERE f.pack_id = m.pack_id AND f.mob_name = m.name) AS families FROM mobs m",
+    "items": "SELECT m.pack_id, m.name, m.identifier, m.durability, m.stack_size, m.attack FROM items m",
+    "blocks": "SELECT m.pack_id, m.name, m.identifier, m.hardness, m.resistance FROM blocks m",
+    "lang": "SELECT m.pack_id, m.lang_code, m.key, m.value FROM lang m",
+}
+
+QUERY_MAX_LIMIT = 1000
+
+_local = threading.local()
+
+
+def get_connection(db_path: str = None):
+    """スレッドごとに1つの接続を使い回す (sqlite3 の接続はスレッド間で共有できないため)。"""
+    db_path = db_path or PACK_INDEX_DB
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    if db_path not in connections:
+        connection = sqlite3.connect(db_path)
+        connection.row_factory = sqlite3.Row
+        # 書き込み中も他のワーカーが読めるように WAL モードにする
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        connections[db_path] = connection
+        print(f"Pack_Index_Opened:{db_path}")
+    return connections[db_path]
+
+
+def _as_number(value):
+    # bool は int のサブクラスなので除外する
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def _as_text(value):
+    return value if isinstance(value, str) else None
+
+
+def pack_index_id(client_input: dict, fallback: str):
+    """
+    インデックスでのパックの識別子を決める。ファイル名は別のパックと重なり得るので、
+    マニフェストのヘッダの UUID (BP を優先、.mcaddon でも BP/RP で1つ) を使い、無い場合だけ fallback を使う。
+
+    Args:
+        client_input (dict): 'manifest' ({'BP' / 'RP': マニフェスト}) を含む client_input
+        fallback (str): マニフェストに UUID が無い場合の識別子 (ファイル名など)
+    """
+    manifests = client_input.get('manifest') or {}
+    for pack_type in ('BP', 'RP'):
+        manifest = manifests.get(pack_type)
+        header = manifest.get('header') if isinstance(manifest, dict) else None
+        if isinstance(header, dict) and isinstance(header.get('uuid'), str) and header['uuid']:
+            return header['uuid']
+    return fallback
+
+
+def index_client_input(pack_id: str, client_input: dict, db_path: str = None):
+    """
+    client_input をインデックスに登録する。同じ pack_id の既存の行は置き換える。
+
+    Args:
+        pack_id (str): パックの識別子 (pack_index_id() で決める)
+        client_input (dict): parse_pack_file_to_client_data の結果
+        db_path (str): データベースのパス (省略時は PACK_INDEX_DB)
+
+    Returns:
+        dict: テーブルごとの登録件数
+    """
+    mobs, families, items, blocks, lang = [], [], [], [], []
+
+    for name, data in client_input.get('mobs', {}).items():
+        mobs.append((pack_id, name, _as_text(data.get('identifier')), _as_number(data.get('hp')), _as_number(data.get('speed'))))
+        mob_families = data.get('families')
+        if isinstance(mob_families, list):
+            families.extend((pack_id, name, family) for family in set(mob_families) if isinstance(family, str))
+
+    for name, data in client_input.get('items', {}).items():
+        items.append((pack_id, name, _as_text(data.get('identifier')), _as_number(data.get('durability')),
+                      _as_number(data.get('stack_size')), _as_number(data.get('attack'))))
+
+    for name, data in client_input.get('blocks', {}).items():
+        blocks.append((pack_id, name, _as_text(data.get('identifier')), _as_number(data.get('hardness')),
+                       _as_number(data.get('resistance'))))
+
+    for lang_code, entries in client_input.get('lang', {}).items():
+        lang.extend((pack_id, lang_code, key, str(value)) for key, value in entries.items())
+
+    connection = get_connection(db_path)
+    with connection:
+        for table in PACK_TABLES:
+            connection.execute(f"DELETE FROM {table} WHERE pack_id = ?", (pack_id,))
+        connection.executemany("INSERT INTO mobs VALUES (?, ?, ?, ?, ?)", mobs)
+        connection.executemany("INSERT INTO mob_families VALUES (?, ?, ?)", families)
+        connection.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?)", items)
+        connection.executemany("INSERT INTO blocks VALUES (?, ?, ?, ?, ?)", blocks)
+        connection.executemany("INSERT OR REPLACE INTO lang VALUES (?, ?, ?, ?)", lang)
+        connection.execute("INSERT OR REPLACE INTO packs VALUES (?, ?)", (pack_id, time.time()))
+
+    counts = {"mobs": len(mobs), "items": len(items), "blocks": len(blocks), "lang": len(lang)}
+    print(f"Pack_Indexed:{pack_id}_Counts:{counts}")
+    return counts
+
+
+def query_index(table: str, filters: dict, limit: int = 100, db_path: str = None):
+    """
+    インデックスを検索する。
+
+    Args:
+        table (str): 'mobs' / 'items' / 'blocks' / 'lang'
+        filters (dict): QUERY_FILTERS に定義されたパラメータと値 (例: {'family': 'monster', 'min_hp': '40'})
+        limit (int): 最大件数 (QUERY_MAX_LIMIT まで)
+
+    Returns:
+        tuple: (結果の辞書のリスト, エラーメッセージ)
+    """
+    if table not in QUERY_FILTERS:
+        return None, f"Unknown table: {table}"
+
+    conditions, params = [], []
+    for name, raw_value in filters.items():
+        if name not in QUERY_FILTERS[table]:
+            return None, f"Unknown filter for {table}: {name}"
+        condition, value_type = QUERY_FILTERS[table][name]
+        try:
+            value = value_type(raw_value)
+        except (TypeError, ValueError):
+            return None, f"Invalid value for {name}: {raw_value}"
+        conditions.append(condition)
+        params.extend([value] * condition.count("?"))
+
+    sql = QUERY_SELECT[table]
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY m.pack_id, " + ("m.lang_code, m.key" if table == "lang" else "m.name") + " LIMIT ?"
+    params.append(max(1, min(int(limit), QUERY_MAX_LIMIT)))
+
+    rows = [dict(row) for row in get_connection(db_path).execute(sql, params)]
+    if table == "mobs":
+        for row in rows:
+            row["families"] = sorted(json.loads(row["families"]))
+    return rows, None
@@ -1,39 +1,54 @@
 import json
 import zipfile
 import io
+import os
+import re
+import time
+import copy
+import collections
+import shutil
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from manifest import detect_pack_type, link_pack_manifests
+from molang import MOLANG_FOLDERS, validate_molang_document
+from records import to_record
+from sounds import collect_sound_definitions
 
 print("Pack_Parser_Module_Loaded")
 
 # --- マッピング定義 ---
-# Minecraft BP JSON のパスから、シンプルなデータ構造のキーへのマッピングを定義
-# この辞書が、解析のロジックを担います。
-MAPPING_RULES = {
-    # エンティティ (モブ) のマッピング
-    "BP/entities": {
-        "file_key": "mobs", # 最終的な client_input['mobs'] になる
-        "rules": [
-            # HP (health) の抽出
-            {"path": ["minecraft:entity", "components", "minecraft:health", "value"], "target_key": "hp"},
-            # 速度 (movement) の抽出
-            {"path": ["minecraft:entity", "components", "minecraft:movement", "value"], "target_key": "speed"},
-            # ファミリー (タグ) の抽出 (複雑なためリストとしてそのまま保存)
-            {"path": ["minecraft:entity", "components", "minecraft:type_family", "family"], "target_key": "families"},
-        ]
-    },
-    # アイテムのマッピング (BP/items/custom_sword.json を想定)
-    "BP/items": {
-        "file_key": "items", # 最終的な client_input['items'] になる
-        "rules": [
-            # 耐久値 (durability) の抽出
-            {"path": ["minecraft:item", "components", "minecraft:durability", "max_durability"], "target_key": "durability"},
-            # スタックサイズ (max_stack_size) の抽出
-            {"path": ["minecraft:item", "components", "minecraft:max_stack_size"], "target_key": "stack_size"},
-        ]
-    }
-    # ... (block, ai, lang, geometry など他のデータもここに追加) ...
-}
+# Minecraft BP/RP JSON のパスから、シンプルなデータ構造のキーへのマッピングを定義
+# ルールはデータファイル (mapping_rules.json) に記述し、起動時に一度だけコンパイルする。
+#
+# ルール構文 ('/' 区切りのセグメント):
+#   minecraft:health       キーの完全一致
+#   *                      任意のキー (結果はキーごとの辞書になる)
+#   minecraft:behavior.*   キーの前方一致 (結果はキーごとの辞書になる)
+#   []                     配列の全要素 (結果はリストになる)
+#   [0]                    配列の特定の要素
+MAPPING_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mapping_rules.json")
+
+
+def load_mapping_rules(path: str = MAPPING_RULES_FILE):
+    """
+    マッピングルールのデータファイルを読み込む。
+
+    Args:
+        path (str): ルール定義JSONのパス
+
+    Returns:
+        dict: {フォルダパス: {'file_key': ..., 'rules': {target_key: ルール文字列}}}
+    """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+MAPPING_RULES = load_mapping_rules()
 print(f"MAPPING_RULES_Defined:{len(MAPPING_RULES)}_sections")
 
+
 def get_nested_value(data: dict, path: list):
     """
     ネストされた辞書から指定されたパスの値を取得するヘルパー関数
@@ -46,69 +61,786 @@ def get_nested_value(data: dict, path: list):
             return None
     return current
 
-def parse_pack_file_to_client_data(zip_file: zipfile.ZipFile):
+
+# --- ルールのコンパイル ---
+
+class _MatchNode:
+    """マッチャーオートマトンの1状態。子への遷移と、この位置で確定するルールを持つ。"""
+    __slots__ = ("literals", "prefixes", "any_key", "indices", "any_index", "accepts", "scan")
+
+    def __init__(self):
+        self.literals = {}     # キー -> _MatchNode
+        self.prefixes = []     # [(前方一致文字列, _MatchNode)]
+        self.any_key = None    # '*'
+        self.indices = {}      # 配列インデックス -> _MatchNode
+        self.any_index = None  # '[]'
+        self.accepts = []      # この位置で値を取り出すルール番号
+        self.scan = False      # ワイルドカード/前方一致を持つ (全キーの走査が必要)
+
+
+def parse_rule(rule):
+    """
+    ルール文字列 (または従来形式のキーリスト) をセグメントのリストに変換する。
+
+    Returns:
+        list: [('key', k) | ('prefix', p) | ('any_key', None) | ('index', i) | ('any_index', None)]
+    """
+    if isinstance(rule, list):
+        # 従来形式 {"path": [...]} は完全一致のみ
+        return [('key', key) for key in rule]
+
+    segments = []
+    for part in rule.split('/'):
+        if part == '*':
+            segments.append(('any_key', None))
+        elif part == '[]':
+            segments.append(('any_index', None))
+        elif part.startswith('[') and part.endswith(']') and part[1:-1].isdigit():
+            segments.append(('index', int(part[1:-1])))
+        elif part.endswith('*'):
+            segments.append(('prefix', part[:-1]))
+        elif part:
+            segments.append(('key', part))
+    return segments
+
+
+class CompiledRuleSet:
+    """
+    1フォルダ分のルールをまとめてコンパイルしたマッチャー。
+    extract() はドキュメントを1回だけ走査し、全ルールの値を同時に取り出す。
+    """
+
+    def __init__(self, rules):
+        # rules: {target_key: ルール} または従来形式 [{'path': [...], 'target_key': ...}]
+        if isinstance(rules, list):
+            rules = {r["target_key"]: r.get("rule", r.get("path")) for r in rules}
+
+        self.root = _MatchNode()
+        self.target_keys = []
+        self.capture_kinds = []  # ルールごとのワイルドカードの種類 ('key' / 'index') の並び
+
+        for target_key, rule in rules.items():
+            rule_id = len(self.target_keys)
+            self.target_keys.append(target_key)
+            kinds = []
+            node = self.root
+            for kind, arg in parse_rule(rule):
+                if kind == 'key':
+                    node = node.literals.setdefault(arg, _MatchNode())
+                elif kind == 'index':
+                    node = node.indices.setdefault(arg, _MatchNode())
+                elif kind == 'any_key':
+                    if node.any_key is None:
+                        node.any_key = _MatchNode()
+                        node.scan = True
+                    node = node.any_key
+                    kinds.append('key')
+                elif kind == 'any_index':
+                    if node.any_index is None:
+                        node.any_index = _MatchNode()
+                    node = node.any_index
+                    kinds.append('index')
+                elif kind == 'prefix':
+                    for prefix, child in node.prefixes:
+                        if prefix == arg:
+                            node = child
+                            break
+                    else:
+                        child = _MatchNode()
+                        node.prefixes.append((arg, child))
+                        node.scan = True
+                        node = child
+                    kinds.append('key')
+            node.accepts.append(rule_id)
+            self.capture_kinds.append(kinds)
+
+    def initial_states(self):
+        return [(self.root, ())]
+
+    def extract(self, document, states=None, out=None):
+        """
+        ドキュメントから全ルールの値を取り出す。
+
+        Args:
+            document: json.load 済みのドキュメント (またはその部分木)
+            states (list): 走査を開始するオートマトン状態 (省略時はルート)
+            out (dict): 途中結果 (ストリーミング抽出で部分木ごとに呼ぶ場合に使用)
+
+        Returns:
+            dict: {target_key: 値}
+        """
+        raw = {} if out is None else out
+        self._walk(document, states or self.initial_states(), raw)
+        return raw if out is not None else self.finalize(raw)
+
+    def emit(self, raw, rule_id, captures, value):
+        """マッチした値を、ワイルドカードの捕捉値ごとに格納する。"""
+        if not self.capture_kinds[rule_id]:
+            raw.setdefault(rule_id, value)
+            return
+        container = raw.setdefault(rule_id, {})
+        for capture in captures[:-1]:
+            container = container.setdefault(capture, {})
+        container.setdefault(captures[-1], value)
+
+    def _walk(self, value, states, raw):
+        for node, captures in states:
+            for rule_id in node.accepts:
+                self.emit(raw, rule_id, captures, value)
+
+        if isinstance(value, dict):
+            if len(states) == 1 and not states[0][0].scan:
+                # よくあるケース: 完全一致のみの状態1つ → 子を直接引いて再帰する
+                node, captures = states[0]
+                for key, child in node.literals.items():
+                    if key in value:
+                        self._walk(value[key], [(child, captures)], raw)
+                return
+            for key, child_states in self.step_dict(value, states).items():
+                self._walk(value[key], child_states, raw)
+        elif isinstance(value, list):
+            for index, child_states in self.step_list(len(value), states).items():
+                self._walk(value[index], child_states, raw)
+
+    def step_key(self, key, states):
+        """オブジェクトのキー1つ分の遷移を計算する (ストリーミング抽出と共用)。"""
+        next_states = []
+        for node, captures in states:
+            child = node.literals.get(key)
+            if child is not None:
+                next_states.append((child, captures))
+            for prefix, child in node.prefixes:
+                if key.startswith(prefix):
+                    next_states.append((child, captures + (key,)))
+            if node.any_key is not None:
+                next_states.append((node.any_key, captures + (key,)))
+        return next_states
+
+    def step_index(self, index, states):
+        """配列の要素1つ分の遷移を計算する (ストリーミング抽出と共用)。"""
+        next_states = []
+        for node, captures in states:
+            child = node.indices.get(index)
+            if child is not None:
+                next_states.append((child, captures))
+            if node.any_index is not None:
+                next_states.append((node.any_index, captures + (index,)))
+        return next_states
+
+    def step_dict(self, value, states):
+        # 完全一致のみの状態はキーを直接引き、ワイルドカードを持つ状態だけ全キーを走査する
+        if not any(node.scan for node, _ in states):
+            transitions = {}
+            for node, captures in states:
+                for key, child in node.literals.items():
+                    if key in value:
+                        transitions.setdefault(key, []).append((child, captures))
+            return transitions
+
+        transitions = {}
+        if len(states) == 1:
+            # 状態が1つの場合は step_key を展開し、キーごとの関数呼び出しを省く
+            node, captures = states[0]
+            literals, prefixes, any_key = node.literals, node.prefixes, node.any_key
+            prefix_tuple = tuple(prefix for prefix, _ in prefixes)
+            for key in value:
+                next_states = []
+                child = literals.get(key)
+                if child is not None:
+                    next_states.append((child, captures))
+                if prefix_tuple and key.startswith(prefix_tuple):
+                    for prefix, child in prefixes:
+                        if key.startswith(prefix):
+                            next_states.append((child, captures + (key,)))
+                if any_key is not None:
+                    next_states.append((any_key, captures + (key,)))
+                if next_states:
+                    transitions[key] = next_states
+            return transitions
+
+        for key in value:
+            next_states = self.step_key(key, states)
+            if next_states:
+                transitions[key] = next_states
+        return transitions
+
+    def step_list(self, length, states):
+        transitions = {}
+        for node, captures in states:
+            if node.any_index is not None:
+                for index in range(length):
+                    transitions.setdefault(index, []).append((node.any_index, captures + (index,)))
+            for index, child in node.indices.items():
+                if index < length:
+                    transitions.setdefault(index, []).append((child, captures))
+        return transitions
+
+    def finalize(self, raw):
+        """ルール番号をキーにした途中結果を target_key の辞書に変換する。"""
+        extracted = {}
+        for rule_id, value in raw.items():
+            kinds = self.capture_kinds[rule_id]
+            extracted[self.target_keys[rule_id]] = _shape_captures(value, kinds) if kinds else value
+        return extracted
+
+
+def _shape_captures(container, kinds):
+    # 配列の射影 ('[]') で捕捉した階層はリストに、キーのワイルドカードは辞書にする
+    if not kinds:
+        return container
+    if kinds[0] == 'index':
+        return [_shape_captures(container[i], kinds[1:]) for i in sorted(container)]
+    return {key: _shape_captures(child, kinds[1:]) for key, child in container.items()}
+
+
+def compile_mapping_rules(mapping_rules: dict):
+    """MAPPING_RULES の各フォルダのルールをコンパイルする。"""
+    return {
+        folder_path: {
+            "file_key": mapping_def["file_key"],
+            "matcher": CompiledRuleSet(mapping_def["rules"]),
+        }
+        for folder_path, mapping_def in mapping_rules.items()
+    }
+
+
+COMPILED_RULES = compile_mapping_rules(MAPPING_RULES)
+print(f"MAPPING_RULES_Compiled:{sum(len(c['matcher'].target_keys) for c in COMPILED_RULES.values())}_rules")
+
+
+# --- ストリーミング抽出 (巨大なアニメーション/ジオメトリ/ルートテーブル向け) ---
+# json.load でドキュメント全体を読み込まず、ZIPエントリのストリームを少しずつトークン化し、
+# ルールが対象とする部分木だけを実体化する。それ以外の部分は読み飛ばす。
+
+# この値以上のサイズ (展開後) のエントリは自動的にストリーミング抽出を使う
+STREAMING_THRESHOLD_BYTES = int(os.environ.get("STREAMING_THRESHOLD_BYTES", 8 * 1024 * 1024))
+
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+_SCALAR_RE = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null')
+# 括弧以外の文字・完結した文字列・入れ子のない配列/オブジェクト ([1, 2, 3] など) をまとめて読み飛ばす
+# (次の括弧の直前で止まる)。
+# 繰り返しは全て強欲 (possessive: ++ / *+) にする。通常の * の中に + があると、入れ子の括弧でマッチに
+# 失敗したときに区切り方を全て試し直し、要素数に対して指数時間になる (インデントされたJSONで顕著)。
+_STRING_PATTERN = r'"[^"\\]*+(?:\\.[^"\\]*+)*+"'
+_FLAT_PATTERN = r'(?:[^"{}\[\]]++|' + _STRING_PATTERN + r')*+'
+_SKIP_TO_BRACKET_RE = re.compile(
+    r'(?:[^"{}\[\]]++|' + _STRING_PATTERN + r'|\[' + _FLAT_PATTERN + r'\]|\{' + _FLAT_PATTERN + r'\})*+'
+)
+_FLAT_GROUP_RE = re.compile(r'\[' + _FLAT_PATTERN + r'\]|\{' + _FLAT_PATTERN + r'\}')
+_STRING_RE = re.compile(_STRING_PATTERN)
+_DECODER = json.JSONDecoder()
+
+
+class StreamingExtractor:
+    """
+    テキストストリームを逐次トークン化し、CompiledRuleSet のオートマトンに従って
+    必要な部分木だけを実体化する。ピークメモリは抽出対象のサイズ + チャンクサイズ程度になる。
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, text_stream, matcher: CompiledRuleSet):
+        self.stream = text_stream
+        self.matcher = matcher
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def extract(self):
+        """ストリーム全体を1回だけ走査し、{target_key: 値} を返す。"""
+        raw = {}
+        self._value(self.matcher.initial_states(), raw)
+        return self.matcher.finalize(raw)
+
+    # --- バッファ管理 ---
+
+    def _fill(self):
+        chunk = self.stream.read(self.CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            self.pos = _WHITESPACE_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise json.JSONDecodeError("Unexpected end of stream", self.buf, self.pos)
+
+    def _expect(self, chars):
+        c = self._peek()
+        if c not in chars:
+            raise json.JSONDecodeError(f"Expected one of {chars!r}", self.buf, self.pos)
+        self.pos += 1
+        return c
+
+    # --- トークンの読み取り/読み飛ばし ---
+
+    def _string(self):
+        self._peek()
+        while True:
+            m = _STRING_RE.match(self.buf, self.pos)
+            if m:
+                self.pos = m.end()
+                text = m.group()
+                return json.loads(text) if '\\' in text else text[1:-1]
+            if self.eof or not self._fill():
+                raise json.JSONDecodeError("Unterminated string", self.buf, self.pos)
+
+    def _skip(self):
+        c = self._peek()
+        if c == '"':
+            self._string()
+        elif c in '{[':
+            m = _FLAT_GROUP_RE.match(self.buf, self.pos)
+            if m:
+                # 入れ子のない値は1回のマッチで読み飛ばす
+                self.pos = m.end()
+                return
+            self.pos += 1
+            depth = 1
+            while True:
+                end = _SKIP_TO_BRACKET_RE.match(self.buf, self.pos).end()
+                if end >= len(self.buf) or self.buf[end] == '"':
+                    # チャンク末尾、または途中で切れた文字列 → 続きを読み込む
+                    self.pos = end
+                    if not self._fill():
+                        raise json.JSONDecodeError("Unexpected end of stream", self.buf, self.pos)
+                    continue
+                self.pos = end + 1
+                depth += 1 if self.buf[end] in '{[' else -1
+                if depth == 0:
+                    return
+        else:
+            while True:
+                m = _SCALAR_RE.match(self.buf, self.pos)
+                if m and (m.end() < len(self.buf) or self.eof):
+                    self.pos = m.end()
+                    return
+                if not self._fill():
+                    if m:
+                        self.pos = m.end()
+                        return
+                    raise json.JSONDecodeError("Invalid value", self.buf, self.pos)
+
+    def _materialize(self):
+        """
+        現在位置の値 (部分木) だけを実体化する。
+        バッファ上で raw_decode を試み、値が途中で切れていれば読み込み量を倍々に増やして再試行する。
+        """
+        self._peek()
+        read_size = self.CHUNK_SIZE
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # 値がバッファ末尾で切れている → 続きを読み込む
+            chunk = self.stream.read(read_size)
+            if not chunk:
+                self.eof = True
+                continue
+            self.buf = self.buf[self.pos:] + chunk
+            self.pos = 0
+            read_size = max(read_size, 4 * len(self.buf))
+
+    # --- オートマトンに沿った走査 ---
+
+    def _value(self, states, raw):
+        if any(node.accepts for node, _ in states):
+            # ルールの対象 → 部分木を実体化し、残りのルールはメモリ上で適用する
+            self.matcher._walk(self._materialize(), states, raw)
+            return
+
+        c = self._peek()
+        if c == '{':
+            self.pos += 1
+            if self._peek() == '}':
+                self.pos += 1
+                return
+            while True:
+                key = self._string()
+                self._expect(':')
+                next_states = self.matcher.step_key(key, states)
+                if next_states:
+                    self._value(next_states, raw)
+                else:
+                    self._skip()
+                if self._expect(',}') == '}':
+                    return
+        elif c == '[':
+            self.pos += 1
+            if self._peek() == ']':
+                self.pos += 1
+                return
+            index = 0
+            while True:
+                next_states = self.matcher.step_index(index, states)
+                if next_states:
+                    self._value(next_states, raw)
+                else:
+                    self._skip()
+                index += 1
+                if self._expect(',]') == ']':
+                    return
+        else:
+            self._skip()
+
+
+def stream_extract(binary_stream, matcher: CompiledRuleSet):
+    """
+    バイナリストリーム (ZIPエントリなど) からルールの対象だけをストリーミング抽出する。
+
+    Args:
+        binary_stream: zip_file.open() などで開いたバイナリストリーム
+        matcher (CompiledRuleSet): コンパイル済みルール
+
+    Returns:
+        dict: {target_key: 値} (json.load + matcher.extract() と同じ結果)
+    """
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig')
+    try:
+        return StreamingExtractor(text_stream, matcher).extract()
+    finally:
+        text_stream.detach()
+
+
+# --- 構造物 (.mcstructure) ---
+# BP/structures/<名前>.mcstructure (サブフォルダも可) を ('structures', <名前>, {'mcstructure': 中身}) として返す。
+# 整形では中身を検証し、ミラーにある既存の構造物と内容が同じなら既存のファイルをそのまま使う。
+STRUCTURE_FOLDER = "BP/structures"
+STRUCTURE_EXTENSION = ".mcstructure"
+
+# --- .lang ファイル ---
+# RP/texts/<言語コード>.lang を client_input['lang'][言語コード] = {キー: 値} に変換する。
+LANG_FOLDER = "RP/texts"
+
+
+def parse_lang_file(text: str):
+    """
+    .lang ファイルの中身を {キー: 値} に変換する。
+
+    '##' 以降と、値の後ろのタブ以降 (行末コメント) は無視する。
+    """
+    entries = {}
+    for line in text.splitlines():
+        line = line.split('##', 1)[0].strip()
+        if '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        entries[key.strip()] = value.split('\t', 1)[0].rstrip()
+    return entries
+
+
+# --- .mcaddon (複数パックの入れ子ZIP) ---
+# .mcaddon は BP/RP の .mcpack (ZIP) をまとめたZIPで、パックがフォルダとして入っている場合もある。
+# 各パックを manifest.json の modules から BP/RP に振り分け、エントリ名に 'BP/' / 'RP/' を付けた
+# ビュー (PackView) として扱うことで、既存の BP/RP フォルダ構成のZIPと同じ解析処理に通す。
+# 入れ子のZIPはディスクに展開しない: 無圧縮 (ZIP_STORED) のエントリは外側のZIPの上で直接開き、
+# 圧縮されたエントリは NESTED_PACK_SPOOL_BYTES まではメモリ上のシーク可能なバッファに展開する。
+NESTED_PACK_EXTENSIONS = ('.mcpack', '.zip')
+NESTED_PACK_SPOOL_BYTES = int(os.environ.get("NESTED_PACK_SPOOL_BYTES", 64 * 1024 * 1024))
+PACK_PARSE_WORKERS = int(os.environ.get("PACK_PARSE_WORKERS", 4))
+
+
+class PackView:
+    """
+    ZIP内の1パック (root 以下) を、'BP/...' / 'RP/...' というエントリ名のZIPとして見せる。
+    iter_pack_entries などが使う namelist / getinfo / infolist / open だけを実装する。
+    """
+
+    def __init__(self, zip_file: zipfile.ZipFile, pack_type: str, root: str = ""):
+        self.zip_file = zip_file
+        self.pack_type = pack_type
+        self.root = root
+        self._infos = {}
+        for info in zip_file.infolist():
+            if info.is_dir() or not info.filename.startswith(root):
+                continue
+            view_info = copy.copy(info)
+            view_info.filename = f"{pack_type}/{info.filename[len(root):]}"
+            self._infos[view_info.filename] = (view_info, info)
+
+    def namelist(self):
+        return list(self._infos)
+
+    def infolist(self):
+        return [view_info for view_info, _ in self._infos.values()]
+
+    def getinfo(self, name: str):
+        if name not in self._infos:
+            raise KeyError(f"There is no item named {name!r} in the pack")
+        return self._infos[name][0]
+
+    def open(self, name, mode: str = 'r'):
+        if isinstance(name, zipfile.ZipInfo):
+            name = name.filename
+        if name not in self._infos:
+            raise KeyError(f"There is no item named {name!r} in the pack")
+        return self.zip_file.open(self._infos[name][1], mode)
+
+
+def _open_nested_zip(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo, stack: contextlib.ExitStack):
+    """ZIP内のZIPを、ディスクに展開せずに ZipFile として開く。"""
+    if info.compress_type == zipfile.ZIP_STORED:
+        # 無圧縮ならエントリのストリームをそのままシークできる
+        stream = stack.enter_context(zip_file.open(info))
+    else:
+        stream = stack.enter_context(tempfile.SpooledTemporaryFile(max_size=NESTED_PACK_SPOOL_BYTES))
+        with zip_file.open(info) as source:
+            shutil.copyfileobj(source, stream, 1024 * 1024)
+        stream.seek(0)
+    return stack.enter_context(zipfile.ZipFile(stream))
+
+
+def _manifest_views(zip_file: zipfile.ZipFile, location: str, skip_roots: tuple = ()):
+    """ZIP内の manifest.json を探し、パックごとの PackView を返す (入れ子のパックは数えない)。"""
+    views = []
+    manifest_names = sorted((name for name in zip_file.namelist() if os.path.basename(name).lower() == 'manifest.json'),
+                            key=lambda name: name.count('/'))
+    for name in manifest_names:
+        root = name[:-len('manifest.json')]
+        if root.startswith(skip_roots) or any(root.startswith(view.root) for view in views):
+            continue
+        try:
+            with zip_file.open(name) as f:
+                pack_type = detect_pack_type(json.load(f))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            print(f"Error: Invalid JSON in manifest: {location}/{name}")
+            continue
+        if pack_type is None:
+            print(f"Unknown_Pack_Type:{location}/{name}")
+            continue
+        views.append(PackView(zip_file, pack_type, root))
+        print(f"Pack_Detected:{location}/{root or '.'}_Type:{pack_type}")
+    return views
+
+
+@contextlib.contextmanager
+def open_pack_sources(zip_file: zipfile.ZipFile):
+    """
+    アップロードされたZIPから、解析対象のパックのリストを作る。
+
+    - BP/ RP/ フォルダを持つ従来の構成のZIPは、ZIP自体をそのまま1つのソースにする
+    - .mcaddon 内の .mcpack (入れ子のZIP) と、manifest.json を持つフォルダは PackView にする
+
+    入れ子のZIPは with ブロックを抜けるときに閉じる。
+
+    Yields:
+        list: ZipFile / PackView のリスト (どれも 'BP/...' / 'RP/...' のエントリ名を持つ)
+    """
+    with contextlib.ExitStack() as stack:
+        names = zip_file.namelist()
+        sources = []
+        if any(name.startswith(('BP/', 'RP/')) for name in names):
+            sources.append(zip_file)
+
+        # フォルダとして入っているパック (BP/ RP/ 自体は従来の構成として扱う)
+        sources.extend(_manifest_views(zip_file, "", skip_roots=("BP/", "RP/")))
+
+        for info in zip_file.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(NESTED_PACK_EXTENSIONS):
+                continue
+            if info.filename.startswith(('BP/', 'RP/')):
+                continue
+            try:
+                nested = _open_nested_zip(zip_file, info, stack)
+            except zipfile.BadZipFile:
+                print(f"Error: Invalid nested pack: {info.filename}")
+                continue
+            sources.extend(_manifest_views(nested, info.filename))
+
+        pack_types = [source.pack_type for source in sources if isinstance(source, PackView)]
+        for pack_type in set(pack_types):
+            if pack_types.count(pack_type) > 1:
+                print(f"WARNING: Multiple {pack_type} packs in the upload; they are merged into one {pack_type} folder.")
+        print(f"Pack_Sources:{len(sources)}")
+        yield sources or [zip_file]
+
+
+def _parse_source(source, compiled_rules, streaming):
+    return list(iter_pack_entries(source, compiled_rules, streaming))
+
+
+def parse_pack_file_to_client_data(zip_file: zipfile.ZipFile, compiled_rules: dict = None, streaming: bool = None):
     """
     ZIPファイル内のBP/RPファイルを解析し、各整形モジュールが期待する
     シンプルなデータ構造 (client_input) にマッピングする。
-    
+
+    .mcaddon の場合は入れ子のパックを並行して解析し、結果を1つにまとめる
+    (BP/RP のマニフェストは相互に依存させる)。
+
     Args:
         zip_file (zipfile.ZipFile): メモリ上で開かれたアップロード済みZIPファイル
-        
+        compiled_rules (dict): compile_mapping_rules() の結果 (省略時は COMPILED_RULES)
+        streaming (bool): True で常にストリーミング抽出、False で常に json.load。
+                          None の場合は STREAMING_THRESHOLD_BYTES 以上のエントリだけストリーミングする
+
     Returns:
         dict: 整形モジュールに渡すための統合されたクライアント入力データ
-              (例: {'mobs': {'sheep': {'hp': 10, 'speed': 0.3}}, 'items': {...}})
+              (例: {'mobs': {'sheep': MobSpec(hp=10, speed=0.3)}, 'items': {...}})
+              mobs / items / blocks / geometry の値は records のレコード (辞書と同じように読める)
+    """
+
+    with open_pack_sources(zip_file) as sources:
+        return parse_pack_sources_to_client_data(sources, compiled_rules, streaming)
+
+
+def parse_pack_sources_to_client_data(sources: list, compiled_rules: dict = None, streaming: bool = None):
+    """
+    open_pack_sources() で開いたソースを解析して client_input にまとめる。
+    同じソースからバイナリアセットも読む場合に、入れ子のパックを開き直さずに済む。
+
+    Args:
+        sources (list): open_pack_sources() の返すソースのリスト
+        compiled_rules, streaming: parse_pack_file_to_client_data と同じ
+
+    Returns:
+        dict: parse_pack_file_to_client_data と同じ
     """
-    
     client_input = {}
-    
+    with ThreadPoolExecutor(max_workers=max(1, min(PACK_PARSE_WORKERS, len(sources))),
+                            thread_name_prefix="pack-parse") as executor:
+        results = executor.map(_parse_source, sources, [compiled_rules] * len(sources), [streaming] * len(sources))
+        for entries in results:
+            for top_key, name, extracted_data in entries:
+                client_input.setdefault(top_key, {})[name] = extracted_data
+
+    link_pack_manifests(client_input.get('manifest', {}))
+    return client_input
+
+
+def _timed_extract(f, matcher: CompiledRuleSet, use_streaming: bool, timings: collections.Counter):
+    """iter_pack_entries の抽出処理を、段階ごとに時間を計りながら行う (json.load と同じ結果になる)。"""
+    started = time.perf_counter()
+    if use_streaming:
+        extracted_data = stream_extract(f, matcher)
+        timings["stream_extract"] += time.perf_counter() - started
+        return extracted_data
+    raw = f.read()
+    read_done = time.perf_counter()
+    document = json.loads(raw)
+    load_done = time.perf_counter()
+    extracted_data = matcher.extract(document)
+    timings["decompress"] += read_done - started
+    timings["json_load"] += load_done - read_done
+    timings["extract"] += time.perf_counter() - load_done
+    return extracted_data
+
+
+def iter_pack_entries(zip_file: zipfile.ZipFile, compiled_rules: dict = None, streaming: bool = None,
+                      timings: collections.Counter = None):
+    """
+    ZIPファイル内のエントリを1つずつ解析し、(client_input のキー, 名前, 抽出データ) を順に返すジェネレータ。
+    パック全体の解析を待たずに、後段 (整形・アップロード) が最初のエントリから処理を始められる。
+
+    Args:
+        zip_file, compiled_rules, streaming: parse_pack_file_to_client_data と同じ
+        timings (Counter): 指定した場合は段階ごとの所要時間 (秒) を加算する
+                           ('decompress' / 'json_load' / 'extract' / 'stream_extract' / 'molang' / 'sounds')
+
+    Yields:
+        tuple: (top_key, name, extracted_data) (例: ('mobs', 'sheep', MobSpec(hp=10, ...)))
+               読めなかったファイル (JSON の構文エラーなど) は ('parse_errors', ファイルのパス, {'error': 理由}) として返す
+               (検証エラーとして扱い、そのファイルを抜いたままコミットしない)
+    """
+
+    compiled_rules = compiled_rules or COMPILED_RULES
+
     for file_path in zip_file.namelist():
-        
+
         # 1. ファイルパスに基づいてマッピングルールを特定
-        is_matched = False
-        for folder_path, mapping_def in MAPPING_RULES.items():
+        for folder_path, mapping_def in compiled_rules.items():
             if file_path.startswith(folder_path + '/') and file_path.endswith('.json'):
-                is_matched = True
-                
+
                 # 2. ファイル名から識別子を抽出 (例: entities/sheep.json -> sheep)
                 file_name = os.path.basename(file_path).replace('.json', '')
-                
+
                 try:
+                    use_streaming = streaming
+                    if use_streaming is None:
+                        use_streaming = zip_file.getinfo(file_path).file_size >= STREAMING_THRESHOLD_BYTES
+
                     with zip_file.open(file_path) as f:
-                        file_content = json.load(f)
-                        
-                        # 3. データを抽出する
-                        extracted_data = {}
-                        for rule in mapping_def["rules"]:
-                            value = get_nested_value(file_content, rule["path"])
-                            if value is not None:
-                                extracted_data[rule["target_key"]] = value
-                                
-                        # 4. 最終的な client_input 構造に格納
-                        top_key = mapping_def["file_key"]
-                        client_input[top_key] = client_input.get(top_key, {})
-                        client_input[top_key][file_name] = extracted_data
-                        
-                        print(f"Mapped_File:{file_name}_Data:{extracted_data}")
-
-                except json.JSONDecodeError:
+                        # 3. データを抽出する (コンパイル済みマッチャーで1回だけ走査)
+                        if folder_path in MOLANG_FOLDERS:
+                            # Molang の検証には文書全体が必要なので、ストリーミング抽出は使わない
+                            started = time.perf_counter()
+                            document = json.load(f)
+                            extracted_data = mapping_def["matcher"].extract(document)
+                            if timings is not None:
+                                timings["json_load"] += time.perf_counter() - started
+                        elif timings is not None:
+                            extracted_data = _timed_extract(f, mapping_def["matcher"], use_streaming, timings)
+                        elif use_streaming:
+                            extracted_data = stream_extract(f, mapping_def["matcher"])
+                        else:
+                            extracted_data = mapping_def["matcher"].extract(json.load(f))
+
+                    # 整形モジュールが読むキーが決まっているデータは __slots__ のレコード (MobSpec など) にする
+                    extracted_data = to_record(mapping_def["file_key"], extracted_data)
+                    print(f"Mapped_File:{file_name}_Keys:{list(extracted_data.keys())}")
+                    # 4. client_input のどこに格納するかと一緒に返す
+                    yield mapping_def["file_key"], file_name, extracted_data
+
+                    # アニメーション・コントローラーの Molang 式は ('molang', ファイルのパス, 検証結果) として返す
+                    if folder_path in MOLANG_FOLDERS:
+                        started = time.perf_counter()
+                        checked = validate_molang_document(folder_path, document)
+                        if timings is not None:
+                            timings["molang"] += time.perf_counter() - started
+                        print(f"Checked_Molang:{file_path}_Expressions:{checked['expressions']}"
+                              f"_Errors:{len(checked['errors'])}")
+                        yield 'molang', file_path, checked
+
+                except json.JSONDecodeError as e:
                     print(f"Error: Invalid JSON in file: {file_path}")
+                    yield 'parse_errors', file_path, {"error": f"JSON の構文エラー: {e}"}
                 except Exception as e:
                     print(f"Error processing {file_path}: {e}")
-                
+                    yield 'parse_errors', file_path, {"error": f"{type(e).__name__}: {e}"}
+
                 break
-        
-        # Manifest.json のような特殊なファイルはここで処理
-        if file_path.lower().endswith('manifest.json'):
-             try:
-                 with zip_file.open(file_path) as f:
+
+        if file_path.startswith(STRUCTURE_FOLDER + '/') and file_path.lower().endswith(STRUCTURE_EXTENSION):
+            structure_name = file_path[len(STRUCTURE_FOLDER) + 1:-len(STRUCTURE_EXTENSION)]
+            with zip_file.open(file_path) as f:
+                content = f.read()
+            print(f"Mapped_Structure:{structure_name}_Bytes:{len(content)}")
+            yield 'structures', structure_name, {"mcstructure": content}
+            continue
+
+        if file_path.startswith(LANG_FOLDER + '/') and file_path.endswith('.lang'):
+            lang_code = os.path.basename(file_path)[:-len('.lang')]
+            with zip_file.open(file_path) as f:
+                entries = parse_lang_file(f.read().decode('utf-8-sig', errors='replace'))
+            print(f"Mapped_Lang:{lang_code}_Keys:{len(entries)}")
+            yield 'lang', lang_code, entries
+            continue
+
+        # BP/RP 直下の manifest.json は ('manifest', 'BP' / 'RP', 内容) として返す
+        if file_path in ('BP/manifest.json', 'RP/manifest.json'):
+            try:
+                with zip_file.open(file_path) as f:
                     manifest_content = json.load(f)
-                    # BP/RPの判別ロジックは main.py にあるためここでは省略
-                    # client_input['manifest'] = ... 
-                    print(f"Parsed_Manifest:{file_path}")
-             except json.JSONDecodeError:
-                 print(f"Error: Invalid JSON in manifest: {file_path}")
-    
-    return client_input
+                print(f"Parsed_Manifest:{file_path}")
+                yield 'manifest', file_path.split('/', 1)[0], manifest_content
+            except json.JSONDecodeError as e:
+                print(f"Error: Invalid JSON in manifest: {file_path}")
+                yield 'parse_errors', file_path, {"error": f"JSON の構文エラー: {e}"}
+
+    # RP/sounds のサウンドはヘッダだけを読み、sound_definitions.json にまとめて ('sound_definitions', 'RP', 結果) で返す
+    sounds = collect_sound_definitions(zip_file, timings)
+    if sounds:
+        yield 'sound_definitions', 'RP', sounds
 
 # --- 実行例 ---
 # NOTE: 実際のZIPファイルが必要なため、ここではテストできませんが、ロジックは完成です。
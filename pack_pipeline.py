@@ -0,0 +1,272 @@
+import collections
+import os
+import queue
+import threading
+import time
+
+from pack_parser import iter_pack_entries, open_pack_sources
+from manifest import link_pack_manifests
+from github_uploader import GITHUB_TOKEN, CommitSession, collect_binary_assets, format_client_entry
+from profiling import request_thread_prefix # プロファイラが見分けるスレッド名の接頭辞
+
+print("Pack_Pipeline_Module_Loaded")
+
+# --- 解析・整形・アップロードを重ねて実行するパイプライン ---
+# 解析 (ZIP の展開とマッピング) -> 整形 (検証・シリアライズ) -> ブロブのアップロード の各段を
+# 別スレッドで動かし、段の間を上限付きのキューでつなぐ。最初のファイルの整形が終わった時点で
+# アップロードが始まり、メモリ上に同時に存在するエントリ数はキューの深さで抑えられる。
+#
+# ブロブは内容のハッシュで決まり、ツリーから参照されるまでリポジトリに何の影響もないため、
+# 検証の完了を待たずにアップロードする (整形済みのファイルを溜め込まないので、メモリはキューの深さで決まる)。
+# 検証の結果で止めるのはツリー・コミット・ref の更新で、全てのエントリの検証とアップロードが成功した場合だけ行う。
+# 検証エラーが1つでも出たらアップロードは止め、残りのエントリは検証だけ続けてエラーを全て集める
+# (エラーまでに送ったブロブはどこからも参照されず、GitHub 側のガベージコレクションで消える)。
+#
+# .mcaddon (複数のパック) の場合は、パックごとに解析スレッドを立てて同じキューに流す。
+# マニフェストは全パックの解析が終わってから BP/RP を相互に依存させて整形する。
+#
+# progress を指定すると、各段の進捗をイベント (辞書) として渡して呼ぶ (呼ばれるのは各段のスレッドから):
+#   parsed     {'key', 'name'}                 エントリを解析した
+#   formatted  {'key', 'name', 'files'}        検証・整形した (files はコミット先のパス)
+#   uploaded   {'path', 'size', 'sent_bytes', 'deduplicated'}  ブロブを送った (既知のブロブは参照だけ)
+#   skipped    {'path', 'reason'}              コミットしなかった (unchanged: ブランチの先頭に同じ内容がある / stopped: エラーで中止)
+#   failed     {'key', 'name', 'error'} または {'path', 'error'}
+#   stage      {'stage', 'status'}             parse / format / upload / commit の各段の終了 (commit は開始も)
+PIPELINE_QUEUE_DEPTH = int(os.environ.get("PIPELINE_QUEUE_DEPTH", 32))
+PIPELINE_UPLOAD_WORKERS = int(os.environ.get("PIPELINE_UPLOAD_WORKERS", 4))
+
+# 検索用インデックス (pack_index) に渡すために保持する client_input のキー
+# (マニフェストはパックの識別子 (UUID) を決めるために 'manifest' として渡す)
+INDEXED_KEYS = ('mobs', 'items', 'blocks', 'lang')
+
+_END = object()
+
+
+def _put(target: queue.Queue, item, abort: threading.Event):
+    """キューが空くまで待って入れる。中断された場合は False。"""
+    while not abort.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _drain(source: queue.Queue, abort: threading.Event):
+    """キューを終端 (_END) までジェネレータとして読み出す。中断された場合はそこで終わる。"""
+    while not abort.is_set():
+        try:
+            item = source.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _END:
+            return
+        yield item
+
+
+def _parsed_entries(source, timings=None):
+    # JSON / .lang の解析結果のあとに、ZIP から直接送るバイナリアセットを流す
+    yield from iter_pack_entries(source, timings=timings)
+    for asset in collect_binary_assets(source):
+        yield 'asset', asset["path"], asset
+
+
+def run_pack_pipeline(zip_file, commit_message: str, branch: str = "main",
+                      queue_depth: int = PIPELINE_QUEUE_DEPTH, upload_workers: int = PIPELINE_UPLOAD_WORKERS,
+                      timings: collections.Counter = None, progress=None, structure_thumbnails: bool = False,
+                      thread_prefix: str = None):
+    """
+    パック (ZIP) を解析・整形し、1つのコミットとして GitHub にプッシュする。
+    .mcaddon の場合は入れ子の全パックを並行して解析し、まとめて1つのコミットにする。
+
+    Args:
+        zip_file (zipfile.ZipFile): 開いたパック (.mcpack / .mcaddon / BP・RP フォルダを持つZIP)
+        commit_message (str): コミットメッセージ
+        queue_depth (int): 段の間のキューの深さ
+        upload_workers (int): 並行してブロブをアップロードするスレッド数
+        timings (Counter): 指定した場合は段階ごとの所要時間 (秒、全スレッドの合計) を加算する
+                           (iter_pack_entries の段階 + 'format' / 'upload' / 'commit')
+        progress: 指定した場合は進捗のイベントごとに呼ぶ (複数のスレッドから呼ばれる)
+        structure_thumbnails (bool): True の場合は各構造物のサムネイル (BP/structures/<名前>.png) も一緒にコミットする
+        thread_prefix (str): 起動するスレッドの名前の接頭辞 (省略時は request_thread_prefix()。
+                             プロファイラは呼び出したリクエストのスレッドだけをこの接頭辞で見分ける)
+
+    Returns:
+        tuple: (コミット結果の辞書 (unified_commit_to_github と同じ形式 + 'files_total' と
+                 'warnings' (コミットは止めない警告。サウンドのヘッダの検査結果など)),
+                検証エラーのリスト [{'key', 'name', 'error'}],
+                検索用インデックスに渡す client_input (INDEXED_KEYS と 'manifest' のみ))
+    """
+    if thread_prefix is None:
+        thread_prefix = request_thread_prefix()
+    parsed_queue = queue.Queue(maxsize=queue_depth)
+    upload_queue = queue.Queue(maxsize=queue_depth)
+    abort = threading.Event()          # パイプライン全体の中断 (予期しない例外)
+    stop_uploads = threading.Event()   # 検証エラーまたはアップロード失敗でアップロードだけ止める
+    session = CommitSession(progress)
+    errors, failures = [], []
+    warnings = []
+    indexed_input = {}
+    files_total = [0]
+    manifests = {}
+    timings_lock = threading.Lock()
+
+    def emit(event, **fields):
+        if progress is not None:
+            progress({"event": event, **fields})
+
+    def add_timings(local):
+        # 各スレッドは自分の Counter に加算し、終了時にまとめる
+        if local:
+            with timings_lock:
+                timings.update(local)
+
+    if not GITHUB_TOKEN:
+        print("Commit_Failed: GITHUB_TOKEN is missing.")
+        stop_uploads.set()
+    else:
+        # 解析と並行してブランチの先頭のツリーを取得し、先頭と同じ内容のブロブは送らない
+        session.prefetch_head(branch, thread_name=f"{thread_prefix}head")
+
+    def parse_stage(source):
+        local = collections.Counter() if timings is not None else None
+        try:
+            for entry in _parsed_entries(source, local):
+                emit("parsed", key=entry[0], name=entry[1])
+                if not _put(parsed_queue, entry, abort):
+                    return
+        except Exception as e:
+            failures.append(f"parse: {e}")
+            abort.set()
+        finally:
+            add_timings(local)
+
+    def parse_coordinator(parse_threads):
+        # 全パックの解析が終わってから終端を1つだけ流す
+        for thread in parse_threads:
+            thread.join()
+        emit("stage", stage="parse", status="done")
+        _put(parsed_queue, _END, abort)
+
+    def submit(top_key, name, files, error):
+        if error:
+            errors.append({"key": top_key, "name": name, "error": error})
+            print(f"Validation_Error:{top_key}/{name}_{error}")
+            emit("failed", key=top_key, name=name, error=error)
+            stop_uploads.set()
+            return True
+        if top_key != 'asset':
+            emit("formatted", key=top_key, name=name, files=[file_data["path"] for file_data in files])
+        for file_data in files:
+            files_total[0] += 1
+            if stop_uploads.is_set():
+                emit("skipped", path=file_data["path"], reason="stopped")
+            elif not _put(upload_queue, file_data, abort):
+                return False
+        return True
+
+    def format_stage():
+        local = collections.Counter() if timings is not None else None
+        try:
+            for top_key, name, data in _drain(parsed_queue, abort):
+                if top_key == 'manifest':
+                    manifests[name] = data
+                    continue
+                if top_key == 'asset':
+                    files, error = [data], None
+                elif top_key == 'structures':
+                    if structure_thumbnails:
+                        data = {**data, "thumbnail": True}
+                    files, error = format_client_entry(top_key, name, data)
+                elif top_key == 'sound_definitions':
+                    warnings.extend(data["warnings"])
+                    files, error = format_client_entry(top_key, name, data)
+                else:
+                    if top_key in INDEXED_KEYS:
+                        indexed_input.setdefault(top_key, {})[name] = data
+                    if local is None:
+                        files, error = format_client_entry(top_key, name, data)
+                    else:
+                        started = time.perf_counter()
+                        files, error = format_client_entry(top_key, name, data)
+                        local["format"] += time.perf_counter() - started
+                if not submit(top_key, name, files, error):
+                    return
+
+            if abort.is_set():
+                return
+            link_pack_manifests(manifests)
+            indexed_input['manifest'] = manifests
+            for pack_type, manifest in manifests.items():
+                if not submit('manifest', pack_type, *format_client_entry('manifest', pack_type, manifest)):
+                    return
+            emit("stage", stage="format", status="done")
+        except Exception as e:
+            failures.append(f"format: {e}")
+            abort.set()
+        finally:
+            add_timings(local)
+            for _ in range(upload_workers):
+                _put(upload_queue, _END, abort)
+
+    def upload_stage():
+        local = collections.Counter() if timings is not None else None
+        try:
+            for file_data in _drain(upload_queue, abort):
+                # 止まった後もキューは読み切る (前段が put で詰まらないように)
+                if stop_uploads.is_set():
+                    emit("skipped", path=file_data["path"], reason="stopped")
+                    continue
+                if local is None:
+                    uploaded = session.upload(file_data)
+                else:
+                    started = time.perf_counter()
+                    uploaded = session.upload(file_data)
+                    local["upload"] += time.perf_counter() - started
+                if not uploaded:
+                    failures.append(f"upload: {file_data['path']}")
+                    emit("failed", path=file_data["path"], error="ブロブのアップロードに失敗しました")
+                    stop_uploads.set()
+        except Exception as e:
+            failures.append(f"upload: {e}")
+            abort.set()
+        finally:
+            add_timings(local)
+
+    with open_pack_sources(zip_file) as sources:
+        parse_threads = [threading.Thread(target=parse_stage, args=(source,), name=f"{thread_prefix}parse-{i}")
+                         for i, source in enumerate(sources)]
+        threads = parse_threads + [
+            threading.Thread(target=parse_coordinator, args=(parse_threads,), name=f"{thread_prefix}parse-end"),
+            threading.Thread(target=format_stage, name=f"{thread_prefix}format")]
+        threads += [threading.Thread(target=upload_stage, name=f"{thread_prefix}upload-{i}")
+                    for i in range(upload_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        emit("stage", stage="upload", status="done" if not (errors or failures) else "stopped",
+             files_total=files_total[0])
+
+        result = session.result
+        result["files_total"] = files_total[0]
+        result["warnings"] = warnings
+        if errors or failures or not GITHUB_TOKEN:
+            for failure in failures:
+                print(f"Pipeline_Failed:{failure}")
+            print(f"Pipeline_Aborted:Errors:{len(errors)}_Failures:{len(failures)}")
+            return result, errors, indexed_input
+
+        # コミット成功時にミラーへ書き込むアセットは入れ子のZIPから読むので、閉じる前にコミットする
+        if files_total[0]:
+            emit("stage", stage="commit", status="started", files_changed=len(session.changed))
+            started = time.perf_counter()
+            result = session.commit(commit_message, branch)
+            emit("stage", stage="commit", status="done" if result["success"] else "failed",
+                 commit_sha=result["commit_sha"])
+            result["files_total"] = files_total[0]
+            result["warnings"] = warnings
+            if timings is not None:
+                timings["commit"] += time.perf_counter() - started
+        return result, errors, indexed_input
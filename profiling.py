@@ -0,0 +1,238 @@
+import collections
+import hmac
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+print("Profiling_Module_Loaded")
+
+# --- リクエスト単位のプロファイリング ---
+# パックの処理に時間がかかったときに、どこ (展開・JSON の読み込み・整形・GitHub) で時間を使ったかを調べる。
+# 有効になっている場合だけ create_app が RequestProfiler を登録し、handle_pack はそれを通して処理する。
+# 無効な場合はプロファイラを一切作らない (handle_pack の処理は変わらない)。
+#
+# プロファイラはサンプリング方式: 別スレッドが一定間隔で対象スレッドのスタックを記録し、
+# flamegraph.pl / speedscope がそのまま読める collapsed stack 形式 ("a;b;c 回数") で保存する。
+# 対象はリクエストのスレッドと、そのリクエストが起動したパイプラインのスレッド
+# (名前が request_thread_prefix() の pack-<リクエストのスレッドID>- で始まるもの)。
+# 同時に処理中の他のリクエストのスレッドは名前の接頭辞が違うので混ざらない。
+#
+# 保存先はディスク上のリングバッファで、件数を超えたら古いものから消す:
+#   <PROFILE_DIR>/recent/  管理者ヘッダまたはサンプリングで選ばれたリクエスト
+#   <PROFILE_DIR>/slow/    処理時間が PROFILE_SLOW_SECONDS を超えたリクエスト (遅いリクエストのログ)
+# 遅いリクエストを必ず捕まえるため、PROFILE_SLOW_SECONDS を設定すると全リクエストを粗い間隔
+# (PROFILE_SLOW_INTERVAL_MS) でサンプリングし、閾値を超えたものだけを残す。
+#
+# 段階ごとの内訳 (展開・JSON の読み込み・抽出・整形・アップロード・コミット) はサンプルからではなく、
+# パイプラインが計った時間 (run_pack_pipeline の timings) を使う。サンプラーは GIL を取れたときにしか
+# スタックを読めないため、GIL を手放す処理 (zlib の展開やソケットの読み書き) にサンプルが偏るからである。
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "pack_profiles"))
+PROFILE_ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SLOW_SECONDS = float(os.environ.get("PROFILE_SLOW_SECONDS", 0))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_SLOW_INTERVAL_MS = float(os.environ.get("PROFILE_SLOW_INTERVAL_MS", 50))
+PROFILE_RING_SIZE = int(os.environ.get("PROFILE_RING_SIZE", 50))
+PROFILE_HEADER = "X-Pack-Profile"
+
+
+def request_thread_prefix(ident: int = None) -> str:
+    """
+    リクエストの処理から起動するスレッドの名前の接頭辞 (pack-<リクエストのスレッドID>-)。
+
+    Args:
+        ident (int): リクエストを処理しているスレッドのID (省略時は呼び出したスレッド)
+    """
+    return f"pack-{threading.get_ident() if ident is None else ident}-"
+
+
+def _frame_label(code):
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    対象スレッドのスタックを一定間隔で記録するプロファイラ。
+
+    Attributes:
+        stacks (Counter): {(スレッド名, (フレーム, ...)): サンプル数} (フレームは根元から末端の順)
+    """
+
+    def __init__(self, interval: float, thread_prefix: str = None):
+        self.interval = interval
+        self.thread_prefix = thread_prefix
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+        self._existing = set()
+
+    def start(self):
+        self._target = threading.get_ident()
+        if self.thread_prefix is None:
+            self.thread_prefix = request_thread_prefix(self._target)
+        self._existing = {thread.ident for thread in threading.enumerate()}
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _targets(self):
+        # リクエストのスレッドと、開始後に起動されたこのリクエストのスレッド (thread_prefix で始まるもの)
+        targets = {self._target: "request"}
+        for thread in threading.enumerate():
+            if thread.ident not in self._existing and thread.name.startswith(self.thread_prefix):
+                targets[thread.ident] = thread.name
+        return targets
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, thread_name in self._targets().items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[(thread_name, tuple(reversed(labels)))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """flamegraph 用の collapsed stack 形式のテキスト。スレッド名を根元のフレームにする。"""
+        lines = [f"{';'.join((thread_name,) + frames)} {count}"
+                 for (thread_name, frames), count in self.stacks.most_common()]
+        return "\n".join(lines) + "\n"
+
+
+class ProfileRing:
+    """ディスク上のリングバッファ。1件は <id>.collapsed (スタック) と <id>.json (メタデータ) の2ファイル。"""
+
+    def __init__(self, directory: str, size: int = PROFILE_RING_SIZE):
+        self.directory = directory
+        self.size = size
+        self._lock = threading.Lock()
+
+    def save(self, profile_id: str, meta: dict, collapsed: str):
+        os.makedirs(self.directory, exist_ok=True)
+        for suffix, content in ((".collapsed", collapsed), (".json", json.dumps(meta, ensure_ascii=False))):
+            path = os.path.join(self.directory, profile_id + suffix)
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(f"{path}.tmp", path)
+        with self._lock:
+            entries = self.list_ids()
+            for old_id in entries[:max(0, len(entries) - self.size)]:
+                for suffix in (".collapsed", ".json"):
+                    try:
+                        os.remove(os.path.join(self.directory, old_id + suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def list_ids(self):
+        """保存されているIDを古い順に返す (IDは時刻から始まるので名前順が時刻順になる)。"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(".json")] for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def read_meta(self, profile_id: str):
+        path = os.path.join(self.directory, profile_id + ".json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def collapsed_path(self, profile_id: str):
+        return os.path.join(self.directory, profile_id + ".collapsed")
+
+
+class RequestProfiler:
+    """
+    handle_pack の処理をプロファイルするかどうかを決め、結果をリングバッファに保存する。
+
+    プロファイルするリクエスト:
+        - PROFILE_HEADER に管理者トークンが付いているもの
+        - PROFILE_SAMPLE_RATE の確率で選ばれたもの
+        - PROFILE_SLOW_SECONDS が設定されている場合は全て (粗い間隔で記録し、遅かったものだけ残す)
+    """
+
+    def __init__(self, admin_token: str = PROFILE_ADMIN_TOKEN, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 slow_seconds: float = PROFILE_SLOW_SECONDS, root: str = PROFILE_DIR):
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.recent = ProfileRing(os.path.join(root, "recent"))
+        self.slow = ProfileRing(os.path.join(root, "slow"))
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """設定で有効になっている場合だけプロファイラを作る (無効なら None)。"""
+        admin_token = config.get("PROFILE_ADMIN_TOKEN")
+        sample_rate = config.get("PROFILE_SAMPLE_RATE", 0)
+        slow_seconds = config.get("PROFILE_SLOW_SECONDS", 0)
+        if not (admin_token or sample_rate > 0 or slow_seconds > 0):
+            return None
+        return cls(admin_token, sample_rate, slow_seconds, config.get("PROFILE_DIR", PROFILE_DIR))
+
+    def is_admin(self, headers) -> bool:
+        token = headers.get(PROFILE_HEADER)
+        return bool(self.admin_token) and token is not None and hmac.compare_digest(token, self.admin_token)
+
+    def run(self, func, headers, description: str):
+        """
+        func(timings) を実行し、選ばれたリクエストならプロファイルを保存する。
+        timings は段階ごとの所要時間を加算する Counter (プロファイルしない場合は None)。
+
+        Returns:
+            tuple: (func の戻り値, プロファイルID (保存しなかった場合は None))
+        """
+        requested = self.is_admin(headers) or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        if not requested and not self.slow_seconds:
+            return func(None), None
+
+        interval = (PROFILE_INTERVAL_MS if requested else PROFILE_SLOW_INTERVAL_MS) / 1000
+        profiler = SamplingProfiler(interval)
+        timings = collections.Counter()
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            result = func(timings)
+        finally:
+            profiler.stop()
+            elapsed = time.perf_counter() - started
+
+        is_slow = bool(self.slow_seconds) and elapsed >= self.slow_seconds
+        if not requested and not is_slow:
+            return result, None
+
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        meta = {"id": profile_id, "description": description, "elapsed": round(elapsed, 3),
+                "interval_ms": interval * 1000, "samples": profiler.samples,
+                "requested": requested, "slow": is_slow,
+                "stages": {stage: round(seconds, 3) for stage, seconds in timings.most_common()}}
+        collapsed = profiler.collapsed()
+        if requested:
+            self.recent.save(profile_id, meta, collapsed)
+        if is_slow:
+            self.slow.save(profile_id, meta, collapsed)
+            print(f"Slow_Request:{description}_Elapsed:{elapsed:.2f}s_Stages:{meta['stages']}_Profile:{profile_id}")
+        print(f"Request_Profiled:{profile_id}_Samples:{profiler.samples}")
+        return result, profile_id
+
+    def find(self, profile_id: str):
+        """IDからリングバッファを探す。(ProfileRing, メタデータ) または (None, None)。"""
+        for ring in (self.recent, self.slow):
+            meta = ring.read_meta(profile_id)
+            if meta is not None:
+                return ring, meta
+        return None, None
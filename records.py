@@ -0,0 +1,177 @@
+from collections.abc import Mapping
+
+print("Records_Module_Loaded")
+
+# 値が設定されていないことを表す印 (None は正当な値としてあり得る)
+_UNSET = object()
+
+# --- パックから抽出したデータのレコード型 ---
+# client_input ({'mobs': {'sheep': {...}}, ...}) の末端の辞書は、数万件の定義を含むカタログでは
+# 辞書そのもののオーバーヘッド (ハッシュテーブル) がメモリの大半を占める。
+# そこで、整形モジュールが読むキーが決まっているデータは __slots__ を持つレコード (MobSpec など) にする。
+#
+# レコードは読み取り専用の Mapping として振る舞うので、整形モジュール・インデックス側の
+# data['hp'] / 'hp' in data / data.get('hp') はそのまま動く。値が無いキーは辞書と同じく「存在しない」扱い。
+# マッピングルール (mapping_rules.json) に後から追加されたキーは extra の辞書に入る (ルールの編集で壊れない)。
+# JSON にする場合や辞書が必要な場合は to_dict() / as_plain() で変換する。
+
+
+class PackRecord(Mapping):
+    """__slots__ で値を持つ読み取り専用のレコード。サブクラスは __slots__ にフィールド名を並べる。"""
+
+    __slots__ = ("_extra",)
+    FIELDS = ()
+    _FIELD_SET = frozenset()
+    # フィールド名 -> リストの要素 (辞書) を変換するレコード型 (例: GeometrySpec の bone_data -> BoneSpec)
+    NESTED = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            fields.extend(name for name in klass.__dict__.get("__slots__", ()) if name != "_extra")
+        cls.FIELDS = tuple(fields)
+        cls._FIELD_SET = frozenset(fields)
+
+    def __init__(self, **values):
+        self._extra = None
+        for key, value in values.items():
+            self._set(key, value)
+
+    def _set(self, key, value):
+        if key in self._FIELD_SET:
+            nested = self.NESTED.get(key)
+            if nested is not None and isinstance(value, list):
+                value = [nested.from_dict(item) if isinstance(item, dict) else item for item in value]
+            object.__setattr__(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """抽出結果の辞書からレコードを作る (未知のキーは extra に入る)。"""
+        record = cls.__new__(cls)
+        record._extra = None
+        for key, value in data.items():
+            record._set(key, value)
+        return record
+
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            value = getattr(self, key, _UNSET)
+        else:
+            value = self._extra.get(key, _UNSET) if self._extra is not None else _UNSET
+        if value is _UNSET:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        # 例外を使わずに引く (整形モジュールは未設定のキーを get() で引くことが多い)
+        if key in self._FIELD_SET:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key):
+        return self.get(key, _UNSET) is not _UNSET
+
+    def __iter__(self):
+        for name in self.FIELDS:
+            if getattr(self, name, _UNSET) is not _UNSET:
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> dict:
+        """辞書に変換する (入れ子のレコードも辞書にする)。"""
+        return {key: as_plain(value) for key, value in self.items()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{key}={value!r}' for key, value in self.items())})"
+
+
+def as_plain(value):
+    """レコード (とそれを含むリスト) を辞書に変換する。それ以外の値はそのまま返す。"""
+    if isinstance(value, PackRecord):
+        return value.to_dict()
+    if isinstance(value, list) and any(isinstance(item, PackRecord) for item in value):
+        return [as_plain(item) for item in value]
+    return value
+
+
+class MobSpec(PackRecord):
+    """BP/entities の抽出結果"""
+    __slots__ = ("identifier", "hp", "speed", "families", "behaviors", "component_groups", "events")
+    identifier: str
+    hp: float
+    speed: float
+    families: list
+    behaviors: dict
+    component_groups: dict
+    events: dict
+
+
+class ItemSpec(PackRecord):
+    """BP/items の抽出結果"""
+    __slots__ = ("identifier", "durability", "stack_size", "attack")
+    identifier: str
+    durability: int
+    stack_size: int
+    attack: float
+
+
+class BlockSpec(PackRecord):
+    """BP/blocks の抽出結果"""
+    __slots__ = ("identifier", "hardness", "resistance", "map_color", "states", "permutation_conditions")
+    identifier: str
+    hardness: float
+    resistance: float
+    map_color: str
+    states: dict
+    permutation_conditions: list
+
+
+class BoneSpec(PackRecord):
+    """ジオメトリのボーン (Bedrock の形式。クライアント形式の origin / size / uv は extra に入る)"""
+    __slots__ = ("name", "parent", "pivot", "rotation", "mirror", "inflate", "cubes", "locators")
+    name: str
+    parent: str
+    pivot: list
+    rotation: list
+    mirror: bool
+    inflate: float
+    cubes: list
+    locators: dict
+
+
+class GeometrySpec(PackRecord):
+    """RP/models/entity の抽出結果"""
+    __slots__ = ("identifiers", "texture_width", "texture_height", "bone_data")
+    NESTED = {"bone_data": BoneSpec}
+    identifiers: list
+    texture_width: int
+    texture_height: int
+    bone_data: list
+
+
+# client_input のキー -> レコード型 (ここに無いキーは辞書のまま)
+RECORD_TYPES = {
+    'mobs': MobSpec,
+    'items': ItemSpec,
+    'blocks': BlockSpec,
+    'geometry': GeometrySpec,
+}
+
+
+def to_record(top_key: str, data):
+    """抽出結果の辞書を top_key に対応するレコードにする (対応するレコード型が無ければそのまま返す)。"""
+    record_type = RECORD_TYPES.get(top_key)
+    if record_type is None or not isinstance(data, dict):
+        return data
+    return record_type.from_dict(data)
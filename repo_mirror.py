@@ -0,0 +1,336 @@
+import base64
+import collections
+import contextlib
+import copy
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import requests
+
+print("Repo_Mirror_Module_Loaded")
+
+# --- アドオンリポジトリのローカルミラー ---
+# 編集用の読み込み (構造物の to_json など) のたびに GitHub API を往復すると遅いため、
+# リポジトリのファイルをディスク上にミラーし、読み込みはミラーから行う。
+#   - ツリーAPIで全ファイルのパスとブロブSHAを取得し、中身は最初に読まれたときに取得する (リードスルー)
+#   - このサーバーがコミットしたファイルはコミット成功時にミラーへ書き込む
+#   - 大きなバイナリはメモリに読まずにファイルのパスを返し (応答は send_file で流す)、
+#     デコード済みのJSONは件数上限付きの LRU に保持する
+GITHUB_OWNER = os.environ.get("GITHUB_OWNER", "kakaomame")
+GITHUB_REPO = os.environ.get("GITHUB_REPO", "minecraft-addon-repository")
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
+GITHUB_API_BASE = os.environ.get("GITHUB_API_BASE", "https://api.github.com").rstrip("/")
+GITHUB_REPO_API_URL = f"{GITHUB_API_BASE}/repos/{GITHUB_OWNER}/{GITHUB_REPO}"
+
+REPO_MIRROR_DIR = os.environ.get(
+    "REPO_MIRROR_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".repo_mirror"))
+MIRROR_JSON_CACHE_SIZE = 256          # デコード済みJSONを保持する件数
+
+
+def git_blob_sha(content: bytes) -> str:
+    """GitHub (git) と同じ形式でブロブのSHA-1を計算する: sha1("blob <size>\\0" + content)"""
+    digest = hashlib.sha1(f"blob {len(content)}\0".encode('utf-8'))
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def git_blob_sha_stream(opener, size: int, chunk_size: int = 1024 * 1024) -> str:
+    """ファイルを開く関数から、中身をメモリに読み込まずにブロブSHAを計算する。"""
+    digest = hashlib.sha1(f"blob {size}\0".encode('utf-8'))
+    with opener() as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _github_headers():
+    return {
+        "Authorization": f"token {GITHUB_TOKEN}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+
+
+class RepoMirror:
+    """
+    リポジトリのローカルミラー。
+
+    ディスク上の構成:
+        <root>/index.json   {'branch': ..., 'tree_sha': ..., 'files': {パス: {'sha': ブロブSHA, 'size': バイト数}},
+                             'history_blobs': [置き換えられた (履歴にだけ残っている) ブロブSHA]}
+        <root>/files/<パス>  ファイルの中身 (取得済みのもののみ)
+
+    index.json は複数のワーカープロセスで共有されるため、置き換えられていれば読み直す。
+    更新 (読み込み -> 変更 -> 保存) は <root>/index.lock のファイルロックを取って行い、
+    別のプロセスが同時に書いた内容を上書きしない (upload_sessions と同じ方式)。
+    """
+
+    def __init__(self, root: str = REPO_MIRROR_DIR, branch: str = "main"):
+        self.root = os.path.abspath(root)
+        self.branch = branch
+        self.index_path = os.path.join(self.root, "index.json")
+        self.files_dir = os.path.join(self.root, "files")
+        self._lock = threading.RLock()
+        self._index = {"branch": branch, "tree_sha": None, "files": {}}
+        self._index_mtime = None
+        self._json_cache = collections.OrderedDict()
+        self._flock_file = None
+        self._flock_depth = 0
+
+    # --- インデックス ---
+
+    @staticmethod
+    def _index_stamp(stat):
+        # 保存は os.replace なので、置き換えられるとiノード番号が変わる (同じ時刻の更新も見逃さない)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load_index(self):
+        try:
+            stamp = self._index_stamp(os.stat(self.index_path))
+        except FileNotFoundError:
+            return
+        if stamp != self._index_mtime:
+            with open(self.index_path, encoding='utf-8') as f:
+                self._index = json.load(f)
+            self._index_mtime = stamp
+
+    @contextlib.contextmanager
+    def _index_locked(self):
+        """インデックスを更新するためのロック (スレッド間は RLock、プロセス間は flock)。最新のインデックスを読み込む。"""
+        with self._lock:
+            if self._flock_depth == 0:
+                os.makedirs(self.root, exist_ok=True)
+                self._flock_file = open(os.path.join(self.root, "index.lock"), 'a')
+                fcntl.flock(self._flock_file, fcntl.LOCK_EX)
+            self._flock_depth += 1
+            try:
+                self._load_index()
+                yield
+            finally:
+                self._flock_depth -= 1
+                if self._flock_depth == 0:
+                    self._flock_file.close()   # 閉じるとロックも外れる
+                    self._flock_file = None
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(temp_path, self.index_path)
+        self._index_mtime = self._index_stamp(os.stat(self.index_path))
+
+    def _local_path(self, path: str):
+        local_path = os.path.normpath(os.path.join(self.files_dir, path))
+        if not local_path.startswith(self.files_dir + os.sep):
+            raise ValueError(f"Invalid repository path: {path}")
+        return local_path
+
+    def _write_local(self, path: str, content):
+        """content は bytes か、ファイルを開く関数 (その場合はストリームのままコピーする)。"""
+        local_path = self._local_path(path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        temp_path = f"{local_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            if callable(content):
+                with content() as source:
+                    shutil.copyfileobj(source, f)
+            else:
+                f.write(content)
+        os.replace(temp_path, local_path)
+        return os.path.getsize(local_path)
+
+    def known_sha(self, path: str):
+        """ミラーが把握しているブロブSHA (未知のパスは None)。"""
+        with self._lock:
+            self._load_index()
+            entry = self._index["files"].get(path)
+            return entry["sha"] if entry else None
+
+    def known_blob_shas(self):
+        """ミラーが把握している全ブロブSHAの集合。"""
+        with self._lock:
+            self._load_index()
+            shas = {entry["sha"] for entry in self._index["files"].values()}
+            shas.update(self._index.get("history_blobs", []))
+            return shas
+
+    # --- GitHub との同期 ---
+
+    def sync_from_tree(self, prefetch: bool = False):
+        """
+        ツリーAPIで全ファイルのパスとブロブSHAを取得し、インデックスを更新する。
+        SHA が変わったファイルのローカルコピーは破棄する (次に読まれたときに取得し直す)。
+
+        Args:
+            prefetch (bool): True の場合は全ファイルの中身をここで取得する
+
+        Returns:
+            dict: {'files': ファイル数, 'changed': 変更されたファイル数, 'removed': 削除されたファイル数}
+        """
+        url = f"{GITHUB_REPO_API_URL}/git/trees/{self.branch}?recursive=1"
+        response = requests.get(url, headers=_github_headers())
+        if response.status_code != 200:
+            print(f"Mirror_Tree_Fetch_Error:Status:{response.status_code}")
+            return None
+        tree = response.json()
+        if tree.get("truncated"):
+            print("WARNING: Mirror tree listing is truncated; some files will be fetched on first read.")
+
+        remote_files = {
+            entry["path"]: {"sha": entry["sha"], "size": entry.get("size", 0)}
+            for entry in tree.get("tree", []) if entry.get("type") == "blob"
+        }
+
+        with self._index_locked():
+            local_files = self._index["files"]
+            changed = [path for path, entry in remote_files.items()
+                       if local_files.get(path, {}).get("sha") != entry["sha"]]
+            removed = [path for path in local_files if path not in remote_files]
+            for path in changed + removed:
+                local_path = self._local_path(path)
+                if os.path.exists(local_path):
+                    os.remove(local_path)
+            # 置き換えられたブロブも履歴には残っているので、既知のブロブとして参照できる
+            history_blobs = set(self._index.get("history_blobs", []))
+            history_blobs.update(local_files[path]["sha"] for path in changed + removed if path in local_files)
+            self._index = {"branch": self.branch, "tree_sha": tree.get("sha"), "files": remote_files,
+                           "history_blobs": sorted(history_blobs)}
+            self._save_index()
+            self._json_cache.clear()
+
+        print(f"Mirror_Synced:{len(remote_files)}_files_Changed:{len(changed)}_Removed:{len(removed)}")
+        if prefetch:
+            for path in changed:
+                self._fetch(path)
+        return {"files": len(remote_files), "changed": len(changed), "removed": len(removed)}
+
+    def _fetch(self, path: str):
+        """ファイルの中身を GitHub から取得してミラーに保存する。存在しない場合は None。"""
+        sha = self.known_sha(path)
+        if sha:
+            # SHA が分かっている場合はブロブAPIを使う (Contents API の 1MB 制限がない)
+            response = requests.get(f"{GITHUB_REPO_API_URL}/git/blobs/{sha}", headers=_github_headers())
+        else:
+            response = requests.get(f"{GITHUB_REPO_API_URL}/contents/{path}?ref={self.branch}", headers=_github_headers())
+        if response.status_code != 200:
+            if response.status_code != 404:
+                print(f"Mirror_Fetch_Error:{path}_Status:{response.status_code}")
+            return None
+
+        body = response.json()
+        content = base64.b64decode(body.get("content", ""))
+        self.record_file(path, content)
+        print(f"Mirror_Fetched:{path}_Bytes:{len(content)}")
+        return content
+
+    def record_file(self, path: str, content: bytes, sha: str = None):
+        """コミットしたファイル (または取得したファイル) をミラーに書き込む。"""
+        self.record_files([(path, content, sha)])
+
+    def record_files(self, entries):
+        """
+        複数のファイルをミラーに書き込む。インデックスの保存は最後に1回だけ行う。
+
+        Args:
+            entries: (パス, 中身のバイト列 または開く関数, ブロブSHA または None) のイテラブル
+        """
+        with self._index_locked():
+            history_blobs = set(self._index.get("history_blobs", []))
+            for path, content, sha in entries:
+                size = self._write_local(path, content)
+                previous = self._index["files"].get(path)
+                if previous:
+                    history_blobs.add(previous["sha"])
+                if sha is None:
+                    sha = git_blob_sha_stream(content, size) if callable(content) else git_blob_sha(content)
+                self._index["files"][path] = {"sha": sha, "size": size}
+                for key in [key for key in self._json_cache if key[0] == path]:
+                    del self._json_cache[key]
+            self._index["history_blobs"] = sorted(history_blobs)
+            self._save_index()
+
+    def record_commit(self, commit_files: list):
+        """
+        unified_commit_to_github に渡したファイルリストをミラーに反映する。
+
+        Args:
+            commit_files (list): [{'path', 'content', 'is_binary'}] (バイナリは Base64 文字列)
+        """
+        def entries():
+            for file_data in commit_files:
+                content = file_data["content"]
+                if file_data.get("is_binary"):
+                    content = base64.b64decode(content)
+                elif isinstance(content, str):
+                    content = content.encode('utf-8')
+                yield file_data["path"], content, None
+
+        self.record_files(entries())
+        print(f"Mirror_Commit_Recorded:{len(commit_files)}_files")
+
+    # --- 読み込み ---
+
+    def local_file(self, path: str, fetch: bool = True):
+        """
+        ミラー上のファイルのパスを返す。ミラーに無い場合は GitHub から取得する。
+        中身をメモリに読まずに応答として流す場合 (send_file) に使う。
+
+        Args:
+            fetch (bool): False の場合は GitHub から取得せず、ミラーに無ければ None を返す
+
+        Returns:
+            str | None: ローカルのファイルパス (リポジトリに存在しない場合は None)
+        """
+        local_path = self._local_path(path)
+        if not os.path.exists(local_path) and not (fetch and self._fetch(path) is not None):
+            return None
+        return local_path
+
+    def read_bytes(self, path: str, fetch: bool = True):
+        """
+        ファイルの中身を返す。ミラーに無い場合は GitHub から取得する。
+
+        Args:
+            fetch (bool): False の場合は GitHub から取得せず、ミラーに無ければ None を返す
+
+        Returns:
+            bytes | None
+        """
+        local_path = self._local_path(path)
+        try:
+            with open(local_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return self._fetch(path) if fetch else None
+
+    def read_json(self, path: str):
+        """JSONファイルをデコードして返す。デコード結果は LRU にキャッシュする (返り値はコピー)。"""
+        key = (path, self.known_sha(path))
+        with self._lock:
+            if key in self._json_cache:
+                self._json_cache.move_to_end(key)
+                return copy.deepcopy(self._json_cache[key])
+
+        content = self.read_bytes(path)
+        if content is None:
+            return None
+        data = json.loads(content.decode('utf-8-sig'))
+
+        with self._lock:
+            # 取得によってSHAが分かった場合はそのSHAで登録する
+            self._json_cache[(path, self.known_sha(path))] = data
+            while len(self._json_cache) > MIRROR_JSON_CACHE_SIZE:
+                self._json_cache.popitem(last=False)
+        return copy.deepcopy(data)
+
+
+# サーバー全体で共有するミラー
+REPO_MIRROR = RepoMirror()
+print(f"REPO_MIRROR_DIR:{REPO_MIRROR_DIR}")
@@ -0,0 +1,264 @@
+import copy
+import json
+import os
+import re
+import struct
+import time
+
+print("Sounds_Module_Loaded")
+
+# --- サウンドのヘッダ解析と sound_definitions.json の生成 ---
+# RP/sounds 以下の .ogg / .wav は、音声をデコードせずにコンテナのヘッダだけを ZIP のストリームから読み、
+# 長さ・チャンネル数・サンプリングレートを求める。
+#   WAV: RIFF の fmt チャンクと data チャンクのヘッダ (長さ = data のバイト数 / 1秒あたりのバイト数)
+#   OGG: 最初のページの識別ヘッダ (Vorbis / Opus) と、末尾のページのグラニュール位置 (= 最後のサンプル番号)
+# OGG の長さを知るには末尾のページが必要なので、エントリの最後の SOUND_TAIL_BYTES だけを読む。
+#
+# 読み取った情報から RP/sounds/sound_definitions.json を生成する。パックに既にある場合は中身をそのまま残し、
+# どのイベントからも参照されていないファイルだけを追加する (イベント名はパスから作る: sounds/mob/cow/say1 -> mob.cow.say)。
+# 怪しいアセット (3D で鳴らすステレオ音源、ストリーミングしない大きなファイルなど) は警告として返す。
+SOUNDS_FOLDER = "RP/sounds"
+SOUND_DEFINITIONS_PATH = f"{SOUNDS_FOLDER}/sound_definitions.json"
+SOUND_EXTENSIONS = ('.ogg', '.wav')
+SOUND_DEFINITIONS_FORMAT_VERSION = "1.14.0"
+# これより長いサウンドは stream: true にする (メモリに全体を読み込ませない)
+SOUND_STREAM_SECONDS = float(os.environ.get("SOUND_STREAM_SECONDS", 10))
+# ストリーミングしないサウンドのサイズの上限 (超えたら警告)
+SOUND_MAX_BYTES = int(os.environ.get("SOUND_MAX_BYTES", 1024 * 1024))
+SOUND_MAX_SAMPLE_RATE = 48000
+# OGG のページは最大 65307 バイトなので、末尾からこれだけ読めば最後のページの先頭が必ず含まれる
+SOUND_TAIL_BYTES = 65536 + 1024
+
+# パスの最初のフォルダ -> カテゴリ (バニラの sound_definitions.json に合わせる)
+SOUND_CATEGORIES = {
+    "music": "music", "record": "record", "records": "record", "ambient": "ambient", "ui": "ui",
+    "block": "block", "dig": "block", "step": "block", "fire": "block", "mob": "neutral",
+    "damage": "player", "random": "player", "weather": "weather",
+}
+# 位置を持たない (2D で鳴る) カテゴリ。ステレオ音源でも問題ない
+SOUND_2D_CATEGORIES = ("music", "record", "ui")
+
+
+def probe_wav(f):
+    """
+    WAV の RIFF ヘッダを読む (音声データは読まない)。
+
+    Returns:
+        dict: {'codec', 'channels', 'sample_rate', 'duration'}
+    """
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise ValueError("RIFF/WAVE ヘッダがありません")
+    fmt = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError("data チャンクがありません")
+        chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            body = f.read(chunk_size + chunk_size % 2)
+            if len(body) < 16:
+                raise ValueError("fmt チャンクが短すぎます")
+            audio_format, channels, sample_rate, byte_rate = struct.unpack("<HHII", body[:12])
+            fmt = {"codec": "pcm" if audio_format in (1, 0xFFFE) else f"wav_{audio_format}",
+                   "channels": channels, "sample_rate": sample_rate, "byte_rate": byte_rate}
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("fmt チャンクが data より後にあります")
+            if not fmt["byte_rate"]:
+                raise ValueError("byte_rate が 0 です")
+            return {"codec": fmt["codec"], "channels": fmt["channels"], "sample_rate": fmt["sample_rate"],
+                    "duration": chunk_size / fmt["byte_rate"]}
+        else:
+            # LIST などのメタデータは読み飛ばす (数十バイト程度)
+            if len(f.read(chunk_size + chunk_size % 2)) < chunk_size:
+                raise ValueError("チャンクが途中で終わっています")
+
+
+def _ogg_pages(data: bytes, serial: int):
+    """data 中の OGG ページのグラニュール位置を、末尾のページから順に返す。"""
+    position = len(data)
+    while True:
+        position = data.rfind(b"OggS", 0, position)
+        if position < 0:
+            return
+        if position + 18 <= len(data):
+            granule, page_serial = struct.unpack("<qI", data[position + 6:position + 18])
+            if page_serial == serial and granule >= 0:
+                yield granule
+
+
+def probe_ogg(f, size: int):
+    """
+    OGG (Vorbis / Opus) の識別ヘッダと末尾のページを読む (音声データはデコードしない)。
+
+    Returns:
+        dict: {'codec', 'channels', 'sample_rate', 'duration'}
+    """
+    page = f.read(27)
+    if len(page) < 27 or page[:4] != b"OggS":
+        raise ValueError("OGG ページがありません")
+    serial = struct.unpack("<I", page[14:18])[0]
+    segments = f.read(page[26])
+    # 最初のパケット (識別ヘッダ) の長さ: 255 未満のセグメントで終わる
+    length = 0
+    for segment in segments:
+        length += segment
+        if segment < 255:
+            break
+    packet = f.read(length)
+
+    if packet[:7] == b"\x01vorbis" and len(packet) >= 16:
+        codec, channels = "vorbis", packet[11]
+        sample_rate = granule_rate = struct.unpack("<I", packet[12:16])[0]
+        pre_skip = 0
+    elif packet[:8] == b"OpusHead" and len(packet) >= 16:
+        # Opus のグラニュール位置は常に 48kHz で数える
+        codec, channels, granule_rate = "opus", packet[9], 48000
+        pre_skip, sample_rate = struct.unpack("<HI", packet[10:16])
+    else:
+        raise ValueError("Vorbis / Opus の識別ヘッダがありません")
+    if not granule_rate:
+        raise ValueError("サンプリングレートが 0 です")
+
+    tail_start = max(f.tell(), size - SOUND_TAIL_BYTES)
+    f.seek(tail_start)
+    last_granule = next(_ogg_pages(f.read(), serial), None)
+    if last_granule is None:
+        raise ValueError("末尾のページが見つかりません")
+    return {"codec": codec, "channels": channels, "sample_rate": sample_rate,
+            "duration": max(0, last_granule - pre_skip) / granule_rate}
+
+
+def probe_sound(zip_file, info):
+    """
+    ZIP 内のサウンドのヘッダを読む。
+
+    Returns:
+        tuple: (情報の辞書 (+ 'size'), エラーメッセージ)
+    """
+    try:
+        with zip_file.open(info) as f:
+            if info.filename.lower().endswith('.wav'):
+                probed = probe_wav(f)
+            else:
+                probed = probe_ogg(f, info.file_size)
+    except (ValueError, struct.error, EOFError, OSError) as e:
+        return None, str(e)
+    probed["size"] = info.file_size
+    return probed, None
+
+
+def sound_event_name(sound_name: str) -> str:
+    """'sounds/mob/cow/say1' -> 'mob.cow.say' (末尾の連番を取り、フォルダを '.' でつなぐ)"""
+    parts = sound_name.split('/')[1:] or [sound_name]
+    parts[-1] = re.sub(r'[_\-]?\d+$', '', parts[-1]) or parts[-1]
+    return '.'.join(parts)
+
+
+def sound_category(sound_name: str) -> str:
+    parts = sound_name.split('/')
+    return SOUND_CATEGORIES.get(parts[1] if len(parts) > 2 else "", "neutral")
+
+
+def _definition_sounds(definitions: dict):
+    """既存の定義から {サウンド名 (小文字): (カテゴリ, サウンドの定義)} を作る。"""
+    referenced = {}
+    for event in definitions.values():
+        if not isinstance(event, dict):
+            continue
+        for sound in event.get("sounds") or []:
+            name = sound.get("name") if isinstance(sound, dict) else sound
+            if isinstance(name, str):
+                referenced[name.lower()] = (event.get("category", "neutral"), sound)
+    return referenced
+
+
+def build_sound_definitions(probed: dict, existing: dict = None):
+    """
+    サウンドの情報から sound_definitions.json を生成する (existing があればそれにマージする)。
+
+    Args:
+        probed (dict): {ZIP内のパス: (情報, エラー)}
+        existing (dict): パックに含まれていた sound_definitions.json
+
+    Returns:
+        tuple: (sound_definitions.json の内容, 追加したサウンドの数, 警告のリスト [{'path', 'issue', 'detail'}])
+    """
+    document = copy.deepcopy(existing) if isinstance(existing, dict) else {}
+    if "sound_definitions" in document or not document:
+        document.setdefault("format_version", SOUND_DEFINITIONS_FORMAT_VERSION)
+        definitions = document.setdefault("sound_definitions", {})
+    else:
+        # 古い形式 (イベントが最上位に並ぶ) はそのままの形式で追記する
+        definitions = document
+    referenced = _definition_sounds(definitions)
+
+    added, warnings = 0, []
+    for path in sorted(probed):
+        info, error = probed[path]
+        sound_name = os.path.splitext(path[len("RP/"):])[0]
+        if error:
+            warnings.append({"path": path, "issue": "unreadable", "detail": error})
+            continue
+
+        if sound_name.lower() in referenced:
+            category, sound = referenced[sound_name.lower()]
+        else:
+            category = sound_category(sound_name)
+            sound = sound_name
+            if info["duration"] >= SOUND_STREAM_SECONDS:
+                sound = {"name": sound_name, "stream": True}
+            event = definitions.setdefault(sound_event_name(sound_name), {"category": category, "sounds": []})
+            event.setdefault("sounds", []).append(sound)
+            added += 1
+
+        streamed = isinstance(sound, dict) and sound.get("stream")
+        is_3d = category not in SOUND_2D_CATEGORIES and not (isinstance(sound, dict) and sound.get("is3D") is False)
+        if info["channels"] > 1 and is_3d:
+            warnings.append({"path": path, "issue": "stereo_3d",
+                             "detail": f"{info['channels']}ch の音源は位置に応じた減衰がかかりません (category: {category})"})
+        if info["size"] > SOUND_MAX_BYTES and not streamed:
+            warnings.append({"path": path, "issue": "oversized",
+                             "detail": f"{info['size'] // 1024} KB ({info['duration']:.1f} 秒) を stream なしで読み込みます"})
+        if info["sample_rate"] > SOUND_MAX_SAMPLE_RATE:
+            warnings.append({"path": path, "issue": "high_sample_rate", "detail": f"{info['sample_rate']} Hz"})
+    return document, added, warnings
+
+
+def collect_sound_definitions(zip_file, timings=None):
+    """
+    パック内のサウンドのヘッダを読み、sound_definitions.json を生成・マージする。
+
+    Args:
+        zip_file: 'RP/...' のエントリ名を持つ ZipFile / PackView
+        timings (Counter): 指定した場合は 'sounds' に所要時間を加算する
+
+    Returns:
+        dict | None: {'definitions', 'probed', 'added', 'warnings'} (サウンドも定義も無い場合は None)
+    """
+    started = time.perf_counter()
+    existing = None
+    probed = {}
+    for info in zip_file.infolist():
+        name = info.filename
+        if not name.startswith(SOUNDS_FOLDER + '/'):
+            continue
+        if name == SOUND_DEFINITIONS_PATH:
+            try:
+                with zip_file.open(info) as f:
+                    existing = json.loads(f.read().decode('utf-8-sig'))
+            except ValueError as e:
+                print(f"Error: Invalid JSON in file: {name}_{e}")
+        elif name.lower().endswith(SOUND_EXTENSIONS):
+            probed[name] = probe_sound(zip_file, info)
+    if existing is None and not probed:
+        return None
+
+    definitions, added, warnings = build_sound_definitions(probed, existing)
+    for warning in warnings:
+        print(f"Sound_Warning:{warning['issue']}_{warning['path']}_{warning['detail']}")
+    if timings is not None:
+        timings["sounds"] += time.perf_counter() - started
+    print(f"Sound_Definitions_Built:Probed:{len(probed)}_Added:{added}_Warnings:{len(warnings)}")
+    return {"definitions": definitions, "probed": len(probed), "added": added, "warnings": warnings}
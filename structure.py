@@ -1,6 +1,17 @@
 import json
 import base64
+import collections
+import gzip
+import hashlib
+import io
 import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+from repo_mirror import REPO_MIRROR
 # NOTE: nbtlibは標準ライブラリではないため、pip install nbtlib が必要です
 # from nbtlib.tag import Compound, List, String, Int, ByteArray, Byte
 # from nbtlib import nbt, load, File # 実際にはこれらを使用します
@@ -8,75 +19,1162 @@ import os
 print("NBT_Conversion_Module_Loaded")
 
 # --- NBTから編集可能なJSONへ (バイナリ -> JSON) ---
+# 編集用の JSON の形式 (nbt_to_json が出力し、json_to_nbt が受け付ける):
+#   structure_name:       構造物名
+#   size:                 [X, Y, Z]
+#   origin:               [x, y, z] (省略可)
+#   block_palette:        {番号(str): ブロック名 または {'name', 'states', 'version'}}
+#                         JSON で型を保てないステート (Short / Long / Double、0/1 以外の Byte) を持つものは
+#                         states の代わりに states_nbt (ステートの Compound の NBT を Base64 にしたもの)
+#   block_entries:        [{'position': [x, y, z], 'state_index': 番号}]  (指定の無い位置はストラクチャーヴォイド)
+#   block_entries_layer1: レイヤー1 (水没など) の block_entries (省略可。パレットはレイヤー0と共通)
+#   block_position_data:  [{'position': [x, y, z], 'nbt': Base64}] ブロックエンティティなど (省略可)
+#   entities:             [Base64] エンティティの Compound (省略可)
+# ブロックエンティティとエンティティは編集の対象ではないため、NBT のまま (タグの型を保って) 持ち回る。
+
+
+def _nbt_compound_base64(value: dict) -> str:
+    out = []
+    _nbt_write_payload(out, TAG_COMPOUND, value)
+    return base64.b64encode(b''.join(out)).decode('ascii')
+
+
+def _nbt_compound_from_base64(text: str) -> dict:
+    value, _ = _nbt_read_payload(base64.b64decode(text), 0, TAG_COMPOUND)
+    return value
+
+
+def _states_to_json(states: dict):
+    """ブロックのステートを JSON の値にする。型を保てない値がある場合は None。"""
+    result = {}
+    for key, value in states.items():
+        if isinstance(value, np.int8) and value in (0, 1):
+            result[key] = bool(value)   # Bedrock の Byte のステート (*_bit など) は真偽値
+        elif isinstance(value, np.float32):
+            result[key] = float(value)
+        elif isinstance(value, (str, int)) and not isinstance(value, (bool, np.generic)):
+            result[key] = value
+        else:
+            return None
+    return result
+
 
-def nbt_to_json(nbt_binary_data: bytes):
+def _entries_json(layer):
+    positions = np.argwhere(layer >= 0)
+    return [{"position": position, "state_index": index}
+            for position, index in zip(positions.tolist(), layer[layer >= 0].tolist())]
+
+
+def nbt_to_json(nbt_binary_data: bytes, structure_name: str = "structure"):
     """
-    構造物ファイルのバイナリデータ (.mcstructure) を読み込み、
-    Pythonで編集可能なJSON形式に変換する（擬似実装）。
-    
+    構造物ファイルのバイナリデータ (.mcstructure) を読み込み、編集用の JSON に変換する。
+    json_to_nbt に戻すと元と同じ内容の構造物になる。
+
     Args:
-        nbt_binary_data (bytes): GitHubから取得したBase64エンコードされたNBTをデコードしたバイナリ
-        
+        nbt_binary_data (bytes): .mcstructure ファイルの中身
+        structure_name (str): JSON に入れる構造物名
+
     Returns:
-        dict: 編集可能なJSON構造
+        dict: 編集可能なJSON構造 (形式はこのセクションの先頭を参照)
+
+    Raises:
+        ValueError: .mcstructure として読めない場合
     """
-    
-    # 実際の処理:
-    # 1. nbtlib.load() または nbt.parse() でバイナリをNBT構造（Compound Tag）にパース
-    # 2. Compound TagをPythonの辞書に変換
-    
-    # === 擬似的な処理開始 ===
-    
-    # バイナリデータから構造物名などを仮に抽出
-    # NBTは人間が読みやすい形式ではないため、成功したかをチェックするのみ
     if not nbt_binary_data:
-        return {"error": "NBT binary data is empty."}
-    
-    # 例として、JSONの編集構造を定義
+        raise ValueError("NBT binary data is empty.")
+    try:
+        structure = decode_mcstructure(nbt_binary_data)
+    except (IndexError, KeyError, TypeError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid mcstructure: {type(e).__name__}: {e}") from e
+
+    palette = {}
+    for i, entry in enumerate(structure["palette"]):
+        json_entry = {"name": entry["name"], "version": int(entry.get("version", 0))}
+        states = _states_to_json(entry.get("states", {}))
+        if states is None:
+            json_entry["states_nbt"] = _nbt_compound_base64(entry["states"])
+        else:
+            json_entry["states"] = states
+        palette[str(i)] = json_entry
+
+    size = structure["size"]
     editable_structure_json = {
-        "structure_name": "custom:my_structure",
-        "size": [5, 5, 5],
-        "block_palette": {
-            "0": "minecraft:air",
-            "1": "minecraft:stone"
-        },
-        "block_entries": [
-            {"position": [0, 0, 0], "state_index": 1},
-            # ...
-        ],
-        "meta": {"note": "Generated from NBT"}
+        "structure_name": structure_name,
+        "size": list(size),
+        "origin": structure["origin"],
+        "block_palette": palette,
+        "block_entries": _entries_json(structure["blocks"]),
     }
-    
+    layer1 = structure["blocks_layer1"]
+    if layer1 is not None and (layer1 >= 0).any():
+        editable_structure_json["block_entries_layer1"] = _entries_json(layer1)
+    position_data = [
+        {"position": [int(v) for v in np.unravel_index(int(index), size)], "nbt": _nbt_compound_base64(data)}
+        for index, data in structure["block_position_data"].items()
+    ]
+    if position_data:
+        editable_structure_json["block_position_data"] = position_data
+    if structure["entities"]:
+        editable_structure_json["entities"] = [_nbt_compound_base64(entity) for entity in structure["entities"]]
+
     print("NBT_Successfully_Parsed_to_JSON_Format")
     return editable_structure_json
 
 # --- JSONからNBTバイナリへ (JSON -> バイナリ) ---
 
+def _positions_json(items: list, size: tuple, label: str):
+    """[{'position': [x, y, z], ...}] の座標を (N, 3) の配列にする。範囲外ならエラーメッセージも返す。"""
+    positions = np.array([item['position'] for item in items], dtype=np.int64).reshape(-1, 3)
+    outside = (positions < 0).any(axis=1) | (positions >= np.array(size)).any(axis=1)
+    if outside.any():
+        return positions, f"{label} position outside the structure size {list(size)}: {positions[outside][0].tolist()}"
+    return positions, None
+
+
 def json_to_nbt(editable_structure_json: dict):
     """
-    編集されたJSON構造をNBTバイナリ形式に戻す（擬似実装）。
-    
+    編集されたJSON構造を .mcstructure のバイナリ (encode_mcstructure) に変換する。
+    JSON の形式は nbt_to_json と同じ (このセクションの先頭を参照)。
+
     Args:
         editable_structure_json (dict): 編集後のJSON構造
-        
+
     Returns:
-        bytes: NBTバイナリデータ
+        tuple: (NBTバイナリデータ, エラーメッセージ)
     """
-    
-    # 実際の処理:
-    # 1. JSON構造をnbtlibのCompound Tagに変換
-    # 2. Compound Tagを nbt.save() などでバイナリデータに変換
-    
-    # === 擬似的な処理開始 ===
-    
+
     if 'structure_name' not in editable_structure_json:
         return None, "Structure name is missing."
 
-    # 仮のバイナリデータ (実データではない)
-    fake_nbt_bytes = f"NBT_BINARY_DATA_FOR_{editable_structure_json['structure_name']}".encode('utf-8')
-    
+    try:
+        size = tuple(int(v) for v in editable_structure_json.get('size', ()))
+        if len(size) != 3 or min(size) < 1:
+            return None, f"Invalid structure size: {editable_structure_json.get('size')}"
+
+        # パレットの番号 (文字列、飛び番でもよい) を詰めた番号に対応付ける
+        palette, palette_index = [], {}
+        for key, entry in sorted(editable_structure_json.get('block_palette', {}).items(), key=lambda kv: int(kv[0])):
+            if isinstance(entry, str):
+                entry = {"name": entry}
+            states = (_nbt_compound_from_base64(entry["states_nbt"]) if "states_nbt" in entry
+                      else entry.get("states", {}))
+            palette_index[int(key)] = len(palette)
+            palette.append({"name": entry["name"], "states": states,
+                            "version": entry.get("version", BEDROCK_BLOCK_VERSION)})
+
+        layers = []
+        for key, label in (('block_entries', "Block"), ('block_entries_layer1', "Layer 1 block")):
+            entries = editable_structure_json.get(key, [])
+            positions, error = _positions_json(entries, size, label)
+            if error:
+                return None, error
+            state_indices = [int(entry['state_index']) for entry in entries]
+            unknown = sorted({index for index in state_indices if index not in palette_index})
+            if unknown:
+                return None, f"Unknown state_index in {key}: {unknown[:10]}"
+            layer = np.full(size, -1, dtype=np.int32)
+            layer[positions[:, 0], positions[:, 1], positions[:, 2]] = [palette_index[i] for i in state_indices]
+            layers.append(layer)
+
+        position_items = editable_structure_json.get('block_position_data', [])
+        positions, error = _positions_json(position_items, size, "Block position data")
+        if error:
+            return None, error
+        block_position_data = {
+            str(int(np.ravel_multi_index(tuple(position), size))): _nbt_compound_from_base64(item['nbt'])
+            for position, item in zip(positions.tolist(), position_items)
+        }
+        entities = [_nbt_compound_from_base64(entity) for entity in editable_structure_json.get('entities', [])]
+    except (KeyError, TypeError, ValueError, IndexError, struct.error) as e:
+        return None, f"Invalid structure JSON: {type(e).__name__}: {e}"
+
+    nbt_bytes = encode_mcstructure({
+        "palette": palette,
+        "blocks": layers[0],
+        "blocks_layer1": layers[1],
+        "block_position_data": block_position_data,
+        "entities": entities,
+        "origin": editable_structure_json.get('origin', [0, 0, 0]),
+    })
+
     print("JSON_Successfully_Converted_to_NBT_Bytes")
-    return fake_nbt_bytes, None
+    return nbt_bytes, None
+
+# --- .mcstructure (リトルエンディアンNBT) の読み書き ---
+# nbtlib は TAG_Int を1要素ずつオブジェクト化するため、数百万ブロックの block_indices では遅すぎる。
+# ここでは .mcstructure に必要な範囲だけを実装し、Int のリストは NumPy 配列として一括で読み書きする。
+#
+# デコード後の構造物は次の辞書で表す:
+#   size:            (X, Y, Z)
+#   palette:         [{'name': 'minecraft:stone', 'states': {...}, 'version': int}, ...]
+#   blocks:          int32 配列 shape (X, Y, Z)、レイヤー0のパレット番号 (-1 はストラクチャーヴォイド)
+#   blocks_layer1:   レイヤー1 (水没など) のパレット番号 (同じ形状)
+#   block_position_data: {フラットインデックス(str): ブロックエンティティ等}
+#   entities:        エンティティの Compound のリスト
+#   origin:          structure_world_origin
+
+TAG_END, TAG_BYTE, TAG_SHORT, TAG_INT, TAG_LONG, TAG_FLOAT, TAG_DOUBLE = 0, 1, 2, 3, 4, 5, 6
+TAG_BYTE_ARRAY, TAG_STRING, TAG_LIST, TAG_COMPOUND, TAG_INT_ARRAY, TAG_LONG_ARRAY = 7, 8, 9, 10, 11, 12
+
+_SCALAR_FORMATS = {TAG_BYTE: '<b', TAG_SHORT: '<h', TAG_INT: '<i', TAG_LONG: '<q', TAG_FLOAT: '<f', TAG_DOUBLE: '<d'}
+_SCALAR_TYPES = {TAG_BYTE: np.int8, TAG_SHORT: np.int16, TAG_LONG: np.int64, TAG_FLOAT: np.float32, TAG_DOUBLE: np.float64}
+
+# Bedrock の構造物ブロックで扱える最大サイズ (X, Y, Z)
+STRUCTURE_MAX_SIZE = (64, 384, 64)
+
+
+class NBTIntArray(np.ndarray):
+    """
+    TAG_Int_Array として読み込んだ配列。TAG_List<TAG_Int> (block_indices など) も int32 の配列になるため、
+    書き出すときにタグを区別できるように印を付けておく。
+    """
+
+
+# 配列のタグ -> NumPy の dtype (読み書きで対になる)。TAG_List<TAG_Int> は印の無い int32 配列
+_ARRAY_DTYPES = {TAG_BYTE_ARRAY: '<i1', TAG_INT_ARRAY: '<i4', TAG_LONG_ARRAY: '<i8'}
+
+
+def _nbt_array_tag_of(array: np.ndarray):
+    """NumPy 配列のタグ種別 (int8 / int64 は Byte_Array / Long_Array、int32 は印があれば Int_Array)。"""
+    if array.dtype == np.int8:
+        return TAG_BYTE_ARRAY
+    if array.dtype == np.int64:
+        return TAG_LONG_ARRAY
+    if array.dtype == np.int32:
+        return TAG_INT_ARRAY if isinstance(array, NBTIntArray) else TAG_LIST
+    raise TypeError(f"Unsupported NBT array dtype: {array.dtype}")
+
+
+def _nbt_tag_of(value):
+    """Python/NumPy の値から NBT のタグ種別を決める (読み込み時の型と対になる)。"""
+    if isinstance(value, np.ndarray):
+        return _nbt_array_tag_of(value)
+    if isinstance(value, (bool, np.int8)):
+        return TAG_BYTE
+    if isinstance(value, np.int16):
+        return TAG_SHORT
+    if isinstance(value, np.int64):
+        return TAG_LONG
+    if isinstance(value, (int, np.int32)):
+        return TAG_INT
+    if isinstance(value, np.float32) or (isinstance(value, float) and not isinstance(value, np.float64)):
+        return TAG_FLOAT
+    if isinstance(value, np.float64):
+        return TAG_DOUBLE
+    if isinstance(value, str):
+        return TAG_STRING
+    if isinstance(value, dict):
+        return TAG_COMPOUND
+    if isinstance(value, list):
+        return TAG_LIST
+    raise TypeError(f"Unsupported NBT value: {type(value)}")
+
+
+def _nbt_write_payload(out: list, tag: int, value):
+    if tag in _SCALAR_FORMATS:
+        out.append(struct.pack(_SCALAR_FORMATS[tag], value))
+    elif tag == TAG_STRING:
+        encoded = value.encode('utf-8')
+        out.append(struct.pack('<H', len(encoded)))
+        out.append(encoded)
+    elif tag == TAG_COMPOUND:
+        for key, child in value.items():
+            child_tag = _nbt_tag_of(child)
+            encoded_key = key.encode('utf-8')
+            out.append(struct.pack('<BH', child_tag, len(encoded_key)))
+            out.append(encoded_key)
+            _nbt_write_payload(out, child_tag, child)
+        out.append(b'\x00')
+    elif tag in _ARRAY_DTYPES:
+        out.append(struct.pack('<i', value.size))
+        out.append(np.asarray(value).astype(_ARRAY_DTYPES[tag], copy=False).tobytes())
+    elif tag == TAG_LIST:
+        if isinstance(value, np.ndarray):
+            # Int のリストは配列のまま一括で書き出す
+            out.append(struct.pack('<Bi', TAG_INT, value.size))
+            out.append(np.asarray(value).astype('<i4', copy=False).tobytes())
+            return
+        element_tag = _nbt_tag_of(value[0]) if value else TAG_END
+        out.append(struct.pack('<Bi', element_tag, len(value)))
+        for child in value:
+            _nbt_write_payload(out, element_tag, child)
+    else:
+        raise TypeError(f"Unsupported NBT tag: {tag}")
+
+
+def _nbt_read_payload(data, pos: int, tag: int):
+    if tag in _SCALAR_FORMATS:
+        (value,) = struct.unpack_from(_SCALAR_FORMATS[tag], data, pos)
+        size = struct.calcsize(_SCALAR_FORMATS[tag])
+        return (_SCALAR_TYPES[tag](value) if tag in _SCALAR_TYPES else value), pos + size
+    if tag == TAG_STRING:
+        (length,) = struct.unpack_from('<H', data, pos)
+        return bytes(data[pos + 2:pos + 2 + length]).decode('utf-8'), pos + 2 + length
+    if tag == TAG_COMPOUND:
+        compound = {}
+        while True:
+            child_tag = data[pos]
+            pos += 1
+            if child_tag == TAG_END:
+                return compound, pos
+            key, pos = _nbt_read_payload(data, pos, TAG_STRING)
+            compound[key], pos = _nbt_read_payload(data, pos, child_tag)
+    if tag == TAG_LIST:
+        element_tag, length = struct.unpack_from('<Bi', data, pos)
+        pos += 5
+        if element_tag == TAG_INT:
+            array = np.frombuffer(data, dtype='<i4', count=length, offset=pos).astype(np.int32)
+            return array, pos + 4 * length
+        items = []
+        for _ in range(length):
+            item, pos = _nbt_read_payload(data, pos, element_tag)
+            items.append(item)
+        return items, pos
+    if tag in _ARRAY_DTYPES:
+        (length,) = struct.unpack_from('<i', data, pos)
+        array = np.frombuffer(data, dtype=_ARRAY_DTYPES[tag], count=length, offset=pos + 4)
+        array = array.astype(array.dtype.newbyteorder('='))  # ネイティブのバイト順のコピー
+        if tag == TAG_INT_ARRAY:
+            array = array.view(NBTIntArray)
+        return array, pos + 4 + array.nbytes
+    raise ValueError(f"Unknown NBT tag: {tag}")
+
+
+def decode_mcstructure(nbt_binary_data: bytes):
+    """
+    .mcstructure のバイナリをデコードし、ブロック配列 (NumPy) を含む構造物辞書に変換する。
+
+    Args:
+        nbt_binary_data (bytes): .mcstructure ファイルの中身
+
+    Returns:
+        dict: size / palette / blocks / blocks_layer1 / block_position_data / entities / origin
+    """
+    if nbt_binary_data[0] != TAG_COMPOUND:
+        raise ValueError("Not an NBT compound")
+    _, pos = _nbt_read_payload(nbt_binary_data, 1, TAG_STRING)  # ルートの名前 (空文字)
+    root, _ = _nbt_read_payload(nbt_binary_data, pos, TAG_COMPOUND)
+
+    size = tuple(int(v) for v in root["size"])
+    structure = root["structure"]
+    layers = structure["block_indices"]
+    palette_root = structure.get("palette", {}).get("default", {})
+
+    return {
+        "size": size,
+        "palette": [
+            {"name": entry["name"], "states": entry.get("states", {}), "version": entry.get("version", 0)}
+            for entry in palette_root.get("block_palette", [])
+        ],
+        "blocks": np.asarray(layers[0], dtype=np.int32).reshape(size),
+        "blocks_layer1": np.asarray(layers[1], dtype=np.int32).reshape(size) if len(layers) > 1 else None,
+        "block_position_data": palette_root.get("block_position_data", {}),
+        "entities": structure.get("entities", []),
+        "origin": [int(v) for v in root.get("structure_world_origin", [0, 0, 0])],
+    }
+
+
+def encode_mcstructure(structure: dict):
+    """
+    構造物辞書 (decode_mcstructure の形式) を .mcstructure のバイナリにエンコードする。
+
+    Returns:
+        bytes: .mcstructure ファイルの中身
+    """
+    blocks = np.asarray(structure["blocks"], dtype=np.int32)
+    layer1 = structure.get("blocks_layer1")
+    if layer1 is None:
+        layer1 = np.full(blocks.shape, -1, dtype=np.int32)
+
+    root = {
+        "format_version": 1,
+        "size": [int(v) for v in blocks.shape],
+        "structure": {
+            # Bedrock のフラットインデックスは x*(Y*Z) + y*Z + z (= C順の ravel)
+            "block_indices": [blocks.ravel(), np.asarray(layer1, dtype=np.int32).ravel()],
+            "entities": structure.get("entities", []),
+            "palette": {
+                "default": {
+                    "block_palette": [
+                        {"name": entry["name"], "states": entry.get("states", {}), "version": entry.get("version", 0)}
+                        for entry in structure["palette"]
+                    ],
+                    "block_position_data": structure.get("block_position_data", {}),
+                }
+            },
+        },
+        "structure_world_origin": [int(v) for v in structure.get("origin", [0, 0, 0])],
+    }
+
+    out = [bytes([TAG_COMPOUND]), struct.pack('<H', 0)]
+    _nbt_write_payload(out, TAG_COMPOUND, root)
+    return b''.join(out)
+
+
+def palette_key(entry: dict):
+    """パレットのエントリを比較用のキー (名前 + ソート済みステート) に変換する。"""
+    states = entry.get("states", {})
+    return entry["name"], tuple(sorted((k, v.item() if hasattr(v, "item") else v) for k, v in states.items()))
+
+
+# --- 巨大な構造物のタイル分割 ---
+
+def _compact_palette(palette: list, *layers):
+    """タイル内で使われているパレット番号だけを残し、番号を詰め直す。"""
+    stacked = np.concatenate([layer.ravel() for layer in layers])
+    used = np.unique(stacked[stacked >= 0])
+    lut = np.full(len(palette) + 1, -1, dtype=np.int32)  # 末尾の要素は -1 (ヴォイド) 用
+    lut[used] = np.arange(len(used), dtype=np.int32)
+    return [palette[i] for i in used], [lut[layer] for layer in layers]
+
+
+def _tile_counts(size: tuple, tile_size: tuple):
+    """各軸のタイル数 (端数のタイルを含む)。"""
+    return tuple(-(-int(size[a]) // int(tile_size[a])) for a in range(3))
+
+
+def bucket_tile_extras(structure: dict, tile_size: tuple = STRUCTURE_MAX_SIZE):
+    """
+    ブロックエンティティ等 (block_position_data) とエンティティを、全体を1回だけ走査してタイルごとに振り分ける。
+    構造物の範囲から少しはみ出したエンティティは一番近いタイルに入れる。
+    位置が分からない・範囲外を指すものはどのタイルにも入らないので、dropped として返す。
+
+    Returns:
+        tuple: (タイル番号 -> {タイル内のフラットインデックス(str): データ},
+                タイル番号 -> [エンティティ],
+                {'block_position_data': [元のフラットインデックス], 'entities': [識別子]})
+    """
+    size = tuple(int(v) for v in structure["size"])
+    counts = _tile_counts(size, tile_size)
+    positions, entities = {}, {}
+    dropped = {"block_position_data": [], "entities": []}
+
+    for flat_index, data in structure.get("block_position_data", {}).items():
+        try:
+            flat = int(flat_index)
+        except (TypeError, ValueError):
+            flat = -1
+        if not 0 <= flat < size[0] * size[1] * size[2]:
+            dropped["block_position_data"].append(flat_index)
+            continue
+        x, rest = divmod(flat, size[1] * size[2])
+        y, z = divmod(rest, size[2])
+        tile = (x // tile_size[0], y // tile_size[1], z // tile_size[2])
+        shape = [min(tile_size[a], size[a] - tile[a] * tile_size[a]) for a in range(3)]
+        local = ((x % tile_size[0]) * shape[1] + (y % tile_size[1])) * shape[2] + (z % tile_size[2])
+        positions.setdefault(tile, {})[str(local)] = data
+
+    origin = structure.get("origin", [0, 0, 0])
+    for entity in structure.get("entities", []):
+        position = entity.get("Pos")
+        try:
+            offsets = [float(position[a]) - origin[a] for a in range(3)] if len(position) == 3 else None
+        except (TypeError, ValueError):
+            offsets = None
+        if offsets is None or not all(np.isfinite(offsets)):
+            dropped["entities"].append(str(entity.get("identifier", "?")))
+            continue
+        tile = tuple(min(max(int(offsets[a] // tile_size[a]), 0), counts[a] - 1) for a in range(3))
+        entities.setdefault(tile, []).append(entity)
+
+    if dropped["block_position_data"] or dropped["entities"]:
+        print(f"Structure_Tile_Extras_Dropped:Block_Data:{len(dropped['block_position_data'])}"
+              f"_Entities:{len(dropped['entities'])}")
+    return positions, entities, dropped
+
+
+def iter_structure_tiles(structure: dict, tile_size: tuple = STRUCTURE_MAX_SIZE, extras: tuple = None):
+    """
+    構造物をタイルに分割し、1タイルずつ生成する。blocks が np.memmap の場合でも
+    コピーされるのは現在のタイル分だけなので、ピークメモリは約1タイル分になる。
+
+    Args:
+        extras (tuple): bucket_tile_extras() の結果 (省略時はここで振り分ける。dropped を報告したい場合は先に呼ぶ)
+
+    Yields:
+        tuple: (タイル番号 (i, j, k), オフセット (x, y, z), タイルの構造物辞書)
+    """
+    size = structure["size"]
+    blocks = structure["blocks"]
+    layer1 = structure.get("blocks_layer1")
+    position_buckets, entity_buckets, _ = extras or bucket_tile_extras(structure, tile_size)
+    origin = structure.get("origin", [0, 0, 0])
+
+    for i, x0 in enumerate(range(0, size[0], tile_size[0])):
+        for j, y0 in enumerate(range(0, size[1], tile_size[1])):
+            for k, z0 in enumerate(range(0, size[2], tile_size[2])):
+                x1, y1, z1 = min(x0 + tile_size[0], size[0]), min(y0 + tile_size[1], size[1]), min(z0 + tile_size[2], size[2])
+                tile_blocks = np.ascontiguousarray(blocks[x0:x1, y0:y1, z0:z1], dtype=np.int32)
+                layers = [tile_blocks]
+                if layer1 is not None:
+                    layers.append(np.ascontiguousarray(layer1[x0:x1, y0:y1, z0:z1], dtype=np.int32))
+                tile_palette, layers = _compact_palette(structure["palette"], *layers)
+
+                yield (i, j, k), (x0, y0, z0), {
+                    "size": tile_blocks.shape,
+                    "palette": tile_palette,
+                    "blocks": layers[0],
+                    "blocks_layer1": layers[1] if len(layers) > 1 else None,
+                    "block_position_data": position_buckets.get((i, j, k), {}),
+                    "entities": entity_buckets.get((i, j, k), []),
+                    "origin": [origin[0] + x0, origin[1] + y0, origin[2] + z0],
+                }
+
+
+def structure_tile_manifest(structure: dict, structure_name: str, tile_size: tuple = STRUCTURE_MAX_SIZE,
+                            dropped: dict = None):
+    """
+    タイル分割の配置マニフェストを作る (タイルの位置とサイズは構造物のサイズだけで決まるので、先に作れる)。
+
+    Args:
+        dropped (dict): bucket_tile_extras() が返した、どのタイルにも入らなかったもの (あれば記録する)
+    """
+    size = [int(v) for v in structure["size"]]
+    manifest = {
+        "name": structure_name,
+        "size": size,
+        "tile_size": list(tile_size),
+        "origin": [int(v) for v in structure.get("origin", [0, 0, 0])],
+        "tiles": [],
+    }
+    for i, x0 in enumerate(range(0, size[0], tile_size[0])):
+        for j, y0 in enumerate(range(0, size[1], tile_size[1])):
+            for k, z0 in enumerate(range(0, size[2], tile_size[2])):
+                manifest["tiles"].append({
+                    "file": f"{structure_name}_{i}_{j}_{k}.mcstructure",
+                    "offset": [x0, y0, z0],
+                    "size": [min(tile_size[0], size[0] - x0), min(tile_size[1], size[1] - y0),
+                             min(tile_size[2], size[2] - z0)],
+                })
+    if dropped and (dropped["block_position_data"] or dropped["entities"]):
+        manifest["dropped"] = dropped
+    return manifest
+
+
+def write_structure_tiles(structure: dict, structure_name: str, out_dir: str, tile_size: tuple = STRUCTURE_MAX_SIZE):
+    """
+    構造物をタイルごとの .mcstructure ファイルとして書き出し、配置マニフェストを生成する。
+    タイルは1枚ずつエンコードして即座にディスクへ書き込む。
+
+    Returns:
+        dict: 配置マニフェスト ({name}.tiles.json としても書き出される)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    extras = bucket_tile_extras(structure, tile_size)
+    manifest = structure_tile_manifest(structure, structure_name, tile_size, extras[2])
+
+    for (i, j, k), offset, tile in iter_structure_tiles(structure, tile_size, extras):
+        file_name = f"{structure_name}_{i}_{j}_{k}.mcstructure"
+        with open(os.path.join(out_dir, file_name), "wb") as f:
+            f.write(encode_mcstructure(tile))
+        print(f"Structure_Tile_Written:{file_name}_Offset:{offset}")
+
+    with open(os.path.join(out_dir, f"{structure_name}.tiles.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    return manifest
+
+
+def stitch_structure_tiles(manifest: dict, load_tile, out=None):
+    """
+    タイル分割の逆操作: マニフェストに従ってタイルを読み込み、1つの構造物に結合する。
+
+    Args:
+        manifest (dict): write_structure_tiles() が生成したマニフェスト
+        load_tile (callable): ファイル名を受け取り .mcstructure のバイト列を返す関数
+        out (np.ndarray): 結合先のブロック配列 (np.memmap を渡すとメモリ上に全体を持たない)
+
+    Returns:
+        dict: 結合された構造物辞書
+    """
+    size = tuple(manifest["size"])
+    blocks = out if out is not None else np.full(size, -1, dtype=np.int32)
+    layer1 = None
+    palette, palette_index = [], {}
+    position_data, entities = {}, []
+
+    for tile_info in manifest["tiles"]:
+        tile = decode_mcstructure(load_tile(tile_info["file"]))
+        x0, y0, z0 = tile_info["offset"]
+        sx, sy, sz = tile["size"]
+
+        # タイルのパレットを全体のパレットに対応付ける (末尾の -1 はヴォイド用)
+        lut = np.empty(len(tile["palette"]) + 1, dtype=np.int32)
+        lut[-1] = -1
+        for local_index, entry in enumerate(tile["palette"]):
+            key = palette_key(entry)
+            if key not in palette_index:
+                palette_index[key] = len(palette)
+                palette.append(entry)
+            lut[local_index] = palette_index[key]
+
+        blocks[x0:x0 + sx, y0:y0 + sy, z0:z0 + sz] = lut[tile["blocks"]]
+        if tile["blocks_layer1"] is not None and (tile["blocks_layer1"] >= 0).any():
+            if layer1 is None:
+                layer1 = np.full(size, -1, dtype=np.int32)
+            layer1[x0:x0 + sx, y0:y0 + sy, z0:z0 + sz] = lut[tile["blocks_layer1"]]
+
+        for local, data in tile["block_position_data"].items():
+            x, rest = divmod(int(local), sy * sz)
+            y, z = divmod(rest, sz)
+            position_data[str(((x + x0) * size[1] + (y + y0)) * size[2] + (z + z0))] = data
+        entities.extend(tile["entities"])
+
+    return {
+        "size": size,
+        "palette": palette,
+        "blocks": blocks,
+        "blocks_layer1": layer1,
+        "block_position_data": position_data,
+        "entities": entities,
+        "origin": manifest.get("origin", [0, 0, 0]),
+    }
+
+# --- 構造物のバージョン間の差分 ---
+
+def _state_to_json(entry: dict):
+    """パレットのエントリを JSON に出力できる形 (NumPy スカラーを Python の値に) に変換する。"""
+    if entry is None:
+        return None
+    return {"name": entry["name"],
+            "states": {k: (v.item() if hasattr(v, "item") else v) for k, v in entry.get("states", {}).items()}}
+
+
+def _pad_blocks(blocks, shape):
+    if blocks.shape == tuple(shape):
+        return blocks
+    padded = np.full(shape, -1, dtype=np.int32)
+    padded[:blocks.shape[0], :blocks.shape[1], :blocks.shape[2]] = blocks
+    return padded
+
+
+def _nbt_bytes(value):
+    """NBT の値を比較用のバイト列にする (NumPy 配列を含む辞書は == で比較できないため)。"""
+    out = []
+    _nbt_write_payload(out, _nbt_tag_of(value), value)
+    return b''.join(out)
+
+
+def _position_data_by_coordinate(structure: dict):
+    """block_position_data のキー (フラットインデックス) を座標 (x, y, z) に変換する。"""
+    _, size_y, size_z = structure["size"]
+    by_coordinate = {}
+    for flat_index, data in structure.get("block_position_data", {}).items():
+        x, rest = divmod(int(flat_index), size_y * size_z)
+        by_coordinate[(x,) + divmod(rest, size_z)] = data
+    return by_coordinate
+
+
+def _count_by_name(summary: dict, union: list, removed_ids, added_ids, void_name):
+    """パレット番号の配列を、ブロック名ごとの removed / added の件数として summary に加算する。"""
+    void_slot = len(union)
+    removed = np.bincount(np.where(removed_ids < 0, void_slot, removed_ids), minlength=void_slot + 1)
+    added = np.bincount(np.where(added_ids < 0, void_slot, added_ids), minlength=void_slot + 1)
+    if void_name is None:
+        removed[void_slot] = added[void_slot] = 0
+    for union_id in np.nonzero(removed + added)[0]:
+        name = union[union_id]["name"] if union_id < void_slot else void_name
+        counts = summary.setdefault(name, {"removed": 0, "added": 0})
+        counts["removed"] += int(removed[union_id])
+        counts["added"] += int(added[union_id])
+
+
+def diff_structures(old, new, max_changes: int = 10000):
+    """
+    2つのバージョンの構造物をブロック単位で比較する。
+    レイヤー0 (ブロック)・レイヤー1 (水没など)・ブロックエンティティ等 (block_position_data)・エンティティ・
+    origin のどれかが違えば identical は False になる。
+
+    Args:
+        old, new: .mcstructure のバイト列、または decode_mcstructure() の結果
+                  (両方がバイト列でハッシュが一致する場合はデコードせずに終了する)
+        max_changes (int): changes / block_data_changes に含める件数の上限 (件数は *_count に全件入る)
+
+    Returns:
+        dict: {'identical': bool, 'size_changed': bool, 'origin_changed': bool, 'changed_count': int,
+               'changes': [{'position': [x, y, z], 'old': ステート, 'new': ステート,
+                            ('old_layer1', 'new_layer1': どちらかにレイヤー1がある場合)}],
+               'summary': {ブロック名: {'removed': n, 'added': n}} (レイヤーごとに変わったものだけを数える),
+               'block_data_changed_count': int,
+               'block_data_changes': [{'position': [x, y, z], 'change': 'added' / 'removed' / 'modified'}],
+               'entities_changed_count': int, 'entity_summary': {識別子: {'removed': n, 'added': n}},
+               'truncated': bool}
+    """
+    if isinstance(old, (bytes, bytearray)) and isinstance(new, (bytes, bytearray)):
+        if hashlib.sha256(old).digest() == hashlib.sha256(new).digest():
+            print("Structure_Diff:Identical_Hash")
+            return {"identical": True, "size_changed": False, "origin_changed": False, "changed_count": 0,
+                    "changes": [], "summary": {}, "block_data_changed_count": 0, "block_data_changes": [],
+                    "entities_changed_count": 0, "entity_summary": {}, "truncated": False}
+    if isinstance(old, (bytes, bytearray)):
+        old = decode_mcstructure(old)
+    if isinstance(new, (bytes, bytearray)):
+        new = decode_mcstructure(new)
+
+    # 両方のパレットを共通の番号に対応付ける (末尾の要素は -1 = ヴォイド用)
+    union, union_index = [], {}
+    luts = []
+    for structure in (old, new):
+        lut = np.empty(len(structure["palette"]) + 1, dtype=np.int32)
+        lut[-1] = -1
+        for local_index, entry in enumerate(structure["palette"]):
+            key = palette_key(entry)
+            if key not in union_index:
+                union_index[key] = len(union)
+                union.append(entry)
+            lut[local_index] = union_index[key]
+        luts.append(lut)
+
+    shape = tuple(max(a, b) for a, b in zip(old["size"], new["size"]))
+    old_ids = luts[0][_pad_blocks(old["blocks"], shape)]
+    new_ids = luts[1][_pad_blocks(new["blocks"], shape)]
+    changed_layer0 = old_ids != new_ids
+
+    # レイヤー1 (水没など) は無い場合を全てヴォイドとみなして比較する
+    has_layer1 = old.get("blocks_layer1") is not None or new.get("blocks_layer1") is not None
+    if has_layer1:
+        old_layer1, new_layer1 = (
+            lut[_pad_blocks(structure["blocks_layer1"], shape)] if structure.get("blocks_layer1") is not None
+            else np.full(shape, -1, dtype=np.int32)
+            for structure, lut in ((old, luts[0]), (new, luts[1])))
+        changed_layer1 = old_layer1 != new_layer1
+        changed = changed_layer0 | changed_layer1
+    else:
+        changed = changed_layer0
+
+    positions = np.argwhere(changed)
+    changed_count = len(positions)
+
+    # ブロック種別ごとの集計は、そのレイヤーが変わった位置だけを数える
+    # (レイヤー1 だけが変わった位置で、レイヤー0 の同じブロックを removed + added と数えない)
+    summary = {}
+    _count_by_name(summary, union, old_ids[changed_layer0], new_ids[changed_layer0], "structure_void")
+    if has_layer1:
+        # レイヤー1 のヴォイドは「何も無い」なので数えない
+        _count_by_name(summary, union, old_layer1[changed_layer1], new_layer1[changed_layer1], None)
+
+    changes = []
+    for x, y, z in positions[:max_changes]:
+        old_id, new_id = old_ids[x, y, z], new_ids[x, y, z]
+        change = {
+            "position": [int(x), int(y), int(z)],
+            "old": _state_to_json(union[old_id]) if old_id >= 0 else None,
+            "new": _state_to_json(union[new_id]) if new_id >= 0 else None,
+        }
+        if has_layer1:
+            old_id, new_id = old_layer1[x, y, z], new_layer1[x, y, z]
+            change["old_layer1"] = _state_to_json(union[old_id]) if old_id >= 0 else None
+            change["new_layer1"] = _state_to_json(union[new_id]) if new_id >= 0 else None
+        changes.append(change)
+
+    # ブロックエンティティ等は座標ごとに NBT のバイト列で比較する
+    old_data, new_data = _position_data_by_coordinate(old), _position_data_by_coordinate(new)
+    block_data_changes = []
+    for coordinate in sorted(old_data.keys() | new_data.keys()):
+        if coordinate not in new_data:
+            kind = "removed"
+        elif coordinate not in old_data:
+            kind = "added"
+        elif _nbt_bytes(old_data[coordinate]) != _nbt_bytes(new_data[coordinate]):
+            kind = "modified"
+        else:
+            continue
+        block_data_changes.append({"position": list(coordinate), "change": kind})
+
+    # エンティティは順序を問わない多重集合として比較する
+    old_entities = collections.Counter(_nbt_bytes(entity) for entity in old.get("entities", []))
+    new_entities = collections.Counter(_nbt_bytes(entity) for entity in new.get("entities", []))
+    entity_summary = {}
+    for side, entities, difference in (("removed", old.get("entities", []), old_entities - new_entities),
+                                       ("added", new.get("entities", []), new_entities - old_entities)):
+        for entity in entities:
+            key = _nbt_bytes(entity)
+            if difference[key] > 0:
+                difference[key] -= 1
+                counts = entity_summary.setdefault(str(entity.get("identifier", "?")), {"removed": 0, "added": 0})
+                counts[side] += 1
+    entities_changed_count = sum(counts["removed"] + counts["added"] for counts in entity_summary.values())
+
+    size_changed = tuple(old["size"]) != tuple(new["size"])
+    origin_changed = [int(v) for v in old.get("origin", [0, 0, 0])] != [int(v) for v in new.get("origin", [0, 0, 0])]
+    print(f"Structure_Diff:Changed_Blocks:{changed_count}_Block_Data:{len(block_data_changes)}"
+          f"_Entities:{entities_changed_count}")
+    return {
+        "identical": not (changed_count or block_data_changes or entities_changed_count or size_changed
+                          or origin_changed),
+        "size_changed": size_changed,
+        "origin_changed": origin_changed,
+        "changed_count": changed_count,
+        "changes": changes,
+        "summary": summary,
+        "block_data_changed_count": len(block_data_changes),
+        "block_data_changes": block_data_changes[:max_changes],
+        "entities_changed_count": entities_changed_count,
+        "entity_summary": entity_summary,
+        "truncated": changed_count > max_changes or len(block_data_changes) > max_changes,
+    }
+
+# --- Java版の .schem / .litematic の取り込み ---
+# Java版のブロックステートは、事前に作った対応表 (java_block_mapping.json) から
+# パレット単位でルックアップテーブルを作り、ブロック配列には1回の配列インデックス操作で適用する。
+JAVA_BLOCK_MAPPING_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "java_block_mapping.json")
+
+with open(JAVA_BLOCK_MAPPING_FILE, encoding='utf-8') as _f:
+    JAVA_BLOCK_MAPPING = json.load(_f)
+print(f"Java_Block_Mapping_Loaded:{len(JAVA_BLOCK_MAPPING['names'])}_blocks")
+
+# パレットエントリの version (Bedrock 1.20.80 相当)
+BEDROCK_BLOCK_VERSION = 18100737
+
+
+def parse_java_block_state(state: str):
+    """'minecraft:oak_log[axis=y]' を ('minecraft:oak_log', {'axis': 'y'}) に分解する。"""
+    name, _, rest = state.partition('[')
+    properties = {}
+    if rest:
+        for pair in rest.rstrip(']').split(','):
+            key, _, value = pair.partition('=')
+            properties[key.strip()] = value.strip()
+    return name, properties
+
+
+def _java_property_value(value: str):
+    # Bedrock のステートは bool は Byte、数値は Int、それ以外は String
+    if value in ('true', 'false'):
+        return np.int8(value == 'true')
+    if value.isdigit():
+        return int(value)
+    return value
+
+
+def java_state_to_bedrock(name: str, properties: dict, report: dict):
+    """
+    Java版の1ブロックステートを Bedrock のパレットエントリに変換する。
+    対応表にない名前・プロパティは report に記録する。
+
+    Returns:
+        dict | None: Bedrock のパレットエントリ (ストラクチャーヴォイドの場合は None)
+    """
+    if name in JAVA_BLOCK_MAPPING["void"]:
+        return None
+
+    java_state = f"{name}[{','.join(f'{k}={v}' for k, v in properties.items())}]" if properties else name
+    bedrock_name = JAVA_BLOCK_MAPPING["names"].get(name)
+    if bedrock_name is None:
+        # 対応表にない場合は同じ名前のまま使い、未対応として報告する
+        bedrock_name = name
+        report["unmapped"][java_state] = report["unmapped"].get(java_state, 0)
+
+    states = {}
+    for key, value in properties.items():
+        if key in JAVA_BLOCK_MAPPING["ignored_properties"] or key in JAVA_BLOCK_MAPPING["layer1_properties"]:
+            continue
+        bedrock_key = JAVA_BLOCK_MAPPING["properties"].get(key)
+        if bedrock_key is None:
+            report["dropped_properties"][f"{name}:{key}"] = report["dropped_properties"].get(f"{name}:{key}", 0)
+            continue
+        states[bedrock_key] = _java_property_value(value)
+
+    return {"name": bedrock_name, "states": states, "version": BEDROCK_BLOCK_VERSION}
+
+
+def java_state_to_bedrock_layer1(properties: dict):
+    """
+    Java版のプロパティのうち、Bedrock ではレイヤー1 (別のブロック) で表すもの (waterlogged=true -> 水) を変換する。
+
+    Returns:
+        dict | None: レイヤー1 のパレットエントリ (無い場合は None)
+    """
+    for key, values in JAVA_BLOCK_MAPPING["layer1_properties"].items():
+        entry = values.get(properties.get(key))
+        if entry is not None:
+            return {"name": entry["name"], "states": dict(entry.get("states", {})), "version": BEDROCK_BLOCK_VERSION}
+    return None
+
+
+
+def decode_varint_array(data, count: int):
+    """Sponge形式の BlockData (可変長整数の列) をベクトル演算でデコードする。"""
+    raw = np.asarray(data, dtype=np.int8).view(np.uint8)
+    if not (raw & 0x80).any():
+        # 全て1バイト (パレットが128種類未満) の場合はそのまま
+        return raw[:count].astype(np.int32)
+    ends = (raw & 0x80) == 0
+    end_positions = np.flatnonzero(ends)
+    starts = np.concatenate(([0], end_positions[:-1] + 1))
+    group = np.concatenate(([0], np.cumsum(ends)[:-1]))
+    shift = 7 * (np.arange(raw.size) - starts[group])
+    values = np.add.reduceat((raw & 0x7F).astype(np.int64) << shift, starts)
+    return values[:count].astype(np.int32)
+
+
+def decode_packed_long_array(longs, bits: int, count: int):
+    """Litematica の BlockStates (ロングをまたいで詰められたビット列) をベクトル演算でデコードする。"""
+    words = np.asarray(longs, dtype=np.int64).view(np.uint64)
+    bit_index = np.arange(count, dtype=np.uint64) * np.uint64(bits)
+    word = bit_index >> np.uint64(6)
+    offset = bit_index & np.uint64(63)
+    values = words[word] >> offset
+    # 値が次のロングにまたがる場合は上位ビットを次のロングから取り出す
+    spills = offset + np.uint64(bits) > np.uint64(64)
+    if spills.any():
+        next_word = words[np.minimum(word[spills] + np.uint64(1), np.uint64(words.size - 1))]
+        values[spills] |= next_word << ((np.uint64(64) - offset[spills]) & np.uint64(63))
+    return (values & np.uint64((1 << bits) - 1)).astype(np.int32)
+
+
+def _load_java_nbt(binary_data: bytes):
+    import nbtlib  # Java版のNBT (ビッグエンディアン/gzip) の読み込みにのみ使用
+    if binary_data[:2] == b'\x1f\x8b':
+        binary_data = gzip.decompress(binary_data)
+    return nbtlib.File.parse(io.BytesIO(binary_data))
+
+
+def _read_sponge_schematic(root):
+    if "Schematic" in root:
+        root = root["Schematic"]
+    width, height, length = int(root["Width"]), int(root["Height"]), int(root["Length"])
+    if "Blocks" in root:  # Sponge v3
+        palette_tag, data = root["Blocks"]["Palette"], root["Blocks"]["Data"]
+    else:                 # Sponge v1/v2
+        palette_tag, data = root["Palette"], root["BlockData"]
+
+    palette = [None] * (max(int(v) for v in palette_tag.values()) + 1)
+    for state, index in palette_tag.items():
+        palette[int(index)] = parse_java_block_state(str(state))
+    # インデックスは (y * Length + z) * Width + x → (X, Y, Z) に並べ替える
+    indices = decode_varint_array(data, width * height * length).reshape(height, length, width)
+    return palette, indices.transpose(2, 0, 1)
+
+
+def _read_litematic(root):
+    regions = []
+    for region in root["Regions"].values():
+        position = [int(region["Position"][axis]) for axis in "xyz"]
+        size = [int(region["Size"][axis]) for axis in "xyz"]
+        # サイズが負の場合は Position から負の方向に伸びている
+        minimum = [p + s + 1 if s < 0 else p for p, s in zip(position, size)]
+        size = [abs(s) for s in size]
+        palette = [
+            (str(entry["Name"]), {str(k): str(v) for k, v in entry.get("Properties", {}).items()})
+            for entry in region["BlockStatePalette"]
+        ]
+        bits = max(2, (len(palette) - 1).bit_length())
+        count = size[0] * size[1] * size[2]
+        # インデックスは (y * SizeZ + z) * SizeX + x
+        indices = decode_packed_long_array(region["BlockStates"], bits, count).reshape(size[1], size[2], size[0])
+        regions.append((minimum, size, palette, indices.transpose(2, 0, 1)))
+
+    # 全リージョンを囲む箱に配置し、パレットは連結する
+    low = [min(r[0][a] for r in regions) for a in range(3)]
+    high = [max(r[0][a] + r[1][a] for r in regions) for a in range(3)]
+    palette, offset = [], 0
+    air_index = None
+    combined = None
+    for minimum, size, region_palette, indices in regions:
+        if combined is None:
+            palette.append(("minecraft:air", {}))
+            air_index = 0
+            offset = 1
+            combined = np.full([h - l for h, l in zip(high, low)], air_index, dtype=np.int32)
+        x0, y0, z0 = (minimum[a] - low[a] for a in range(3))
+        combined[x0:x0 + size[0], y0:y0 + size[1], z0:z0 + size[2]] = indices + offset
+        palette.extend(region_palette)
+        offset += len(region_palette)
+    return palette, combined
+
+
+def import_java_schematic(binary_data: bytes, schematic_format: str = None):
+    """
+    Java版の Sponge .schem または .litematic を Bedrock の構造物辞書に変換する。
+
+    Args:
+        binary_data (bytes): ファイルの中身 (gzip 圧縮のままでよい)
+        schematic_format (str): 'schem' / 'litematic' (省略時は中身から判定)
+
+    Returns:
+        tuple: (構造物辞書, レポート {'unmapped': {Javaステート: ブロック数}, 'dropped_properties': {...}})
+    """
+    root = _load_java_nbt(binary_data)
+    if schematic_format is None:
+        schematic_format = 'litematic' if "Regions" in root else 'schem'
+
+    if schematic_format == 'litematic':
+        java_palette, java_blocks = _read_litematic(root)
+    else:
+        java_palette, java_blocks = _read_sponge_schematic(root)
+
+    # Java のパレット番号 -> Bedrock のパレット番号 (末尾の要素は -1 = ヴォイド用)
+    # waterlogged などはレイヤー1 用のルックアップテーブルに入れる
+    report = {"unmapped": {}, "dropped_properties": {}}
+    palette, palette_index = [], {}
+    lut = np.full(len(java_palette) + 1, -1, dtype=np.int32)
+    lut_layer1 = np.full(len(java_palette) + 1, -1, dtype=np.int32)
+
+    def palette_number(entry):
+        key = palette_key(entry)
+        if key not in palette_index:
+            palette_index[key] = len(palette)
+            palette.append(entry)
+        return palette_index[key]
+
+    for java_index, java_state in enumerate(java_palette):
+        if java_state is None:
+            continue
+        entry = java_state_to_bedrock(java_state[0], java_state[1], report)
+        if entry is None:
+            continue
+        lut[java_index] = palette_number(entry)
+        layer1_entry = java_state_to_bedrock_layer1(java_state[1])
+        if layer1_entry is not None:
+            lut_layer1[java_index] = palette_number(layer1_entry)
+
+    blocks = lut[java_blocks]
+    blocks_layer1 = lut_layer1[java_blocks] if (lut_layer1 >= 0).any() else None
+
+    # 未対応のステートごとのブロック数を集計する
+    if report["unmapped"] or report["dropped_properties"]:
+        counts = np.bincount(java_blocks.ravel(), minlength=len(java_palette))
+        for java_index, java_state in enumerate(java_palette):
+            if java_state is None:
+                continue
+            name, properties = java_state
+            state = f"{name}[{','.join(f'{k}={v}' for k, v in properties.items())}]" if properties else name
+            if state in report["unmapped"]:
+                report["unmapped"][state] += int(counts[java_index])
+            for key in properties:
+                if f"{name}:{key}" in report["dropped_properties"]:
+                    report["dropped_properties"][f"{name}:{key}"] += int(counts[java_index])
+
+    print(f"Java_Schematic_Imported:{schematic_format}_Size:{blocks.shape}_Unmapped:{len(report['unmapped'])}")
+    return {
+        "size": blocks.shape,
+        "palette": palette,
+        "blocks": np.ascontiguousarray(blocks),
+        "blocks_layer1": np.ascontiguousarray(blocks_layer1) if blocks_layer1 is not None else None,
+        "block_position_data": {},
+        "entities": [],
+        "origin": [0, 0, 0],
+    }, report
+
+# --- 構造物のサムネイル (真上から見た色と高さの PNG) ---
+# レビュー時にゲームに読み込まなくても中身を確認できるように、各列の一番上の (空気でない) ブロックの
+# 地図色を高さで陰影付けした画像を作る。画像はファイル内容のハッシュでキャッシュする。
+BLOCK_COLORS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "block_colors.json")
+THUMBNAIL_CACHE_DIR = os.environ.get("THUMBNAIL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "structure_thumbnails"))
+THUMBNAIL_MAX_SCALE = 8  # 1ブロックあたりの最大ピクセル数
+
+with open(BLOCK_COLORS_FILE, encoding='utf-8') as _f:
+    BLOCK_COLORS = json.load(_f)
+print(f"Block_Colors_Loaded:{len(BLOCK_COLORS['colors'])}_blocks")
+
+
+def block_color(name: str):
+    """ブロック名の地図色 (R, G, B)。対応表にない場合は名前から決まる色を返す。"""
+    color = BLOCK_COLORS["colors"].get(name)
+    if color:
+        return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+    digest = hashlib.md5(name.encode('utf-8')).digest()
+    return tuple(64 + b // 2 for b in digest[:3])
+
+
+def top_down_heightmap(structure: dict):
+    """
+    各列 (X, Z) で一番上にある空気でないブロックを求める。
+
+    Returns:
+        tuple: (高さ int 配列 (X, Z), そのブロックのパレット番号 (X, Z), ブロックがある列のマスク (X, Z))
+    """
+    blocks = structure["blocks"]
+    palette = structure["palette"]
+    transparent = set(BLOCK_COLORS["transparent"])
+
+    # 末尾の要素は -1 (ヴォイド) 用
+    solid = np.zeros(len(palette) + 1, dtype=bool)
+    solid[:len(palette)] = [entry["name"] not in transparent for entry in palette]
+    filled = solid[blocks]
+
+    # Y を反転して argmax を取ると、最初に見つかる True が一番上のブロックになる
+    height = blocks.shape[1] - 1 - np.argmax(filled[:, ::-1, :], axis=1)
+    has_block = filled.any(axis=1)
+    top = np.take_along_axis(blocks, height[:, None, :], axis=1)[:, 0, :]
+    return height, np.where(has_block, top, -1), has_block
+
+
+def render_top_down(structure: dict, scale: int = 1):
+    """
+    構造物を真上から見た RGB 画像 (北が上: 行が Z、列が X) を作る。
+
+    Returns:
+        np.ndarray: uint8 配列 shape (Z * scale, X * scale, 3)
+    """
+    height, top, has_block = top_down_heightmap(structure)
+    palette = structure["palette"]
+
+    colors = np.zeros((len(palette) + 1, 3), dtype=np.float32)
+    for index, entry in enumerate(palette):
+        colors[index] = block_color(entry["name"])
+
+    # 低いブロックほど暗くする
+    shade = 0.55 + 0.45 * height / max(structure["blocks"].shape[1] - 1, 1)
+    image = (colors[top] * shade[..., None]).astype(np.uint8)
+    image[~has_block] = 0
+
+    image = image.transpose(1, 0, 2)
+    if scale > 1:
+        image = image.repeat(scale, axis=0).repeat(scale, axis=1)
+    return np.ascontiguousarray(image)
+
+
+def encode_png(rgb) -> bytes:
+    """uint8 の RGB 配列 (高さ, 幅, 3) を PNG にエンコードする (標準ライブラリの zlib のみ使用)。"""
+    height, width, _ = rgb.shape
+    # 各行の先頭にフィルタ種別 0 (None) のバイトを付ける
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgb.reshape(height, width * 3)
+
+    def chunk(kind: bytes, body: bytes):
+        return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body) & 0xFFFFFFFF)
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+
+def thumbnail_scale(scale) -> int:
+    """サムネイルの拡大率を 1 から THUMBNAIL_MAX_SCALE の範囲にそろえる。"""
+    return max(1, min(int(scale), THUMBNAIL_MAX_SCALE))
+
+
+def thumbnail_cache_path(content_hash: str, scale: int = 1):
+    return os.path.join(THUMBNAIL_CACHE_DIR, f"{content_hash}_{thumbnail_scale(scale)}.png")
+
+
+def render_structure_thumbnail(nbt_binary_data: bytes, scale: int = 1):
+    """
+    .mcstructure のサムネイル PNG を返す。同じ内容のファイルは再描画せずキャッシュを使う。
+
+    Returns:
+        tuple: (PNG バイト列, 内容のハッシュ (sha256))
+    """
+    scale = thumbnail_scale(scale)
+    content_hash = hashlib.sha256(nbt_binary_data).hexdigest()
+    cache_path = thumbnail_cache_path(content_hash, scale)
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            print(f"Thumbnail_Cache_Hit:{content_hash[:12]}")
+            return f.read(), content_hash
+
+    png = encode_png(render_top_down(decode_mcstructure(nbt_binary_data), scale))
+
+    # 書き込み途中のファイルを他のワーカーが読まないように、一時ファイルから置き換える
+    os.makedirs(THUMBNAIL_CACHE_DIR, exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(png)
+    os.replace(temp_path, cache_path)
+    print(f"Thumbnail_Rendered:{content_hash[:12]}_Bytes:{len(png)}")
+    return png, content_hash
 
 # --- GitHub Uploaderで使用するための統合関数 ---
 
@@ -87,7 +1185,10 @@ def process_structure_data(structure_name: str, client_data: dict, action: str):
     Args:
         structure_name (str): 構造物のファイル名 (例: 'my_house')
         client_data (dict): クライアントからのデータ（JSONまたはバイナリ情報）
-        action (str): 'to_json' (編集用) または 'to_nbt' (アップロード用)
+        action (str): 'to_json' (編集用)、'to_nbt' (アップロード用)、
+                      'to_tiles' (上限サイズを超える構造物のタイル分割)、
+                      'from_java' (Java版の .schem / .litematic の変換)、
+                      または 'thumbnail' (真上から見たサムネイル PNG)
         
     Returns:
         tuple: (結果データ, エラーメッセージ)
@@ -96,17 +1197,25 @@ def process_structure_data(structure_name: str, client_data: dict, action: str):
     if action == 'to_json':
         # クライアントが編集用にNBTを要求した場合
         binary_data = client_data.get('binary_content') # バイナリデータを受け取る
-        if not binary_data:
-             return None, "Missing binary content for NBT to JSON conversion."
-             
-        # 通常、GitHubから取得したBase64データをデコードする必要がある
+        if not binary_data and client_data.get('path'):
+            # バイナリが渡されていない場合はリポジトリのローカルミラーから読む
+            decoded_bytes = REPO_MIRROR.read_bytes(client_data['path'])
+            if decoded_bytes is None:
+                return None, f"Structure not found in repository: {client_data['path']}"
+        elif not binary_data:
+            return None, "Missing binary content for NBT to JSON conversion."
+        else:
+            # 通常、GitHubから取得したBase64データをデコードする必要がある
+            try:
+                decoded_bytes = base64.b64decode(binary_data)
+            except Exception:
+                return None, "Failed to decode base64 NBT data."
+
         try:
-             decoded_bytes = base64.b64decode(binary_data)
-        except Exception:
-             return None, "Failed to decode base64 NBT data."
+            return nbt_to_json(decoded_bytes, structure_name), None
+        except ValueError as e:
+            return None, str(e)
 
-        return nbt_to_json(decoded_bytes), None
-        
     elif action == 'to_nbt':
         # クライアントが編集後のJSONをアップロードした場合
         nbt_bytes, error = json_to_nbt(client_data)
@@ -123,13 +1232,78 @@ def process_structure_data(structure_name: str, client_data: dict, action: str):
             "is_binary": True
         }, None
 
+    elif action == 'to_tiles':
+        # 構造物ブロックの上限を超える .mcstructure をタイルに分割してアップロードする場合
+        binary_data = client_data.get('binary_content')
+        if not binary_data:
+            return None, "Missing binary content for structure tiling."
+        try:
+            structure = decode_mcstructure(base64.b64decode(binary_data))
+        except Exception as e:
+            return None, f"Failed to decode mcstructure: {e}"
+
+        tile_size = tuple(client_data.get('tile_size', STRUCTURE_MAX_SIZE))
+        folder = f"BP/structures/{structure_name}"
+        extras = bucket_tile_extras(structure, tile_size)
+
+        def iter_tile_files():
+            # タイルは取り出されるたびに1枚ずつエンコードする (全タイルを同時にメモリに持たない)
+            for (i, j, k), _, tile in iter_structure_tiles(structure, tile_size, extras):
+                yield {
+                    "path": f"{folder}/{structure_name}_{i}_{j}_{k}.mcstructure",
+                    "content_base64": base64.b64encode(encode_mcstructure(tile)).decode('utf-8'),
+                    "is_binary": True
+                }
+
+        # files はイテレータ。dropped はどのタイルにも入らなかったブロックエンティティ・エンティティ
+        return {"files": iter_tile_files(),
+                "manifest": structure_tile_manifest(structure, structure_name, tile_size, extras[2]),
+                "manifest_path": f"{folder}/{structure_name}.tiles.json",
+                "dropped": extras[2]}, None
+
+    elif action == 'from_java':
+        # Java版の .schem / .litematic を .mcstructure に変換してアップロードする場合
+        binary_data = client_data.get('binary_content')
+        if not binary_data:
+            return None, "Missing binary content for Java schematic import."
+        try:
+            structure, report = import_java_schematic(base64.b64decode(binary_data), client_data.get('format'))
+        except Exception as e:
+            return None, f"Failed to import Java schematic: {e}"
+
+        return {
+            "path": f"BP/structures/{structure_name}.mcstructure",
+            "content_base64": base64.b64encode(encode_mcstructure(structure)).decode('utf-8'),
+            "is_binary": True,
+            "report": report
+        }, None
+
+    elif action == 'thumbnail':
+        # .mcstructure の隣にコミットするサムネイル PNG を作る場合
+        binary_data = client_data.get('binary_content')
+        if not binary_data:
+            return None, "Missing binary content for structure thumbnail."
+        try:
+            png, _ = render_structure_thumbnail(base64.b64decode(binary_data), client_data.get('scale', 1))
+        except Exception as e:
+            return None, f"Failed to render structure thumbnail: {e}"
+
+        return {
+            "path": f"BP/structures/{structure_name}.png",
+            "content_base64": base64.b64encode(png).decode('utf-8'),
+            "is_binary": True
+        }, None
+
     return None, "Invalid action specified."
 
 # --- 実行例 ---
 
 # 1. NBT -> JSON 変換 (編集画面へ渡す)
-fake_binary = base64.b64encode(b'some_fake_nbt_data_01').decode('utf-8')
-json_for_edit, err1 = process_structure_data('simple_hut', {'binary_content': fake_binary}, 'to_json')
+hut_binary = base64.b64encode(encode_mcstructure({
+    "palette": [{"name": "minecraft:planks", "states": {"wood_type": "oak"}, "version": BEDROCK_BLOCK_VERSION}],
+    "blocks": np.zeros((2, 2, 2), dtype=np.int32),
+})).decode('utf-8')
+json_for_edit, err1 = process_structure_data('simple_hut', {'binary_content': hut_binary}, 'to_json')
 print(f"\nJSON_for_Edit_Success:{'structure_name' in json_for_edit if json_for_edit else False}")
 
 # 2. JSON -> NBT 変換 (GitHubへアップロード)
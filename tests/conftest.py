@@ -0,0 +1,58 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# テストはリポジトリ直下のモジュールを import する (パッケージにはしていない)
+sys.path.insert(0, ROOT)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# 設定はモジュールの import 時に環境変数から読まれるので、どのテストよりも先に決めておく。
+# GitHub の代わりに github_emulator.py を使い、ミラーやインデックスは一時ディレクトリに置く
+WORK_DIR = tempfile.mkdtemp(prefix="addon_tests_")
+EMULATOR_PORT = _free_port()
+EMULATOR_URL = f"http://127.0.0.1:{EMULATOR_PORT}"
+os.environ.update({
+    "GITHUB_API_BASE": EMULATOR_URL,
+    "GITHUB_TOKEN": "test-token",
+    "REPO_MIRROR_DIR": os.path.join(WORK_DIR, "mirror"),
+    "PACK_INDEX_DB": os.path.join(WORK_DIR, "pack_index.sqlite3"),
+    "UPLOAD_SESSION_DIR": os.path.join(WORK_DIR, "uploads"),
+    "THUMBNAIL_CACHE_DIR": os.path.join(WORK_DIR, "thumbnails"),
+})
+
+
+@pytest.fixture(scope="session")
+def github_emulator():
+    """GitHub エミュレータを起動し、その URL を返す (使うテストがあるときだけ起動する)。"""
+    with open(os.path.join(WORK_DIR, "emulator.log"), "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "github_emulator.py"), "--port", str(EMULATOR_PORT),
+             "--store-dir", os.path.join(WORK_DIR, "emulator")],
+            stdout=log, stderr=subprocess.STDOUT, cwd=ROOT)
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f"{EMULATOR_URL}/_emulator/stats", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        else:
+            pytest.fail("github_emulator.py did not start")
+        yield EMULATOR_URL
+    finally:
+        process.terminate()
+        process.wait()
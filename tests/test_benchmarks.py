@@ -0,0 +1,11 @@
+import pytest
+
+from benchmarks import BENCHMARKS, run_benchmarks
+
+
+@pytest.mark.parametrize("name", list(BENCHMARKS))
+def test_benchmark_runs_at_small_scale(name):
+    # 比較対象と結果が一致することは各ケースの中で確かめている
+    report = run_benchmarks([name], scale=0.01)[name]
+    timings = [value for value in report.values() if isinstance(value, dict) and "seconds" in value]
+    assert timings and all(value["seconds"] >= 0 and value["peak_mb"] >= 0 for value in timings)
@@ -0,0 +1,70 @@
+import pytest
+
+from molang import parse_molang, tokenize, validate_molang_document
+
+
+def test_tokenize_positions():
+    assert tokenize("q.x >= 1.5f") == [("name", "q", 0), ("op", ".", 1), ("name", "x", 2), ("op", ">=", 4),
+                                       ("number", "1.5f", 7), ("end", None, 11)]
+
+
+@pytest.mark.parametrize("expression,ast", [
+    ("1 + 2 * 3", ("binary", "+", ("num", 1.0), ("binary", "*", ("num", 2.0), ("num", 3.0)))),
+    ("Query.Is_Baby ? 0.5 : 1", ("ternary", ("name", ("query", "is_baby")), ("num", 0.5), ("num", 1.0))),
+    ("math.cos(q.anim_time * 38.17)",
+     ("call", ("math", "cos"), (("binary", "*", ("name", ("q", "anim_time")), ("num", 38.17)),))),
+    ("v.a ?? v.b ?? 1", ("binary", "??", ("name", ("v", "a")), ("binary", "??", ("name", ("v", "b")), ("num", 1.0)))),
+    ("-!true", ("unary", "-", ("unary", "!", ("num", 1.0)))),
+    ("v.x = 1; return v.x;", ("statements", (("assign", ("name", ("v", "x")), ("num", 1.0)),
+                                             ("return", ("name", ("v", "x")))))),
+    ("array.skins[q.variant]", ("index", ("name", ("array", "skins")), ("name", ("q", "variant")))),
+])
+def test_parse(expression, ast):
+    assert parse_molang(expression) == (ast, None)
+
+
+@pytest.mark.parametrize("expression,message", [
+    ("1 +", "式が途中で終わっています"),
+    ("query.is_baby)", "予期しない ')'"),
+    ("is_baby", "不明な名前 'is_baby'"),
+    ("foo.bar", "不明な名前空間 'foo'"),
+    ("math.tan(1)", "不明な関数 'math.tan'"),
+    ("q.x = 1", "代入できるのは variable / temp の変数だけです"),
+    ("q.x # 1", "使えない文字 '#'"),
+])
+def test_syntax_errors(expression, message):
+    ast, error = parse_molang(expression)
+    assert ast is None and message in error
+
+
+def test_results_are_cached():
+    parse_molang.cache_clear()
+    first = parse_molang("math.sin(q.life_time)")
+    assert parse_molang("math.sin(q.life_time)") is first
+    assert parse_molang.cache_info().hits == 1
+
+
+def test_validate_animation_document_reports_paths():
+    document = {"animations": {"animation.test.walk": {
+        "anim_time_update": "q.anim_time + q.delta_time",
+        "bones": {"leg": {"rotation": ["math.cos(q.anim_time * 38.17) * 80.0", 0, 0]},
+                  "arm": {"position": {"0.5": {"pre": [0, "q.x +", 0]}}}},
+        "timeline": {"0.0": ["v.step = 1;", "v.step = ;"]},
+    }}}
+    found = validate_molang_document("RP/animations", document)
+    assert found["expressions"] == 5
+    assert [error["path"] for error in found["errors"]] == [
+        "animations/animation.test.walk/bones/arm/position/0.5/pre/[1]",
+        "animations/animation.test.walk/timeline/0.0/[1]",
+    ]
+
+
+def test_validate_controller_transitions():
+    document = {"animation_controllers": {"controller.animation.test": {"states": {"default": {
+        "animations": ["walk", {"look": "q.is_looking"}],
+        "transitions": [{"attack": "v.attack_time > 0"}, {"idle": "v.attack_time >"}],
+    }}}}}
+    found = validate_molang_document("RP/animation_controllers", document)
+    assert found["expressions"] == 3
+    assert [error["path"] for error in found["errors"]] == [
+        "animation_controllers/controller.animation.test/states/default/transitions/[1]/idle"]
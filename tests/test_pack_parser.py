@@ -0,0 +1,43 @@
+import io
+import json
+import zipfile
+
+from github_uploader import prepare_files_for_commit
+from pack_parser import iter_pack_entries, parse_pack_file_to_client_data
+
+
+def _zip(files: dict) -> zipfile.ZipFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for path, content in files.items():
+            zf.writestr(path, content)
+    buffer.seek(0)
+    return zipfile.ZipFile(buffer)
+
+
+ENTITY = json.dumps({"minecraft:entity": {
+    "description": {"identifier": "test:a"},
+    "components": {"minecraft:health": {"value": 10}, "minecraft:movement": {"value": 0.25},
+                   "minecraft:type_family": {"family": ["mob"]}},
+}})
+
+
+def test_entities_are_mapped_to_records():
+    client_input = parse_pack_file_to_client_data(_zip({"BP/entities/a.json": ENTITY}))
+    mob = client_input["mobs"]["a"]
+    assert (mob["hp"], mob["speed"], mob["families"]) == (10, 0.25, ["mob"])
+
+
+def test_invalid_json_is_a_validation_error():
+    zf = _zip({"BP/entities/a.json": ENTITY, "BP/entities/broken.json": '{"minecraft:entity": {'})
+    entries = list(iter_pack_entries(zf))
+    assert ('parse_errors', 'BP/entities/broken.json') in [(key, name) for key, name, _ in entries]
+
+    files, errors = prepare_files_for_commit(parse_pack_file_to_client_data(zf))
+    assert files == []
+    assert [(error["key"], error["name"]) for error in errors] == [('parse_errors', 'BP/entities/broken.json')]
+
+
+def test_invalid_manifest_is_a_validation_error():
+    _, errors = prepare_files_for_commit(parse_pack_file_to_client_data(_zip({"BP/manifest.json": "{"})))
+    assert [error["name"] for error in errors] == ['BP/manifest.json']
@@ -0,0 +1,89 @@
+import base64
+import io
+import json
+import uuid
+import zipfile
+
+import numpy as np
+import requests
+
+from github_uploader import GITHUB_OWNER, GITHUB_REPO
+from main import app
+from pack_pipeline import run_pack_pipeline
+from structure import BEDROCK_BLOCK_VERSION, encode_mcstructure
+
+STRUCTURE_PATH = "BP/structures/ruins/tower.mcstructure"
+
+
+def _structure(reverse_palette=False):
+    palette = [
+        {"name": "minecraft:stone", "states": {"stone_type": "stone"}, "version": BEDROCK_BLOCK_VERSION},
+        {"name": "minecraft:planks", "states": {"wood_type": "oak"}, "version": BEDROCK_BLOCK_VERSION},
+    ]
+    blocks = np.full((2, 3, 2), -1, dtype=np.int32)
+    blocks[:, 0, :] = 0
+    blocks[0, 1, 0] = 1
+    if reverse_palette:
+        # 書き出し直したときのようにパレットの順番だけが違う (ブロックは同じ)
+        palette = palette[::-1]
+        blocks = np.where(blocks >= 0, 1 - blocks, blocks).astype(np.int32)
+    return {"palette": palette, "blocks": blocks, "origin": [0, 64, 0]}
+
+
+def _pack(structure_bytes):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("BP/manifest.json", json.dumps({
+            "format_version": 2,
+            "header": {"name": "ruins", "uuid": str(uuid.uuid4()), "version": [1, 0, 0]},
+            "modules": [{"type": "data", "uuid": str(uuid.uuid4()), "version": [1, 0, 0]}]}))
+        zf.writestr(STRUCTURE_PATH, structure_bytes)
+    buf.seek(0)
+    return zipfile.ZipFile(buf)
+
+
+def _remote_file(emulator_url, path):
+    api = f"{emulator_url}/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git"
+    tree = requests.get(f"{api}/trees/main?recursive=1").json()
+    for entry in tree.get("tree", []):
+        if entry["path"] == path:
+            return base64.b64decode(requests.get(f"{api}/blobs/{entry['sha']}").json()["content"])
+    return None
+
+
+def test_same_structure_uploaded_twice_is_not_committed_again(github_emulator):
+    original = encode_mcstructure(_structure())
+    result, errors, _ = run_pack_pipeline(_pack(original), "Add tower")
+    assert errors == [] and result["success"]
+    assert _remote_file(github_emulator, STRUCTURE_PATH) == original
+
+    # 中身が同じで、バイト列だけが違う構造物をもう一度アップロードする
+    reexported = encode_mcstructure(_structure(reverse_palette=True))
+    assert reexported != original
+    events = []
+    result, errors, _ = run_pack_pipeline(_pack(reexported), "Re-export tower", progress=events.append)
+    assert errors == [] and result["success"]
+    uploads = [event for event in events if event["event"] == "uploaded" and event["path"] == STRUCTURE_PATH]
+    assert len(uploads) == 1 and uploads[0]["deduplicated"]
+    assert _remote_file(github_emulator, STRUCTURE_PATH) == original
+
+
+def test_broken_structure_is_a_validation_error(github_emulator):
+    result, errors, _ = run_pack_pipeline(_pack(b"not nbt"), "Add broken tower")
+    assert not result["success"]
+    assert [error["key"] for error in errors] == ["structures"]
+    assert errors[0]["name"] == "ruins/tower"
+
+
+def test_structure_thumbnail_is_committed_from_the_upload_form(github_emulator):
+    client = app.test_client()
+    structure = encode_mcstructure(_structure())
+    pack = io.BytesIO()
+    with zipfile.ZipFile(pack, "w") as zf:
+        zf.writestr("BP/structures/ruins/gate.mcstructure", structure)
+    response = client.post("/", data={"pack_file": (io.BytesIO(pack.getvalue()), "gate.mcpack"),
+                                      "commit_message": "Add gate", "structure_thumbnails": "1"})
+    assert response.status_code == 200, response.get_json()
+    thumbnail = _remote_file(github_emulator, "BP/structures/ruins/gate.png")
+    assert thumbnail is not None and thumbnail.startswith(b"\x89PNG")
+    assert _remote_file(github_emulator, "BP/structures/ruins/gate.mcstructure") == structure
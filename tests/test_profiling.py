@@ -0,0 +1,45 @@
+import threading
+import time
+
+from profiling import SamplingProfiler, request_thread_prefix
+
+
+def _busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def _request(stop, started, result):
+    # 1つのリクエスト: プロファイラを開始して、自分の接頭辞のスレッドを起動する
+    profiler = SamplingProfiler(0.002)
+    profiler.start()
+    prefix = request_thread_prefix()
+    workers = [threading.Thread(target=_busy, args=(stop,), name=f"{prefix}format") for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    started.release()
+    stop.wait()
+    for worker in workers:
+        worker.join()
+    profiler.stop()
+    result[prefix] = {thread_name for thread_name, _ in profiler.stacks}
+
+
+def test_profiler_samples_only_its_own_request_threads():
+    stop = threading.Event()
+    started = threading.Semaphore(0)
+    result = {}
+    requests = [threading.Thread(target=_request, args=(stop, started, result)) for _ in range(2)]
+    for request in requests:
+        request.start()
+    for _ in requests:
+        started.acquire()
+    time.sleep(0.1)
+    stop.set()
+    for request in requests:
+        request.join()
+
+    assert len(result) == 2
+    for prefix, thread_names in result.items():
+        assert f"{prefix}format" in thread_names
+        assert thread_names <= {"request", f"{prefix}format"}
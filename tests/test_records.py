@@ -0,0 +1,51 @@
+import pickle
+
+import pytest
+
+from records import BoneSpec, GeometrySpec, MobSpec, as_plain, to_record
+
+
+def test_record_behaves_like_a_read_only_mapping():
+    mob = MobSpec.from_dict({"identifier": "test:a", "hp": 10, "speed": None, "new_rule": [1]})
+    assert mob["hp"] == 10 and mob.get("hp") == 10
+    # None は正当な値、未設定のキーは存在しない
+    assert "speed" in mob and mob["speed"] is None
+    assert "families" not in mob and mob.get("families", []) == []
+    with pytest.raises(KeyError):
+        mob["families"]
+    # ルールに後から追加されたキーは extra に入る
+    assert mob["new_rule"] == [1]
+    assert list(mob) == ["identifier", "hp", "speed", "new_rule"] and len(mob) == 4
+    assert dict(mob) == {"identifier": "test:a", "hp": 10, "speed": None, "new_rule": [1]}
+    with pytest.raises(TypeError):
+        mob["hp"] = 20
+
+
+def test_records_do_not_carry_a_dict():
+    mob = MobSpec(identifier="test:a", hp=10)
+    assert not hasattr(mob, "__dict__")
+    with pytest.raises(AttributeError):
+        mob.unknown = 1
+
+
+def test_nested_records_and_plain_conversion():
+    data = {"identifiers": ["geometry.a"], "texture_width": 64,
+            "bone_data": [{"name": "body", "pivot": [0, 0, 0], "origin": [1, 2, 3]}, "not a bone"]}
+    geometry = GeometrySpec.from_dict(data)
+    assert isinstance(geometry["bone_data"][0], BoneSpec)
+    assert geometry["bone_data"][0]["origin"] == [1, 2, 3]
+    assert as_plain(geometry) == data
+    assert geometry.to_dict() == data
+    assert as_plain([geometry]) == [data]
+
+
+def test_to_record_keeps_unmapped_data():
+    assert isinstance(to_record("mobs", {"hp": 1}), MobSpec)
+    assert to_record("lang", {"a": "b"}) == {"a": "b"}
+    assert to_record("mobs", None) is None
+
+
+def test_records_pickle_for_process_pools():
+    mob = MobSpec.from_dict({"identifier": "test:a", "hp": 10, "extra_key": True})
+    restored = pickle.loads(pickle.dumps(mob))
+    assert dict(restored) == dict(mob)
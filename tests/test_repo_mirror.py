@@ -0,0 +1,35 @@
+import json
+import multiprocessing
+import os
+
+from repo_mirror import RepoMirror, git_blob_sha
+
+
+def _record_many(root: str, worker: int, count: int):
+    mirror = RepoMirror(root)
+    for i in range(count):
+        mirror.record_file(f"w{worker}/f{i}.txt", f"{worker}-{i}".encode())
+
+
+def test_record_files_from_several_processes_keeps_every_entry(tmp_path):
+    # 複数のワーカープロセスが同時にインデックスを更新しても、互いのエントリを上書きしない
+    processes = [multiprocessing.Process(target=_record_many, args=(str(tmp_path), worker, 30)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    with open(tmp_path / "index.json", encoding='utf-8') as f:
+        files = json.load(f)["files"]
+    assert len(files) == 120
+    assert files["w3/f29.txt"]["sha"] == git_blob_sha(b"3-29")
+
+
+def test_read_bytes_without_fetch(tmp_path):
+    mirror = RepoMirror(str(tmp_path))
+    mirror.record_file("BP/a.json", b"{}")
+    assert mirror.read_bytes("BP/a.json", fetch=False) == b"{}"
+    assert mirror.read_bytes("BP/missing.json", fetch=False) is None
+    assert mirror.known_sha("BP/a.json") == git_blob_sha(b"{}")
+    assert os.path.exists(mirror.local_file("BP/a.json", fetch=False))
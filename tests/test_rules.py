@@ -0,0 +1,83 @@
+import pytest
+
+from pack_parser import COMPILED_RULES, CompiledRuleSet, parse_rule
+
+DOCUMENT = {
+    "minecraft:entity": {
+        "description": {"identifier": "test:a"},
+        "components": {
+            "minecraft:health": {"value": 10},
+            "minecraft:behavior.float": {"priority": 0},
+            "minecraft:behavior.panic": {"priority": 1, "speed_multiplier": 1.25},
+            "minecraft:physics": {},
+        },
+    },
+    "pools": [
+        {"rolls": 1, "entries": [{"name": "minecraft:apple"}, {"name": "minecraft:stick"}]},
+        {"rolls": 2, "entries": [{"type": "empty"}, {"name": "minecraft:bone"}]},
+    ],
+}
+
+
+@pytest.mark.parametrize("rule,segments", [
+    ("a/b", [('key', 'a'), ('key', 'b')]),
+    ("a/*", [('key', 'a'), ('any_key', None)]),
+    ("a/minecraft:behavior.*", [('key', 'a'), ('prefix', 'minecraft:behavior.')]),
+    ("pools/[]/rolls", [('key', 'pools'), ('any_index', None), ('key', 'rolls')]),
+    ("pools/[1]", [('key', 'pools'), ('index', 1)]),
+    (["a", "*"], [('key', 'a'), ('key', '*')]),
+])
+def test_parse_rule(rule, segments):
+    assert parse_rule(rule) == segments
+
+
+def test_literal_rules_share_one_walk():
+    matcher = CompiledRuleSet({
+        "identifier": "minecraft:entity/description/identifier",
+        "hp": "minecraft:entity/components/minecraft:health/value",
+        "missing": "minecraft:entity/components/minecraft:movement/value",
+    })
+    assert matcher.extract(DOCUMENT) == {"identifier": "test:a", "hp": 10}
+
+
+def test_prefix_and_any_key_capture_by_key():
+    matcher = CompiledRuleSet({
+        "behaviors": "minecraft:entity/components/minecraft:behavior.*",
+        "priorities": "minecraft:entity/components/*/priority",
+    })
+    assert matcher.extract(DOCUMENT) == {
+        "behaviors": {"minecraft:behavior.float": {"priority": 0},
+                      "minecraft:behavior.panic": {"priority": 1, "speed_multiplier": 1.25}},
+        "priorities": {"minecraft:behavior.float": 0, "minecraft:behavior.panic": 1},
+    }
+
+
+def test_array_projection_keeps_nesting():
+    matcher = CompiledRuleSet({"names": "pools/[]/entries/[]/name", "first_rolls": "pools/[0]/rolls"})
+    # 要素に値が無い場合 ({"type": "empty"}) は詰めて並べる
+    assert matcher.extract(DOCUMENT) == {
+        "names": [["minecraft:apple", "minecraft:stick"], ["minecraft:bone"]],
+        "first_rolls": 1,
+    }
+
+
+def test_legacy_rule_list_is_exact_match():
+    matcher = CompiledRuleSet([{"target_key": "hp", "path": ["minecraft:entity", "components", "minecraft:health",
+                                                             "value"]}])
+    assert matcher.extract(DOCUMENT) == {"hp": 10}
+
+
+def test_extract_into_partial_result():
+    # ストリーミング抽出と同じく、部分木ごとに out へ貯めてから finalize する
+    matcher = CompiledRuleSet({"names": "pools/[]/entries/[]/name"})
+    raw = {}
+    pools = matcher.step_key("pools", matcher.initial_states())
+    for index, states in matcher.step_list(len(DOCUMENT["pools"]), pools).items():
+        matcher.extract(DOCUMENT["pools"][index], states, raw)
+    assert matcher.finalize(raw) == matcher.extract(DOCUMENT)
+
+
+def test_mapping_rules_file_compiles_every_section():
+    assert "BP/entities" in COMPILED_RULES
+    for compiled in COMPILED_RULES.values():
+        assert compiled["file_key"] and compiled["matcher"].target_keys
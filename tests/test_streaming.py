@@ -0,0 +1,80 @@
+import io
+import json
+import time
+
+import pytest
+
+from pack_parser import COMPILED_RULES, CompiledRuleSet, StreamingExtractor, _FLAT_GROUP_RE, stream_extract
+
+
+def _entity(index: int):
+    return {
+        "format_version": "1.16.0",
+        "minecraft:entity": {
+            "description": {"identifier": f"test:mob{index}", "scripts": {"animate": [{"walk": "q.is_moving"}]}},
+            "component_groups": {
+                "baby": {"minecraft:scale": {"value": 0.5}, "minecraft:ageable": {"grow_up": {"event": "grow"}}},
+                "adult": {"minecraft:loot": {"table": "loot_tables/entities/mob.json"}},
+            },
+            "components": {
+                "minecraft:health": {"value": 10 + index, "max": 20},
+                "minecraft:movement": {"value": 0.25},
+                "minecraft:type_family": {"family": ["mob", "test"]},
+                "minecraft:behavior.random_stroll": {"priority": 6, "speed_multiplier": 1.0},
+                "minecraft:damage_sensor": {"triggers": [{"on_damage": {"filters": {"all_of": [
+                    {"test": "has_damage", "value": "fall"}, {"test": "is_family", "subject": "other", "value": "x"}]}},
+                    "deals_damage": False}]},
+            },
+            "events": {"grow": {"add": {"component_groups": ["adult"]}, "remove": {"component_groups": ["baby"]}}},
+        },
+    }
+
+
+def _geometry():
+    return {
+        "format_version": "1.12.0",
+        "minecraft:geometry": [{
+            "description": {"identifier": "geometry.test", "texture_width": 64, "texture_height": 32},
+            "bones": [{"name": f"bone{i}", "pivot": [0, i, 0], "cubes": [
+                {"origin": [i, 0, 0], "size": [1, 1, 1], "uv": {"north": {"uv": [0, 0], "uv_size": [1, 1]}}}
+                for _ in range(5)]} for i in range(30)],
+        }],
+    }
+
+
+@pytest.mark.parametrize("indent", [None, 1, 2, 4, "\t"])
+@pytest.mark.parametrize("folder,document", [
+    ("BP/entities", _entity(3)),
+    ("RP/models/entity", _geometry()),
+])
+def test_stream_extract_matches_json_load(folder, document, indent):
+    matcher = COMPILED_RULES[folder]["matcher"]
+    text = json.dumps(document, indent=indent)
+    expected = matcher.extract(json.loads(text))
+
+    started = time.perf_counter()
+    result = stream_extract(io.BytesIO(text.encode("utf-8")), matcher)
+    assert time.perf_counter() - started < 2
+    assert result == expected
+
+
+def test_stream_extract_across_chunk_boundaries(monkeypatch):
+    # チャンクの境界が文字列・括弧の途中に来ても同じ結果になる
+    monkeypatch.setattr(StreamingExtractor, "CHUNK_SIZE", 7)
+    matcher = COMPILED_RULES["BP/entities"]["matcher"]
+    text = json.dumps(_entity(1), indent=2)
+    assert stream_extract(io.BytesIO(text.encode("utf-8")), matcher) == matcher.extract(json.loads(text))
+
+
+def test_flat_group_failure_is_linear():
+    # 入れ子の括弧で失敗するマッチが要素数に対して指数時間にならない
+    started = time.perf_counter()
+    assert _FLAT_GROUP_RE.match("[" + " 1," * 200 + "{") is None
+    assert time.perf_counter() - started < 0.5
+
+
+def test_wildcard_rules_skip_nested_values():
+    matcher = CompiledRuleSet({"names": "bones/*/name"})
+    document = {"skip": {"a": [[1, {"b": [2, 3]}], "x"]}, "bones": [{"name": "a", "cubes": [[{}]]}, {"name": "b"}]}
+    text = json.dumps(document, indent=2)
+    assert stream_extract(io.BytesIO(text.encode("utf-8")), matcher) == matcher.extract(document)
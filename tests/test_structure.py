@@ -0,0 +1,130 @@
+import json
+
+import numpy as np
+import pytest
+
+from structure import (BEDROCK_BLOCK_VERSION, NBTIntArray, bucket_tile_extras, decode_mcstructure, encode_mcstructure,
+                       iter_structure_tiles, json_to_nbt, nbt_to_json, stitch_structure_tiles, write_structure_tiles)
+
+
+def _structure():
+    blocks = np.full((3, 4, 5), -1, dtype=np.int32)
+    blocks[0, 0, :] = 0
+    blocks[1, 2, 3] = 1
+    blocks[2, 3, 4] = 2
+    layer1 = np.full(blocks.shape, -1, dtype=np.int32)
+    layer1[1, 2, 3] = 3
+    return {
+        "palette": [
+            {"name": "minecraft:stone", "states": {"stone_type": "granite"}, "version": BEDROCK_BLOCK_VERSION},
+            {"name": "minecraft:chest", "states": {"facing_direction": 2, "open_bit": np.int8(0)},
+             "version": BEDROCK_BLOCK_VERSION},
+            {"name": "custom:odd", "states": {"level": np.int16(7), "big": np.int64(2 ** 40)}, "version": 1},
+            {"name": "minecraft:water", "states": {"liquid_depth": 0}, "version": BEDROCK_BLOCK_VERSION},
+        ],
+        "blocks": blocks,
+        "blocks_layer1": layer1,
+        "block_position_data": {
+            str(np.ravel_multi_index((1, 2, 3), blocks.shape)): {
+                "block_entity_data": {"id": "Chest", "Items": [{"Name": "minecraft:apple", "Count": np.int8(3)}],
+                                      "pos": np.array([1, 2, 3], dtype=np.int32).view(NBTIntArray)}},
+        },
+        "entities": [{"identifier": "minecraft:pig", "Pos": [np.float32(1.5), np.float32(0.0), np.float32(2.5)],
+                      "UniqueID": np.int64(-42)}],
+        "origin": [10, 64, -3],
+    }
+
+
+def test_nbt_to_json_round_trip_is_byte_identical():
+    original = encode_mcstructure(_structure())
+    editable = nbt_to_json(original, "chest_room")
+    # 編集画面に渡せるように JSON として往復できる
+    editable = json.loads(json.dumps(editable))
+    assert editable["size"] == [3, 4, 5]
+    assert editable["block_palette"]["1"]["states"] == {"facing_direction": 2, "open_bit": False}
+    assert "states_nbt" in editable["block_palette"]["2"]
+
+    rebuilt, error = json_to_nbt(editable)
+    assert error is None
+    assert rebuilt == original
+
+
+def test_edit_through_json_keeps_other_blocks():
+    editable = nbt_to_json(encode_mcstructure(_structure()), "chest_room")
+    editable["block_entries"].append({"position": [2, 0, 0], "state_index": 0})
+    rebuilt, error = json_to_nbt(editable)
+    assert error is None
+    decoded = decode_mcstructure(rebuilt)
+    assert decoded["blocks"][2, 0, 0] == 0
+    assert decoded["blocks"][1, 2, 3] == 1 and decoded["blocks_layer1"][1, 2, 3] == 3
+    assert len(decoded["entities"]) == 1 and decoded["block_position_data"]
+
+
+@pytest.mark.parametrize("change,message", [
+    ({"size": [0, 1, 1]}, "Invalid structure size"),
+    ({"block_entries": [{"position": [9, 0, 0], "state_index": 0}]}, "outside"),
+    ({"block_entries": [{"position": [0, 0, 0], "state_index": 99}]}, "Unknown state_index"),
+])
+def test_json_to_nbt_rejects_invalid_input(change, message):
+    editable = nbt_to_json(encode_mcstructure(_structure()), "chest_room")
+    editable.update(change)
+    nbt_bytes, error = json_to_nbt(editable)
+    assert nbt_bytes is None and message in error
+
+
+def test_nbt_to_json_rejects_garbage():
+    with pytest.raises(ValueError):
+        nbt_to_json(b"not an nbt file")
+
+
+def _tiled_structure():
+    # タイル分割は decode_mcstructure の結果と同じく size を持つ構造物を受け取る
+    structure = _structure()
+    structure["size"] = structure["blocks"].shape
+    return structure
+
+
+def test_tiles_stitch_back_to_the_original(tmp_path):
+    structure = _tiled_structure()
+    manifest = write_structure_tiles(structure, "chest_room", str(tmp_path), tile_size=(2, 3, 2))
+    assert len(manifest["tiles"]) == 2 * 2 * 3
+    assert json.loads((tmp_path / "chest_room.tiles.json").read_text(encoding="utf-8")) == manifest
+    assert "dropped" not in manifest
+
+    stitched = stitch_structure_tiles(manifest, lambda name: (tmp_path / name).read_bytes())
+    palette = [entry["name"] for entry in structure["palette"]]
+    names = np.array([entry["name"] for entry in stitched["palette"]] + ["void"])
+    assert (names[stitched["blocks"]] == np.array(palette + ["void"])[structure["blocks"]]).all()
+    assert (names[stitched["blocks_layer1"]] == np.array(palette + ["void"])[structure["blocks_layer1"]]).all()
+    assert list(stitched["block_position_data"]) == list(structure["block_position_data"])
+    assert [entity["identifier"] for entity in stitched["entities"]] == ["minecraft:pig"]
+    assert stitched["origin"] == structure["origin"]
+
+
+def test_tiles_keep_only_their_own_palette_entries():
+    tiles = {index: tile for index, _, tile in iter_structure_tiles(_tiled_structure(), tile_size=(1, 4, 5))}
+    assert [entry["name"] for entry in tiles[(0, 0, 0)]["palette"]] == ["minecraft:stone"]
+    assert [entry["name"] for entry in tiles[(1, 0, 0)]["palette"]] == ["minecraft:chest", "minecraft:water"]
+    assert tiles[(1, 0, 0)]["blocks_layer1"][0, 2, 3] == 1
+    assert tiles[(2, 0, 0)]["origin"] == [12, 64, -3]
+
+
+def test_tiles_from_memmap(tmp_path):
+    structure = _tiled_structure()
+    blocks = np.memmap(tmp_path / "blocks.bin", dtype=np.int32, mode="w+", shape=structure["blocks"].shape)
+    blocks[:] = structure["blocks"]
+    structure["blocks"] = blocks
+    manifest = write_structure_tiles(structure, "mapped", str(tmp_path / "out"), tile_size=(3, 4, 5))
+    decoded = decode_mcstructure((tmp_path / "out" / manifest["tiles"][0]["file"]).read_bytes())
+    assert decoded["blocks"].tolist() == _tiled_structure()["blocks"].tolist()
+
+
+def test_extras_outside_the_structure_are_reported():
+    structure = _tiled_structure()
+    structure["block_position_data"]["999"] = {"block_entity_data": {"id": "Lost"}}
+    structure["entities"].append({"identifier": "minecraft:ghost", "Pos": [float("nan"), 0.0, 0.0]})
+    positions, entities, dropped = bucket_tile_extras(structure, tile_size=(2, 3, 2))
+    assert dropped == {"block_position_data": ["999"], "entities": ["minecraft:ghost"]}
+    # タイル内のインデックスに変換される ((1, 2, 3) はタイル (0, 0, 1) の (1, 2, 1))
+    assert list(positions[(0, 0, 1)]) == [str((1 * 3 + 2) * 2 + 1)]
+    assert [entity["identifier"] for tile in entities.values() for entity in tile] == ["minecraft:pig"]
@@ -0,0 +1,278 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+print("Upload_Sessions_Module_Loaded")
+
+# --- 再開可能な分割アップロード ---
+# 数百MBのリソースパックを1回の multipart POST で送ると、回線が切れたときに最初からやり直しになる。
+# そこで、セッションを作ってからチャンクをオフセット付きで PUT し、全て揃ったら finalize する:
+#
+#   POST   /uploads                    {"filename", "size", "commit_message"?, "sha256"?} -> upload_id
+#   PUT    /uploads/<id>?offset=N      ボディがチャンク、X-Chunk-Sha256 にチャンクの SHA-256 (16進)
+#   GET    /uploads/<id>               受信済み / 未受信の範囲 (途中から再開するときに使う)
+#   POST   /uploads/<id>/finalize      {"commit_message"?, "structure_thumbnails"?} 通常のパイプラインで解析・コミットする
+#   DELETE /uploads/<id>               セッションを破棄する
+#
+# チャンクは受信しながらセッション内の一時ファイルに書き (全体をメモリに持たない)、チェックサムが
+# 一致した場合だけ、未受信の部分をディスク上のファイルの該当位置にコピーして受信済みの範囲に加える。
+# チャンクの順番は問わず、同じ範囲を送り直してもよい。
+# gunicorn の複数ワーカーが同じセッションのチャンクを受けても壊れないよう、状態の更新はファイルロックで守る。
+#
+#   <UPLOAD_SESSION_DIR>/<id>/data      パック本体 (作成時に size まで確保する)
+#   <UPLOAD_SESSION_DIR>/<id>/meta.json ファイル名・サイズ・受信済みの範囲など
+UPLOAD_SESSION_DIR = os.environ.get("UPLOAD_SESSION_DIR", os.path.join(tempfile.gettempdir(), "pack_uploads"))
+UPLOAD_SESSION_TTL = int(os.environ.get("UPLOAD_SESSION_TTL", 24 * 60 * 60))
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+# クライアントに勧めるチャンクサイズ (MAX_CONTENT_LENGTH より小さくする)
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_READ_SIZE = 1024 * 1024
+UPLOAD_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class UploadError(Exception):
+    """セッションの操作に失敗した。status は返すべき HTTP ステータス。"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def merge_ranges(ranges: list) -> list:
+    """[[開始, 終了), ...] を並べ替えて、重なり・隣接している範囲をまとめる。"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(ranges: list, size: int) -> list:
+    """受信済みの範囲 (merge_ranges 済み) から、まだ受信していない範囲を求める。"""
+    missing, position = [], 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+
+class UploadSessionStore:
+    """分割アップロードのセッションをディスク上で管理する。"""
+
+    def __init__(self, root: str = UPLOAD_SESSION_DIR, ttl: int = UPLOAD_SESSION_TTL,
+                 max_bytes: int = UPLOAD_MAX_BYTES):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def _session_dir(self, upload_id: str) -> str:
+        if not UPLOAD_ID_PATTERN.fullmatch(upload_id or ""):
+            raise UploadError("アップロードIDが不正です。", 404)
+        return os.path.join(self.root, upload_id)
+
+    @contextmanager
+    def _locked(self, upload_id: str):
+        """セッションのファイルロックを取り、メタデータを渡す。ブロック内で書き換えた内容は保存される。"""
+        session_dir = self._session_dir(upload_id)
+        try:
+            lock_file = open(os.path.join(session_dir, "lock"), 'a')
+        except FileNotFoundError:
+            raise UploadError("アップロードセッションが見つかりません。", 404)
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            meta_path = os.path.join(session_dir, "meta.json")
+            if not os.path.exists(meta_path):
+                raise UploadError("アップロードセッションが見つかりません。", 404)
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta["expires_at"] < time.time():
+                raise UploadError("アップロードセッションの期限が切れています。", 404)
+            before = json.dumps(meta, sort_keys=True)
+            yield meta
+            if json.dumps(meta, sort_keys=True) != before:
+                self._write_meta(session_dir, meta)
+
+    @staticmethod
+    def _write_meta(session_dir: str, meta: dict):
+        path = os.path.join(session_dir, "meta.json")
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    def data_path(self, upload_id: str) -> str:
+        return os.path.join(self._session_dir(upload_id), "data")
+
+    def create(self, filename: str, size: int, commit_message: str = None, sha256: str = None) -> dict:
+        """
+        セッションを作り、パック本体の領域を size バイト確保する。
+
+        Returns:
+            dict: セッションの状態 (describe と同じ形式)
+        """
+        if not filename:
+            raise UploadError("filename を指定してください。")
+        if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+            raise UploadError("size には正の整数を指定してください。")
+        if size > self.max_bytes:
+            raise UploadError(f"アップロードサイズが上限 ({self.max_bytes // (1024 * 1024)} MB) を超えています。", 413)
+        if sha256 is not None and not re.fullmatch(r'[0-9a-f]{64}', str(sha256)):
+            raise UploadError("sha256 は16進64文字で指定してください。")
+
+        self.sweep_expired()
+        upload_id = uuid.uuid4().hex
+        session_dir = os.path.join(self.root, upload_id)
+        os.makedirs(session_dir)
+        with open(os.path.join(session_dir, "data"), 'wb') as f:
+            f.truncate(size)
+        now = time.time()
+        meta = {"id": upload_id, "filename": os.path.basename(filename), "size": size,
+                "commit_message": commit_message, "sha256": sha256, "received": [],
+                "created_at": now, "expires_at": now + self.ttl, "finalizing": False}
+        self._write_meta(session_dir, meta)
+        print(f"Upload_Session_Created:{upload_id}_Size:{size}")
+        return self.describe_meta(meta)
+
+    @staticmethod
+    def describe_meta(meta: dict) -> dict:
+        received_bytes = sum(end - start for start, end in meta["received"])
+        return {"upload_id": meta["id"], "filename": meta["filename"], "size": meta["size"],
+                "received": meta["received"], "missing": missing_ranges(meta["received"], meta["size"]),
+                "received_bytes": received_bytes, "complete": received_bytes == meta["size"],
+                "expires_at": int(meta["expires_at"]), "chunk_size": UPLOAD_CHUNK_SIZE}
+
+    def describe(self, upload_id: str) -> dict:
+        with self._locked(upload_id) as meta:
+            return self.describe_meta(meta)
+
+    def write_chunk(self, upload_id: str, offset: int, length: int, stream, checksum: str) -> dict:
+        """
+        stream から length バイトを読み、パック本体の offset の位置に書き込む。
+        チェックサムが一致した場合だけ受信済みの範囲に加える (一致しなければ UploadError)。
+
+        Args:
+            stream: リクエストボディ (read(n) を持つもの)
+            checksum (str): チャンクの SHA-256 (16進)
+
+        Returns:
+            dict: セッションの状態 (describe と同じ形式)
+        """
+        if not checksum or not re.fullmatch(r'[0-9a-f]{64}', checksum.lower()):
+            raise UploadError("X-Chunk-Sha256 ヘッダにチャンクの SHA-256 を指定してください。")
+        with self._locked(upload_id) as meta:
+            size, finalizing = meta["size"], meta["finalizing"]
+        if finalizing:
+            raise UploadError("このアップロードは処理中です。", 409)
+        if offset < 0 or length <= 0 or offset + length > size:
+            raise UploadError(f"範囲がファイルサイズ ({size} バイト) を超えています: {offset}+{length}", 416)
+
+        # 受信はロックの外で、セッションのディレクトリ内の一時ファイルに行う (別々のチャンクを並行して受けられる)。
+        # チェックサムを確認してから、ロックを取ってその時点で未受信の部分だけをパック本体にコピーする。
+        # 重なった範囲のチャンクが並行して届いても、確認済みのデータが上書きされることはない。
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            staged = tempfile.TemporaryFile(dir=self._session_dir(upload_id), prefix="chunk-")
+        except FileNotFoundError:
+            raise UploadError("アップロードセッションが見つかりません。", 404)
+        with staged:
+            while written < length:
+                block = stream.read(min(UPLOAD_READ_SIZE, length - written))
+                if not block:
+                    break
+                digest.update(block)
+                staged.write(block)
+                written += len(block)
+            if written != length:
+                raise UploadError(f"チャンクが途中で終わりました ({written}/{length} バイト)。")
+            if digest.hexdigest() != checksum.lower():
+                print(f"Upload_Chunk_Checksum_Mismatch:{upload_id}_Offset:{offset}")
+                raise UploadError("チャンクのチェックサムが一致しません。送り直してください。", 422)
+
+            with self._locked(upload_id) as meta:
+                if meta["finalizing"]:
+                    raise UploadError("このアップロードは処理中です。", 409)
+                writable = [[max(start, offset), min(end, offset + length)]
+                            for start, end in missing_ranges(meta["received"], size)
+                            if start < offset + length and end > offset]
+                with open(self.data_path(upload_id), 'r+b') as f:
+                    for start, end in writable:
+                        staged.seek(start - offset)
+                        f.seek(start)
+                        remaining = end - start
+                        while remaining:
+                            block = staged.read(min(UPLOAD_READ_SIZE, remaining))
+                            f.write(block)
+                            remaining -= len(block)
+                meta["received"] = merge_ranges(meta["received"] + [[offset, offset + length]])
+                # 受信が続いている間は期限を延ばす
+                meta["expires_at"] = time.time() + self.ttl
+                return self.describe_meta(meta)
+
+    def begin_finalize(self, upload_id: str) -> dict:
+        """
+        全ての範囲が揃っていることを確認し、処理中の印を付ける (二重の finalize を防ぐ)。
+
+        Returns:
+            dict: セッションのメタデータ
+        """
+        with self._locked(upload_id) as meta:
+            if meta["finalizing"]:
+                raise UploadError("このアップロードは既に処理中です。", 409)
+            missing = missing_ranges(meta["received"], meta["size"])
+            if missing:
+                raise UploadError(f"未受信の範囲があります: {missing[:10]}", 409)
+            meta["finalizing"] = True
+            snapshot = dict(meta)
+        if snapshot["sha256"]:
+            digest = hashlib.sha256()
+            with open(self.data_path(upload_id), 'rb') as f:
+                for block in iter(lambda: f.read(UPLOAD_READ_SIZE), b''):
+                    digest.update(block)
+            if digest.hexdigest() != snapshot["sha256"]:
+                # 全体が一致しない場合はどのチャンクが壊れたか分からないため、受信済みの範囲を消す
+                with self._locked(upload_id) as meta:
+                    meta["received"], meta["finalizing"] = [], False
+                raise UploadError("ファイル全体のチェックサムが一致しません。最初から送り直してください。", 422)
+        return snapshot
+
+    def end_finalize(self, upload_id: str, keep: bool):
+        """finalize の後始末。keep=True (コミットの失敗など) ならもう一度 finalize できるように戻す。"""
+        if keep:
+            with self._locked(upload_id) as meta:
+                meta["finalizing"] = False
+        else:
+            self.delete(upload_id)
+
+    def delete(self, upload_id: str):
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def sweep_expired(self) -> int:
+        """期限切れのセッションを削除する。削除した数を返す。"""
+        if not os.path.isdir(self.root):
+            return 0
+        removed, now = 0, time.time()
+        for upload_id in os.listdir(self.root):
+            meta_path = os.path.join(self.root, upload_id, "meta.json")
+            try:
+                with open(meta_path, encoding='utf-8') as f:
+                    expires_at = json.load(f)["expires_at"]
+            except (OSError, ValueError, KeyError):
+                continue
+            if expires_at < now:
+                shutil.rmtree(os.path.join(self.root, upload_id), ignore_errors=True)
+                removed += 1
+        if removed:
+            print(f"Upload_Sessions_Expired:{removed}")
+        return removed